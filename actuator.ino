@@ -3,7 +3,6 @@
 #include <HttpClient.h>
 #include <ESP8266WiFi.h>
 #include <LiquidCrystal_I2C.h>
-#include <ArduinoJson.h>
 
 #define LED D13
 
@@ -18,19 +17,22 @@ const uint16_t port = 50000;
 // LCD配置
 LiquidCrystal_I2C lcd(0x27, 16, 2);
 
-// JSON解析文档
-DynamicJsonDocument doc(1024);
+// 长轮询配置: 服务器在状态变化或超时后才返回
+const int pollTimeout = 25;            // 秒, 服务器最多保持请求的时间
+const unsigned long httpTimeout = 35000; // 毫秒, 必须大于pollTimeout
+const unsigned long retryDelay = 1000;
 
 // 数据存储
+long statusVersion = -1;  // -1: 还没有收到状态
 int warningCount = 0;
-unsigned long lastUpdateTime = 0;
-const unsigned long updateInterval = 5000;
+int fireCode = -1;        // -1断开, 0安全, 1低, 2中, 3高风险
 
 WiFiClient espClient;
 HttpClient http(espClient, server, port);
 
 void setup() {
   Serial.begin(9600);
+  http.setHttpResponseTimeout(httpTimeout);
   pinMode(LED, OUTPUT);
   digitalWrite(LED, HIGH);
   
@@ -68,53 +70,63 @@ void setup() {
 }
 
 void loop() {
-  unsigned long currentMillis = millis();
-  
-  if (currentMillis - lastUpdateTime >= updateInterval) {
-    lastUpdateTime = currentMillis;
-    fetchLatestData();
+  // 每次请求都挂在服务器上直到警告数或火情状态改变, 不需要固定间隔
+  if (fetchStatus()) {
     updateLCD();
   }
 }
 
-void fetchLatestData() {
-  int err = http.get("/api/debug");
-  if (err == 0) {
-    Serial.println("API call successful");
-    
-    err = http.responseStatusCode();
-    if (err == 200) {
-      String response = http.responseBody();
-      Serial.println("Response received");
-      
-      DeserializationError error = deserializeJson(doc, response);
-      if (!error) {
-        // 获取警告计数
-        warningCount = doc["warnings"];
-        
-        Serial.print("Warning Count: ");
-        Serial.println(warningCount);
-
-        // LED指示：如果有警告则点亮
-        if (warningCount > 0) {
-          digitalWrite(LED, LOW);  // 有警告时LED亮
-        } else {
-          digitalWrite(LED, HIGH); // 无警告时LED灭
-        }
-        
-      } else {
-        Serial.print("JSON parsing failed: ");
-        Serial.println(error.c_str());
-      }
-    } else {
-      Serial.print("Server error: ");
-      Serial.println(err);
-    }
-  } else {
+bool fetchStatus() {
+  // 响应只有一行: "<version> <warnings> <fire code>"
+  String path = "/api/status";
+  if (statusVersion >= 0) {
+    path += "?since=" + String(statusVersion) + "&timeout=" + String(pollTimeout);
+  }
+  int err = http.get(path);
+  if (err != 0) {
     Serial.print("API call failed: ");
     Serial.println(err);
-    delay(1000);
+    delay(retryDelay);
+    return false;
+  }
+  
+  err = http.responseStatusCode();
+  if (err != 200) {
+    Serial.print("Server error: ");
+    Serial.println(err);
+    http.skipResponseHeaders();
+    http.stop();
+    delay(retryDelay);
+    return false;
+  }
+  
+  String response = http.responseBody();
+  long version;
+  int warnings, fire;
+  if (sscanf(response.c_str(), "%ld %d %d", &version, &warnings, &fire) != 3) {
+    Serial.print("Bad status: ");
+    Serial.println(response);
+    delay(retryDelay);
+    return false;
+  }
+  
+  bool changed = version != statusVersion;
+  statusVersion = version;
+  warningCount = warnings;
+  fireCode = fire;
+  
+  Serial.print("Warning Count: ");
+  Serial.print(warningCount);
+  Serial.print(" Fire: ");
+  Serial.println(fireCode);
+  
+  // LED指示：如果有警告则点亮
+  if (warningCount > 0) {
+    digitalWrite(LED, LOW);  // 有警告时LED亮
+  } else {
+    digitalWrite(LED, HIGH); // 无警告时LED灭
   }
+  return changed;
 }
 
 void updateLCD() {
@@ -0,0 +1,195 @@
+import math
+import threading
+import time
+
+LIVE = 'live'
+REPLAY = 'replay'
+
+
+class RateLimiter:
+    """Token buckets per (kind, key), e.g. ('sensor', <id>) or ('station', <id>)
+
+    `limits` maps each kind to (rate per second, burst). take() checks every
+    bucket a request needs and only debits them if all have enough tokens,
+    so a throttled request costs nothing.
+
+    Bucket state lives in `table`: by default a dict in this process, under
+    serve.py a shared_state.SharedBuckets table so the limits hold for all
+    workers together instead of per worker. A table over its max_keys is
+    pruned at most once per refill interval; a full table refuses new keys
+    (an empty bucket) rather than rescanning on every call.
+    """
+
+    def __init__(self, limits, max_keys=100000, table=None):
+        self.limits = dict(limits)
+        self._table = table if table is not None else LocalBuckets(max_keys)
+        # An untouched bucket is full again after this many seconds and can be dropped
+        self._idle = max(burst / rate for rate, burst in self.limits.values())
+        self._pruned = None
+
+    def take(self, charges, now=None):
+        """Debit [(kind, key, cost), ...], returns (0, None) or (seconds to wait, kind that ran out)"""
+        if now is None:
+            # CLOCK_MONOTONIC is system-wide, so workers sharing a table agree on it
+            now = time.monotonic()
+        with self._table.lock:
+            # Before any lookup, so a full table frees idle keys instead of refusing new ones for good
+            if len(self._table) > self._table.max_keys and (self._pruned is None or now - self._pruned >= self._idle):
+                self._pruned = now
+                self._table.prune(now - self._idle)
+            buckets = []
+            wait = 0.0
+            limited = None
+            for kind, key, cost in charges:
+                rate, burst = self.limits[kind]
+                bucket = self._table.get((kind, key))
+                if bucket is None:
+                    bucket = self._table.add((kind, key), burst, now)
+                else:
+                    bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                    bucket[1] = now
+                if bucket[0] < cost:
+                    # A cost above the burst can never be met, report the time to refill the whole bucket
+                    needed = (min(cost, burst) - bucket[0]) / rate
+                    if needed >= wait:
+                        wait, limited = needed, kind
+                buckets.append((bucket, cost))
+            if limited is not None:
+                return wait, limited
+            for bucket, cost in buckets:
+                bucket[0] -= cost
+            return 0.0, None
+
+    def __len__(self):
+        return len(self._table)
+
+
+class LocalBuckets:
+    """Bucket table of one process: (kind, key) -> [tokens, last refill]
+
+    Pruned above `max_keys`, new keys are refused at twice that.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self._buckets = {}
+
+    def get(self, key):
+        return self._buckets.get(key)
+
+    def add(self, key, tokens, now):
+        if len(self._buckets) >= 2 * self.max_keys:
+            # Full: an unstored empty bucket, the request is refused
+            return [0.0, now]
+        bucket = self._buckets[key] = [float(tokens), now]
+        return bucket
+
+    def prune(self, idle_before):
+        """Drop buckets untouched since `idle_before`, they behave like new ones (caller holds lock)"""
+        for key, (_, last) in list(self._buckets.items()):
+            if last <= idle_before:
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ConcurrencyGate:
+    """Caps concurrent ingest requests, with a bounded queue that favours live data
+
+    The cap is per process (each serve.py worker has its own): it bounds the
+    request threads and memory of one process, not the fleet's rate, which
+    is the RateLimiter's job.
+
+    Live requests take a free slot or wait (at most `max_waiting` of them, for
+    up to `wait_timeout` seconds). Replay requests never wait and only get a
+    slot while fewer than `replay_slots` are busy and no live request is
+    waiting, so a backlog replay cannot crowd out live frames.
+    """
+
+    def __init__(self, max_active=8, max_waiting=32, wait_timeout=1.0, replay_slots=None):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.replay_slots = max(1, max_active // 2) if replay_slots is None else replay_slots
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def enter(self, priority=LIVE):
+        """Take a slot, returns None or the reason it was refused ("queue_full", "timeout", "busy")"""
+        with self._cond:
+            if priority == REPLAY:
+                if self.active >= self.replay_slots or self.waiting:
+                    return 'busy'
+                self.active += 1
+                return None
+            if self.active < self.max_active:
+                self.active += 1
+                return None
+            if self.waiting >= self.max_waiting:
+                return 'queue_full'
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.max_active, self.wait_timeout):
+                    return 'timeout'
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            return None
+
+    def leave(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class Admission:
+    """Ingest admission control: concurrency gate plus token-bucket rate limits
+
+    Refusals are counted by reason and come with a Retry-After hint in seconds.
+    """
+
+    def __init__(self, gate, limiter):
+        self.gate = gate
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self.admitted = {LIVE: 0, REPLAY: 0}
+        self.throttled = {}
+
+    def enter(self, priority=LIVE):
+        """Concurrency slot for a request, returns None or (reason, retry after seconds)"""
+        reason = self.gate.enter(priority)
+        if reason is None:
+            with self._lock:
+                self.admitted[priority] += 1
+            return None
+        self._count(reason)
+        return reason, 1
+
+    def leave(self):
+        self.gate.leave()
+
+    def charge(self, charges):
+        """Debit rate limits, returns None or (kind that ran out, retry after seconds)"""
+        wait, kind = self.limiter.take(charges)
+        if kind is None:
+            return None
+        self._count(kind)
+        return kind, max(1, math.ceil(wait))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.gate.active,
+                'waiting': self.gate.waiting,
+                'max_active': self.gate.max_active,
+                'admitted': dict(self.admitted),
+                'throttled': dict(self.throttled),
+                'buckets': len(self.limiter),
+            }
+
+    def _count(self, reason):
+        with self._lock:
+            self.throttled[reason] = self.throttled.get(reason, 0) + 1
@@ -0,0 +1,519 @@
+"""Load tests and benchmarks with a simulated sensor fleet
+
+    python bench.py ingest --stations 50 --clients 8 --duration 20
+    python bench.py read --stations 10 --rate 50 --readers 4
+    python bench.py firebase-outage --rate 50 --outage 5,10
+    python bench.py outage --rate 20 --down-at 5 --down 10
+    python bench.py gateway --stations 20 --rate 100
+
+Every scenario starts the Flask server in a child process (`bench.py server`)
+on a local port, backed by a fake Firebase with injectable latency and
+outages, and drives it with frames from a fleet of simulated ESP32 stations.
+The gateway scenario runs lora_center's receiver and forwarder on a
+FakeRadio. Results are printed as one JSON document (throughput, p50/p99
+latency in ms, server-side stats) tagged with the git commit, --output also
+writes it to a file so runs of different versions can be compared.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+import lora_center
+
+# Fields esp32main.ino sends: (start value, random-walk step, min, max)
+FIELDS = {
+    "temperature": (24.0, 0.05, -10.0, 60.0),
+    "humidity": (45.0, 0.2, 0.0, 100.0),
+    "wind_speed": (0.5, 0.03, 0.0, 30.0),
+    "mq135": (420.0, 2.0, 0.0, 5000.0),
+    "mq2": (12.0, 0.3, 0.0, 1000.0),
+    "mq7": (1.5, 0.05, 0.0, 500.0),
+    "mq9": (0.3, 0.01, 0.0, 100.0),
+}
+
+SERVER_START_TIMEOUT = 60  # seconds
+
+
+class Fleet:
+    """Simulated ESP32 stations producing frames like esp32main.ino
+
+    Each station's readings follow a bounded random walk, so consecutive
+    frames look like slowly changing weather (as the deadband would see it).
+    """
+
+    def __init__(self, stations, seed=1):
+        self.stations = list(range(1, stations + 1))
+        self._rng = random.Random(seed)
+        self._values = {s: {name: start for name, (start, _, _, _) in FIELDS.items()} for s in self.stations}
+        self._seq = {s: 0 for s in self.stations}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def frame(self, station=None):
+        """Next frame (gateway field names plus station and seq) of a station, round-robin if None"""
+        with self._lock:
+            if station is None:
+                station = self.stations[self._next % len(self.stations)]
+                self._next += 1
+            values = self._values[station]
+            for name, (_, step, low, high) in FIELDS.items():
+                values[name] = min(high, max(low, values[name] + self._rng.gauss(0, step)))
+            seq = self._seq[station]
+            self._seq[station] = (seq + 1) % 65536
+            data = {name: round(value, 2) for name, value in values.items()}
+        # No camera on the simulated nodes, reported as disconnected like the sketch does
+        data["fire_prob"] = -1
+        data["station"] = station
+        data["seq"] = seq
+        return data
+
+
+def server_frame(data):
+    """The frame the gateway PUTs to /api/frames for a fleet frame, keyed by sensor name"""
+    sensors = {lora_center.SENSOR_NAMES[name]: data[name] for name in lora_center.SENSOR_NAMES if name in data}
+    return {"station": str(data["station"]), "sensors": sensors, "timestamp": time.time()}
+
+
+class FakeFirebase:
+    """Storage wrapper adding Firebase-like round-trip latency and outages
+
+    Every call sleeps latency ± jitter seconds before reaching the wrapped
+    storage. Between `outage` (start, duration) seconds after creation, calls
+    fail like an unreachable database.
+    """
+
+    name = 'fake_firebase'
+
+    def __init__(self, inner, latency=0.0, jitter=0.0, outage=None):
+        self.inner = inner
+        self.latency = latency
+        self.jitter = jitter
+        self.outage = outage
+        self.started = time.monotonic()
+        self.calls = 0
+        self.failures = 0
+
+    def __getattr__(self, attr):
+        method = getattr(self.inner, attr)
+        if not callable(method) or attr == 'listen_sensors':
+            return method
+
+        def call(*args, **kwargs):
+            self._round_trip()
+            return method(*args, **kwargs)
+        return call
+
+    def _round_trip(self):
+        self.calls += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.outage is not None:
+            elapsed = time.monotonic() - self.started
+            start, duration = self.outage
+            if start <= elapsed < start + duration:
+                self.failures += 1
+                raise ConnectionError("fake Firebase outage")
+
+
+class ServerProcess:
+    """The Flask server running `bench.py server` in a child process"""
+
+    def __init__(self, port, options=(), log_path=None):
+        self.port = port
+        self.options = list(options)
+        self.url = f"http://127.0.0.1:{port}"
+        self.log_path = log_path
+        self.process = None
+
+    def start(self):
+        log = open(self.log_path, 'ab') if self.log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'server', '--port', str(self.port)] +
+                                        self.options, stdout=log, stderr=log)
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Bench server exited with {self.process.returncode}")
+            try:
+                if requests.get(self.url + '/api/status', timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("Bench server did not come up")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(10)
+
+    def debug(self):
+        return requests.get(self.url + '/api/debug', timeout=10).json()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def new_session(pool=4):
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+    return session
+
+
+def summarize(latencies, errors, elapsed, statuses=None):
+    """Throughput and latency percentiles (ms) of a set of requests"""
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000
+    result = {
+        'requests': int(len(latencies)),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    if len(latencies):
+        result['p50_ms'] = round(float(np.percentile(latencies, 50)), 3)
+        result['p99_ms'] = round(float(np.percentile(latencies, 99)), 3)
+        result['max_ms'] = round(float(latencies.max()), 3)
+    if statuses is not None:
+        result['statuses'] = {str(k): v for k, v in sorted(statuses.items())}
+    return result
+
+
+class Load:
+    """Client threads calling `request(session)` until `duration` passes
+
+    With `rate` (requests per second over all threads) calls are paced,
+    otherwise every thread sends as fast as the server answers.
+    """
+
+    def __init__(self, request, threads, duration, rate=None):
+        self.request = request
+        self.threads = threads
+        self.duration = duration
+        self.rate = rate
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self.elapsed = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        for i in range(self.threads):
+            t = threading.Thread(target=self._run, args=(i,), daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+        self.elapsed = time.perf_counter() - self._start
+        return self
+
+    def summary(self):
+        return summarize(self.latencies, self.errors, self.elapsed, self.statuses)
+
+    def _run(self, index):
+        session = new_session()
+        interval = self.threads / self.rate if self.rate else 0.0
+        next_time = self._start + (interval * index / self.threads)
+        end = self._start + self.duration
+        latencies = []
+        statuses = {}
+        errors = 0
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            if interval:
+                if next_time > now:
+                    time.sleep(next_time - now)
+                next_time += interval
+            start = time.perf_counter()
+            try:
+                status = self.request(session)
+            except requests.RequestException:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status is None or status >= 400:
+                errors += 1
+        session.close()
+        with self._lock:
+            self.latencies.extend(latencies)
+            self.errors += errors
+            for status, count in statuses.items():
+                self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+def frame_request(server, fleet):
+    def request(session):
+        return session.put(server.url + '/api/frames', json=server_frame(fleet.frame()), timeout=10).status_code
+    return request
+
+
+def get_request(server, path):
+    def request(session):
+        return session.get(server.url + path, timeout=10).status_code
+    return request
+
+
+def server_options(args, outage=None):
+    options = ['--firebase-latency', str(args.firebase_latency), '--firebase-jitter', str(args.firebase_jitter)]
+    if args.no_deadband:
+        options.append('--no-deadband')
+    if args.admission:
+        options.append('--admission')
+    if outage:
+        options += ['--firebase-outage', outage]
+    return options
+
+
+def scenario_ingest(args, server):
+    """Frames per second the server takes from --clients concurrent senders"""
+    fleet = Fleet(args.stations)
+    load = Load(frame_request(server, fleet), args.clients, args.duration, args.rate).start().join()
+    debug = server.debug()
+    return {'ingest': load.summary(), 'firebase_writer': debug['firebase_writer'], 'deadband': debug.get('deadband')}
+
+
+def scenario_read(args, server):
+    """/dashboard and /api/debug latency while frames keep arriving"""
+    fleet = Fleet(args.stations)
+    ingest = Load(frame_request(server, fleet), args.clients, args.duration, args.rate).start()
+    readers = {path: Load(get_request(server, path), args.readers, args.duration).start()
+               for path in ('/dashboard', '/api/debug')}
+    ingest.join()
+    results = {'ingest': ingest.summary()}
+    for path, load in readers.items():
+        results[path] = load.join().summary()
+    return results
+
+
+def scenario_firebase_outage(args, server):
+    """Ingest latency and Firebase write backlog while the database is down and after it recovers"""
+    fleet = Fleet(args.stations)
+    start, duration = (float(v) for v in args.outage.split(','))
+    ingest = Load(frame_request(server, fleet), args.clients, args.duration, args.rate).start()
+    samples = []
+    began = time.time()
+    while ingest.running():
+        writer = server.debug()['firebase_writer']
+        samples.append((time.time() - began, writer['queue_depth'], writer['dropped']))
+        time.sleep(0.25)
+    ingest.join()
+    # Keep watching until the backlog written during the outage is flushed
+    deadline = time.time() + args.recovery_timeout
+    while time.time() < deadline:
+        writer = server.debug()['firebase_writer']
+        samples.append((time.time() - began, writer['queue_depth'], writer['dropped']))
+        if writer['queue_depth'] == 0 and samples[-1][0] > start + duration:
+            break
+        time.sleep(0.25)
+    recovered = next((t for t, depth, _ in samples if t > start + duration and depth == 0), None)
+    return {
+        'ingest': ingest.summary(),
+        'outage': {'start': start, 'seconds': duration},
+        'peak_queue_depth': max(depth for _, depth, _ in samples),
+        'dropped': samples[-1][2],
+        'recovery_seconds': round(recovered - start - duration, 3) if recovered is not None else None,
+        'firebase_writer': server.debug()['firebase_writer'],
+    }
+
+
+def scenario_outage(args, server):
+    """Gateway store-and-forward across a server outage: backlog, replay and drain time"""
+    fleet = Fleet(args.stations)
+    spool_dir = tempfile.mkdtemp(prefix='bench-spool-')
+    interval = 1.0 / args.rate
+    generated = 0
+    peak_backlog = 0
+    down_until = None
+    restarted_at = None
+    restart = None
+    drained_at = None
+    # The forwarder threads log every request, keep that out of the report
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        forwarder = lora_center.FrameForwarder(server.url + '/api/frames', spool=lora_center.FrameSpool(spool_dir))
+        began = time.time()
+        while True:
+            elapsed = time.time() - began
+            if down_until is None and elapsed >= args.down_at:
+                server.stop()
+                down_until = elapsed + args.down
+            elif down_until is not None and restart is None and elapsed >= down_until:
+                # Started in the background so the fleet keeps sending while the server boots
+                restart = threading.Thread(target=server.start, daemon=True)
+                restart.start()
+            if restart is not None and restarted_at is None and not restart.is_alive():
+                restarted_at = elapsed
+            if elapsed < args.duration:
+                forwarder.submit(server_frame(fleet.frame()))
+                generated += 1
+            backlog = forwarder.spool.backlog()
+            peak_backlog = max(peak_backlog, backlog)
+            if restarted_at is not None and elapsed >= args.duration and backlog == 0:
+                drained_at = time.time() - began
+                break
+            if elapsed > args.duration + args.recovery_timeout:
+                break
+            time.sleep(interval)
+        stats = forwarder.stats()
+        forwarder.stop()
+    return {
+        'generated': generated,
+        'sent': stats['sent'],
+        'replayed': stats['replayed'],
+        'failed_requests': stats['failed'],
+        'dropped': stats['dropped'],
+        'peak_backlog': peak_backlog,
+        'down': {'at': args.down_at, 'seconds': args.down},
+        'drain_seconds': round(drained_at - restarted_at, 3) if drained_at is not None else None,
+        'spool': stats['spool'],
+    }
+
+
+def scenario_gateway(args, server):
+    """Binary frames from a FakeRadio through lora_center's receiver and forwarder to the server"""
+    fleet = Fleet(args.stations)
+    latencies = []
+    radio = lora_center.FakeRadio()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        forwarder = lora_center.FrameForwarder(server.url + '/api/frames')
+    # Server round trip of every forwarded frame
+    forwarder.session.hooks['response'].append(lambda response, *a, **kw: latencies.append(response.elapsed.total_seconds()))
+    lora_center.forwarder = forwarder
+    lora_center.deadband = None if args.no_deadband else lora_center.open_deadband()
+    receiver = lora_center.RadioReceiver(radio, lora_center.handle_payload)
+    count = int(args.rate * args.duration)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        receiver.start()
+        began = time.perf_counter()
+        player = radio.play((lora_center.encode_frame(fleet.frame()) for _ in range(count)), interval=1.0 / args.rate)
+        player.join()
+        forwarder.stop(timeout=args.recovery_timeout)
+        elapsed = time.perf_counter() - began
+        radio.stop()
+        receiver.stop()
+    stats = forwarder.stats()
+    receiver_stats = receiver.stats()
+    return {
+        # Requests to the server, fewer than frames when the deadband suppresses unchanged ones
+        'forward': summarize(latencies, stats['failed'], elapsed),
+        'frames_per_second': round(receiver_stats['received'] / elapsed, 2),
+        'injected': count,
+        'overwritten': radio.overwritten,
+        'receiver': receiver_stats,
+        'forwarder': {key: stats[key] for key in ('sent', 'failed', 'dropped', 'rejected')},
+        'sequences': lora_center.sequences.stats(),
+        'deadband': lora_center.deadband.stats() if lora_center.deadband is not None else None,
+    }
+
+
+SCENARIOS = {
+    'ingest': scenario_ingest,
+    'read': scenario_read,
+    'firebase-outage': scenario_firebase_outage,
+    'outage': scenario_outage,
+    'gateway': scenario_gateway,
+}
+
+
+def run_server(args):
+    """Child process: the real server app with the fake Firebase, single process"""
+    os.environ.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=':memory:', HISTORY_STORE_DIR=args.history_dir,
+                      LOG_LEVEL='WARNING')
+    if args.no_deadband:
+        os.environ['DEADBAND_PATH'] = ''
+    # With admission control on the ingest numbers would measure the rate limiter, not throughput
+    if not args.admission:
+        os.environ['INGEST_ADMISSION'] = '0'
+    from werkzeug.serving import make_server
+    import flask_gradio_server_simple as server
+    outage = tuple(float(v) for v in args.firebase_outage.split(',')) if args.firebase_outage else None
+    server.storage = FakeFirebase(server.storage, args.firebase_latency, args.firebase_jitter, outage)
+    make_server('127.0.0.1', args.port, server.app, threaded=True).serve_forever()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forest fire server and gateway benchmarks")
+    parser.add_argument('scenario', choices=sorted(SCENARIOS) + ['server'])
+    parser.add_argument('--stations', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=4, help="concurrent frame senders")
+    parser.add_argument('--readers', type=int, default=2, help="concurrent readers per endpoint (read)")
+    parser.add_argument('--rate', type=float, default=None, help="frames per second, default as fast as possible")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of load")
+    parser.add_argument('--firebase-latency', type=float, default=0.05, help="seconds per fake Firebase call")
+    parser.add_argument('--firebase-jitter', type=float, default=0.01)
+    parser.add_argument('--firebase-outage', default='', help="start,seconds (server process)")
+    parser.add_argument('--outage', default='3,5', help="start,seconds of the Firebase outage (firebase-outage)")
+    parser.add_argument('--down-at', type=float, default=3.0, help="seconds before the server is stopped (outage)")
+    parser.add_argument('--down', type=float, default=5.0, help="seconds the server stays down (outage)")
+    parser.add_argument('--recovery-timeout', type=float, default=60.0)
+    parser.add_argument('--no-deadband', action='store_true', help="forward and store every value")
+    parser.add_argument('--admission', action='store_true',
+                        help="keep ingest admission control (rate limits) on in the server")
+    parser.add_argument('--history-dir', default='', help="history store directory, default none")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--output', help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    if args.scenario == 'server':
+        run_server(args)
+        return
+    if args.scenario in ('outage', 'gateway') and not args.rate:
+        args.rate = 20.0
+
+    outage = args.outage if args.scenario == 'firebase-outage' else args.firebase_outage
+    log_path = os.path.join(tempfile.gettempdir(), 'bench-server.log')
+    server = ServerProcess(args.port or free_port(), server_options(args, outage), log_path).start()
+    try:
+        results = SCENARIOS[args.scenario](args, server)
+    finally:
+        server.stop()
+
+    report = {
+        'scenario': args.scenario,
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'params': {key: value for key, value in vars(args).items() if key not in ('scenario', 'output')},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
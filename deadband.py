@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+
+
+def load_config(path):
+    """Read a deadband JSON file: {"max_silence": seconds, "sensors": {name: {"abs": ..., "rel": ...}}}"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Deadband:
+    """Change-only filter with per-sensor tolerances and a max-silence heartbeat
+
+    A value passes when it differs from the last passed value of the same key
+    by more than max(abs, rel * |last|), when max_silence seconds have gone by
+    since the last passed value, or when it is past a guard threshold, so
+    alert conditions always go through at full rate. Sensors without a
+    configured tolerance and non-numeric values always pass.
+    """
+
+    def __init__(self, tolerances, max_silence=60.0, guards=None):
+        # sensor -> (absolute, relative) tolerance
+        self.tolerances = dict(tolerances)
+        self.max_silence = max_silence
+        # sensor -> (high, low) thresholds, None where not set
+        self.guards = dict(guards or {})
+        # key -> (last passed value, when)
+        self._last = {}
+        self._seen = {}
+        self._passed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, rules=None):
+        """Build a filter from a loaded deadband config, guarded by the thresholds of a rules config"""
+        tolerances = {name: (float(t.get('abs', 0)), float(t.get('rel', 0)))
+                      for name, t in config.get('sensors', {}).items()}
+        guards = {}
+        for rule in (rules or {}).get('rules', []):
+            guards[rule['sensor']] = (rule.get('high'), rule.get('low'))
+        return cls(tolerances, float(config.get('max_silence', 60)), guards)
+
+    def check(self, key, sensor, value, now=None, record=True):
+        """True if the value should be forwarded/stored, False if it is suppressed
+
+        With record=False a passing value only becomes the new reference once
+        record() is called, for callers that can still fail to send it.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._seen[sensor] = self._seen.get(sensor, 0) + 1
+            passed = self._passes(key, sensor, value, now)
+            if passed and record:
+                self._record(key, sensor, value, now)
+            return passed
+
+    def record(self, key, sensor, value, now=None):
+        """Remember a value that passed check(record=False) as sent"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._record(key, sensor, value, now)
+
+    def forget(self, key):
+        """Drop the state of a key so its next value passes"""
+        with self._lock:
+            self._last.pop(key, None)
+
+    def stats(self):
+        """Samples seen and passed per sensor with the share suppressed"""
+        with self._lock:
+            sensors = {sensor: _ratio(seen, self._passed.get(sensor, 0)) for sensor, seen in self._seen.items()}
+            total = _ratio(sum(self._seen.values()), sum(self._passed.values()))
+        total['sensors'] = sensors
+        return total
+
+    def _record(self, key, sensor, value, now):
+        self._passed[sensor] = self._passed.get(sensor, 0) + 1
+        self._last[key] = (value, now)
+
+    def _passes(self, key, sensor, value, now):
+        tolerance = self.tolerances.get(sensor)
+        last = self._last.get(key)
+        if tolerance is None or last is None:
+            return True
+        try:
+            value = float(value)
+            last_value = float(last[0])
+        except (TypeError, ValueError):
+            return True
+        if value != value or now - last[1] >= self.max_silence:
+            return True
+        high, low = self.guards.get(sensor, (None, None))
+        if (high is not None and value > high) or (low is not None and value < low):
+            return True
+        absolute, relative = tolerance
+        return abs(value - last_value) > max(absolute, relative * abs(last_value))
+
+
+def _ratio(seen, passed):
+    return {'seen': seen, 'passed': passed, 'suppressed_ratio': round(1 - passed / seen, 4) if seen else 0.0}
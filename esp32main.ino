@@ -18,6 +18,19 @@ SPIClass SPI_LORA(HSPI);
 unsigned long lastSendTime = 0;
 const unsigned long sendInterval = 5000; // send every 5 seconds
 
+// Binary LoRa frame (little-endian, 31 bytes instead of ~120 bytes of JSON):
+//   u8 magic 0xF5 | u8 version 1 | u16 station | u16 sequence | u8 flags (0)
+//   i16 temperature*100 | u16 humidity*100 | u16 wind_speed*100
+//   u32 mq135*100 | u32 mq2*100 | u32 mq7*100 | u32 mq9*100 | i16 fire_prob*100
+// Missing values: i16 -32768, u16 0xFFFF, u32 0xFFFFFFFF (fire_prob missing = camera disconnected)
+// Set USE_BINARY_FRAME to 0 to send the legacy JSON text frame instead
+#define USE_BINARY_FRAME 1
+#define FRAME_MAGIC 0xF5
+#define FRAME_VERSION 1
+#define FRAME_SIZE 31
+#define STATION_ID 1
+uint16_t frameSeq = 0;  // wraps at 65535, lets the gateway count lost and duplicate frames
+
 
 #define DHTPIN 4      // 连接 DHT11 数据引脚的 ESP32 GPIO
 #define DHTTYPE DHT11  // 传感器类型 DHT11
@@ -221,7 +234,7 @@ void loop() {
     }
 
     String payload = "{";
-    payload += "\"fire_prob\":" + fireValue;
+    payload += "\"fire_prob\":" + (fireValue.length() > 0 ? fireValue : String("-1")) + ",";
     payload += "\"wind_speed\":" + String(windSpeed, 2) + ",";
     payload += "\"mq135\":" + String(ppm_135, 2) + ",";
     payload += "\"mq2\":" + String(ppm_2, 2) + ",";
@@ -234,7 +247,17 @@ void loop() {
       Serial.println(payload);
 
       LoRa.beginPacket();
+#if USE_BINARY_FRAME
+      uint8_t frame[FRAME_SIZE];
+      int frameLength = buildBinaryFrame(frame, temperature, humidity, windSpeed,
+                                         ppm_135, ppm_2, ppm_7, ppm_9, fireValue);
+      LoRa.write(frame, frameLength);
+      Serial.print("Binary frame seq ");
+      Serial.println(frameSeq);
+      frameSeq++;
+#else
       LoRa.print(payload);
+#endif
       LoRa.endPacket();
 
       lastSendTime = millis();
@@ -245,6 +268,65 @@ void loop() {
 
 
 
+// Fixed-point encoders, out-of-range and NaN values become the "missing" marker
+void putU16(uint8_t *buf, int &pos, uint16_t v) {
+    buf[pos++] = v & 0xFF;
+    buf[pos++] = v >> 8;
+}
+
+void putU32(uint8_t *buf, int &pos, uint32_t v) {
+    for (int i = 0; i < 4; i++) {
+        buf[pos++] = (v >> (8 * i)) & 0xFF;
+    }
+}
+
+void putFixedI16(uint8_t *buf, int &pos, float value, bool valid) {
+    float scaled = value * 100.0;
+    if (!valid || isnan(value) || scaled < -32767 || scaled > 32767) {
+        putU16(buf, pos, 0x8000);
+    } else {
+        putU16(buf, pos, (uint16_t)(int16_t)lroundf(scaled));
+    }
+}
+
+void putFixedU16(uint8_t *buf, int &pos, float value, bool valid) {
+    float scaled = value * 100.0;
+    if (!valid || isnan(value) || scaled < 0 || scaled > 65534) {
+        putU16(buf, pos, 0xFFFF);
+    } else {
+        putU16(buf, pos, (uint16_t)lroundf(scaled));
+    }
+}
+
+void putFixedU32(uint8_t *buf, int &pos, float value) {
+    float scaled = value * 100.0;
+    if (isnan(value) || scaled < 0 || scaled > 4294967000.0) {
+        putU32(buf, pos, 0xFFFFFFFF);
+    } else {
+        putU32(buf, pos, (uint32_t)llroundf(scaled));
+    }
+}
+
+int buildBinaryFrame(uint8_t *buf, float temperature, float humidity, float windSpeed,
+                     float ppm_135, float ppm_2, float ppm_7, float ppm_9, String fireValue) {
+    int pos = 0;
+    buf[pos++] = FRAME_MAGIC;
+    buf[pos++] = FRAME_VERSION;
+    putU16(buf, pos, STATION_ID);
+    putU16(buf, pos, frameSeq);
+    buf[pos++] = 0;  // flags, reserved
+    putFixedI16(buf, pos, temperature, true);
+    putFixedU16(buf, pos, humidity, true);
+    putFixedU16(buf, pos, windSpeed, true);
+    putFixedU32(buf, pos, ppm_135);
+    putFixedU32(buf, pos, ppm_2);
+    putFixedU32(buf, pos, ppm_7);
+    putFixedU32(buf, pos, ppm_9);
+    // No camera reading yet, the gateway reports it as disconnected
+    putFixedI16(buf, pos, fireValue.toFloat(), fireValue.length() > 0);
+    return pos;
+}
+
 void clearBluetoothBuffer() {
     while (SerialBT.available()) {
         SerialBT.read();  // 读取并丢弃缓冲区中的数据
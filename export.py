@@ -0,0 +1,140 @@
+import csv
+import importlib.util
+import io
+import json
+import threading
+
+import numpy as np
+
+# Export formats: name -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+class ExportLimiter:
+    """Caps how many exports stream at once, so bulk downloads cannot starve ingest
+
+    acquire() never waits: a client over the limit is told to retry later.
+    With `shared` (a multiprocessing.Value from serve.py) the cap counts the
+    exports of every worker, not only this process's.
+    """
+
+    def __init__(self, max_concurrent=2, shared=None):
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._shared = shared
+        self._lock = threading.Lock()
+        self.active = 0
+        self.started = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._take_slot():
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.active += 1
+            self.started += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        if self._shared is not None:
+            with self._shared.get_lock():
+                self._shared.value -= 1
+        else:
+            self._slots.release()
+
+    def _take_slot(self):
+        if self._shared is None:
+            return self._slots.acquire(blocking=False)
+        with self._shared.get_lock():
+            if self._shared.value >= self.max_concurrent:
+                return False
+            self._shared.value += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {'active': self.active, 'max': self.max_concurrent, 'started': self.started,
+                    'rejected': self.rejected}
+
+
+def iter_chunks(records, columns, sensors, chunk_rows):
+    """Split (n, 1 + columns) record blocks into (times, {sensor: values}) chunks of at most chunk_rows"""
+    index = [columns.index(name) + 1 for name in sensors]
+    for block in records:
+        for lo in range(0, len(block), chunk_rows):
+            # Copy one chunk out of the mapping at a time, never the whole range
+            part = np.array(block[lo:lo + chunk_rows])
+            yield part[:, 0], {name: part[:, i] for name, i in zip(sensors, index)}
+
+
+def stream(fmt, chunks, sensors):
+    """Encode (station ID, times, {sensor: values}) chunks as a stream of byte strings"""
+    if fmt == 'csv':
+        return _csv(chunks, sensors)
+    if fmt == 'ndjson':
+        return _ndjson(chunks, sensors)
+    if fmt == 'arrow':
+        return _arrow(chunks, sensors)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def arrow_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _csv(chunks, sensors):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(['station', 'time'] + list(sensors))
+    for station_id, times, columns in chunks:
+        values = [columns[name].tolist() for name in sensors]
+        for i, when in enumerate(times.tolist()):
+            # NaN (missing sample) becomes an empty field
+            writer.writerow([station_id, when] + [v[i] if v[i] == v[i] else '' for v in values])
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def _ndjson(chunks, sensors):
+    for station_id, times, columns in chunks:
+        values = [columns[name].tolist() for name in sensors]
+        lines = []
+        for i, when in enumerate(times.tolist()):
+            row = {'station': station_id, 'time': when}
+            for name, v in zip(sensors, values):
+                row[name] = v[i] if v[i] == v[i] else None
+            lines.append(json.dumps(row, separators=(',', ':')))
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _arrow(chunks, sensors):
+    import pyarrow as pa
+
+    schema = pa.schema([('station', pa.string()), ('time', pa.float64())] +
+                       [(name, pa.float64()) for name in sensors])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for station_id, times, columns in chunks:
+            batch = pa.record_batch(
+                [pa.array([station_id] * len(times), pa.string()), pa.array(times)] +
+                # NaN (missing sample) becomes null
+                [pa.array(columns[name], from_pandas=True) for name in sensors],
+                schema=schema)
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # End-of-stream marker written on close
+    yield sink.getvalue()
@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Child of the server's queued logger (logs.setup_logging), nothing is written on the writer thread
+logger = logging.getLogger('forest_fire.firebase_writer')
+
+
+class FirebaseWriter:
+    """Write-behind queue that batches sensor writes into multi-path updates
+
+    Writes are queued per sensor ID and flushed by background worker threads,
+    so the ingest request never waits on Firebase. In the default mode only the
+    latest value per sensor is kept (newer writes overwrite pending ones). With
+    full_history on, every sample is also written under /history/<id>/.
+    """
+
+    def __init__(self, update_fn, max_pending=1000, batch_size=100, flush_interval=0.5,
+                 full_history=False, workers=1, retry_delay=1.0):
+        # update_fn receives {"data/<id>": value, ...} relative to the database root
+        self.update_fn = update_fn
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_history = full_history
+        self.workers = workers
+        self.retry_delay = retry_delay
+
+        # sensor ID -> latest data, in arrival order
+        self._latest = OrderedDict()
+        # (sensor ID, history key, data) for full history mode
+        self._history = []
+        self._oldest_pending = None
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        # Number of callers blocked in flush()
+        self._flushing = 0
+        self._history_seq = 0
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_flush_latency = 0.0
+        self.last_error = None
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"firebase-writer-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, sensor_id, data, timeout=1.0):
+        """Queue one sensor write, returns False if the queue stayed full for timeout seconds"""
+        return self.submit_many({sensor_id: data}, timeout)
+
+    def submit_many(self, writes, timeout=1.0):
+        """Queue {sensor_id: data} writes together so they land in the same batch"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._depth() + self._growth(writes) > self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    self.dropped += len(writes)
+                    return False
+                self._cond.wait(remaining)
+
+            for sensor_id, data in writes.items():
+                self.submitted += 1
+                if sensor_id in self._latest:
+                    self.coalesced += 1
+                    self._latest.move_to_end(sensor_id)
+                self._latest[sensor_id] = data
+                if self.full_history:
+                    self._history_seq += 1
+                    key = f"t{int(time.time() * 1000)}-{self._history_seq % 1000:03d}"
+                    self._history.append((sensor_id, key, data))
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            self._cond.notify_all()
+        return True
+
+    def discard(self, sensor_id):
+        """Drop pending writes for a sensor, e.g. before deleting it"""
+        with self._cond:
+            self._latest.pop(sensor_id, None)
+            if self.full_history:
+                self._history = [h for h in self._history if h[0] != sensor_id]
+            self._cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been written (or timeout)"""
+        deadline = time.monotonic() + timeout
+        if not self._threads:
+            # No workers running, write inline
+            while time.monotonic() < deadline:
+                with self._cond:
+                    if not self._depth():
+                        return True
+                    batch = self._take_batch()
+                if not self._write_batch(*batch):
+                    return False
+            return False
+
+        with self._cond:
+            # Write what is pending now instead of after flush_interval
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._depth() or self._in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def stop(self, timeout=5.0):
+        """Flush pending writes and stop the workers"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for t in threads:
+            t.join(timeout)
+        return flushed
+
+    def stats(self):
+        with self._cond:
+            lag = 0.0
+            if self._oldest_pending is not None:
+                lag = time.monotonic() - self._oldest_pending
+            return {
+                'queue_depth': self._depth(),
+                'in_flight': self._in_flight,
+                'lag_seconds': round(lag, 3),
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'errors': self.errors,
+                'last_flush_latency': round(self.last_flush_latency, 4),
+                'last_error': self.last_error,
+            }
+
+    def _depth(self):
+        return len(self._history) if self.full_history else len(self._latest)
+
+    def _growth(self, writes):
+        # In latest-only mode a write to an already pending sensor does not grow the queue
+        if self.full_history:
+            return len(writes)
+        return sum(1 for sensor_id in writes if sensor_id not in self._latest)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    depth = self._depth()
+                    if depth >= self.batch_size or (depth and self._flushing):
+                        break
+                    if depth and time.monotonic() - self._oldest_pending >= self.flush_interval:
+                        break
+                    if depth:
+                        wait = self.flush_interval - (time.monotonic() - self._oldest_pending)
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                if self._stopping and not self._depth():
+                    return
+                latest, history = self._take_batch()
+            if not self._write_batch(latest, history):
+                if self._stopping:
+                    return
+                time.sleep(self.retry_delay)
+
+    def _take_batch(self):
+        """Pop up to batch_size pending writes (caller holds the condition)"""
+        latest = []
+        history = []
+        if self.full_history:
+            history, self._history = self._history[:self.batch_size], self._history[self.batch_size:]
+            ids = {h[0] for h in history}
+            for sensor_id in ids:
+                if sensor_id in self._latest:
+                    latest.append((sensor_id, self._latest.pop(sensor_id)))
+        else:
+            while self._latest and len(latest) < self.batch_size:
+                latest.append(self._latest.popitem(last=False))
+        self._oldest_pending = time.monotonic() if self._depth() else None
+        self._in_flight += 1
+        self._cond.notify_all()
+        return latest, history
+
+    def _write_batch(self, latest, history):
+        updates = {}
+        for sensor_id, data in latest:
+            updates[f"data/{sensor_id}"] = data
+        for sensor_id, key, data in history:
+            updates[f"history/{sensor_id}/{key}"] = data
+
+        started = time.monotonic()
+        ok = True
+        try:
+            if updates:
+                self.update_fn(updates)
+        except Exception as e:
+            ok = False
+            logger.error("firebase write failed, requeueing paths=%d error=%s", len(updates), e)
+
+        with self._cond:
+            self._in_flight -= 1
+            if ok:
+                self.written += len(updates)
+                self.batches += 1
+                self.last_flush_latency = time.monotonic() - started
+            else:
+                self.errors += 1
+                self.last_error = time.strftime("%Y-%m-%d %H:%M:%S")
+                self._requeue(latest, history)
+            self._cond.notify_all()
+        return ok
+
+    def _requeue(self, latest, history):
+        """Put a failed batch back without overwriting newer pending values"""
+        for sensor_id, data in reversed(latest):
+            if sensor_id not in self._latest:
+                self._latest[sensor_id] = data
+                self._latest.move_to_end(sensor_id, last=False)
+        if history:
+            self._history = history + self._history
+        if self._depth() and self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
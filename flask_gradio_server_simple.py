@@ -1,28 +1,118 @@
-from flask import Flask, jsonify, abort, make_response, request
-import firebase_admin
-from firebase_admin import credentials, db
+from flask import Flask, jsonify, abort, make_response, request, Response, stream_with_context, g
 import datetime
-import gradio as gr
-from collections import deque
 import time
 import os
+import threading
+import gzip
+import atexit
+import signal
+import sys
+import json
+import hmac
+import math
+from firebase_writer import FirebaseWriter
+from storage import open_storage
+from sensor_cache import TTLCache
+from timeseries import TimeSeriesBuffer
+from history_store import HistoryStore
+from rollups import RollupSet
+from live_stream import Broadcaster, format_event
+from rules import RuleEngine, load_config
+from risk import RiskModel
+from stations import StationState, StationRegistry, fire_status, valid_station_id
+from shared_state import OP_VALUE, OP_HISTORY, current_backend
+from deadband import Deadband, load_config as load_deadband_config
+import export
+from logs import route_logger, setup_logging
+from metrics import Registry
+from profiler import SamplingProfiler
+from admission import Admission, ConcurrencyGate, RateLimiter, LIVE, REPLAY
+
+# Logging: LOG_LEVEL=DEBUG logs every ingested value. Records are written by a
+# background thread, a full queue (LOG_QUEUE_SIZE) drops records instead of blocking ingest
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logger, log_handler, log_listener = setup_logging('forest_fire', LOG_LEVEL,
+                                                  queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+# werkzeug's access log line per request goes through the same queue, at LOG_LEVEL; ACCESS_LOG=0 turns it off
+ACCESS_LOG = os.environ.get('ACCESS_LOG', '1') == '1'
+route_logger('werkzeug', log_handler, LOG_LEVEL if ACCESS_LOG else 'WARNING')
 
 # Firebase Configuration
 FIREBASE_DB_URL = "https://forest-fire-forcast-default-rtdb.firebaseio.com"
 FIREBASE_CERTIFICATE_PATH = "firebase_admin.json"
-cred = credentials.Certificate(FIREBASE_CERTIFICATE_PATH)
-firebase_admin.initialize_app(cred, {'databaseURL': FIREBASE_DB_URL})
+
+# Storage backend: "firebase" (connects on first use) or "sqlite" for running offline.
+# SQLITE_PATH=:memory: keeps the sqlite backend entirely in memory
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'firebase')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'forest_fire.db')
+storage = open_storage(STORAGE_BACKEND, database_url=FIREBASE_DB_URL,
+                       certificate_path=FIREBASE_CERTIFICATE_PATH, sqlite_path=SQLITE_PATH)
+
+# Prometheus metrics (/metrics), kept per process: serve.py workers are told apart by the worker label
+_worker = current_backend().stats().get('worker')
+metrics = Registry({'worker': _worker} if _worker is not None else None)
+REQUESTS = metrics.counter('forest_fire_requests_total', 'HTTP requests by method, route and status',
+                           ('method', 'route', 'status'))
+REQUEST_SECONDS = metrics.histogram('forest_fire_request_seconds', 'HTTP request latency by method and route',
+                                    ('method', 'route'))
+# Ingest stages: parse, state, rules, history, risk, firebase
+STAGE_SECONDS = metrics.histogram('forest_fire_ingest_stage_seconds', 'Time spent in each ingest stage', ('stage',))
+INGESTED = metrics.counter('forest_fire_ingested_values_total', 'Sensor values applied to the live state',
+                           ('station',))
+
+# On-demand sampling profiler (/api/admin/profile), idle until an admin starts a profile
+profiler = SamplingProfiler()
+
+def _timed_storage_update(updates):
+    # Runs on the Firebase writer thread
+    with STAGE_SECONDS.time('firebase'):
+        storage.update(updates)
+
+# Sensor writes go through a background write-behind queue instead of the request thread.
+# Set FIREBASE_FULL_HISTORY=1 to also keep every sample under /history/<id>/
+FIREBASE_FULL_HISTORY = os.environ.get('FIREBASE_FULL_HISTORY', '0') == '1'
+firebase_writer = FirebaseWriter(
+    _timed_storage_update,
+    max_pending=int(os.environ.get('FIREBASE_MAX_PENDING', 1000)),
+    batch_size=int(os.environ.get('FIREBASE_BATCH_SIZE', 100)),
+    flush_interval=float(os.environ.get('FIREBASE_FLUSH_INTERVAL', 0.5)),
+    full_history=FIREBASE_FULL_HISTORY
+)
+firebase_writer.start()
+
+# Read-through caches so polling clients are served from memory instead of Firebase.
+# Ingest writes through to data_cache, registry changes invalidate registry_cache.
+SENSOR_CACHE_TTL = float(os.environ.get('SENSOR_CACHE_TTL', 10))
+registry_cache = TTLCache(ttl=SENSOR_CACHE_TTL)
+data_cache = TTLCache(ttl=SENSOR_CACHE_TTL)
+history_cache = TTLCache(ttl=SENSOR_CACHE_TTL)
+
+def _on_registry_change(event):
+    # Firebase listener callback, runs on the SDK's listener thread
+    registry_cache.invalidate('sensors')
+
+# Set SENSOR_CACHE_LISTEN=1 to keep the registry cache fresh with a Firebase listener
+if os.environ.get('SENSOR_CACHE_LISTEN', '0') == '1':
+    registry_listener = storage.listen_sensors(_on_registry_change)
 
 # Flask Configuration
 NOT_FOUND = 'Not found'
 BAD_REQUEST = 'Bad request'
+SERVICE_UNAVAILABLE = 'Write queue full, retry later'
+FORBIDDEN = 'Forbidden'
+TOO_MANY_REQUESTS = 'Too many requests, retry later'
 app = Flask(__name__)
 
-# Gradio Configuration
-MAX_HISTORY = 20
-data_history = deque(maxlen=MAX_HISTORY)
+# History Configuration
+MAX_HISTORY = 20  # rows shown on the dashboard
+HISTORY_CAPACITY = int(os.environ.get('HISTORY_CAPACITY', 17280))  # samples kept per station, default 24h at 5s
+# Durable local history (one subdirectory per station), set HISTORY_STORE_DIR to an empty string to disable
+HISTORY_STORE_DIR = os.environ.get('HISTORY_STORE_DIR', 'history_data')
+HISTORY_STORE_FSYNC = os.environ.get('HISTORY_STORE_FSYNC', '0') == '1'
+# Largest raw sample count /api/history answers, bigger ranges go to ?resolution= or /api/export
+HISTORY_MAX_ROWS = int(os.environ.get('HISTORY_MAX_ROWS', 20000))
 
-# Sensor ID Mapping
+# Sensor ID Mapping of the default station
 SENSOR_IDS = {
     "MQ135_CO2": "-OMZ52hULVlcWp1HjY_3",
     "MQ2_Smoke": "-OMZ5FRWYXmtZDwXTIGk",
@@ -34,40 +124,164 @@ SENSOR_IDS = {
     "Fire_Probability": "-OMZ5SCV9iN5PHStzJMR"
 }
 
-# Data Storage
-latest_data = {
-    "MQ135_CO2": 0,
-    "MQ2_Smoke": 0,
-    "MQ7_CO": 0,
-    "MQ9_Flammable": 0,
-    "Temperature": 0,
-    "Humidity": 0,
-    "Wind_Speed": 0,
-    "Fire_Probability": -1,  # -1 means unknown/camera disconnected
-    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-}
+# Station Configuration
+# Routes without a station (/api/debug, /dashboard, ...) use the default station.
+# STATIONS_PATH may point to a JSON file {"<station id>": {"<sensor name>": "<sensor id>", ...}, ...}
+DEFAULT_STATION = os.environ.get('DEFAULT_STATION', '1')
+STATIONS_PATH = os.environ.get('STATIONS_PATH', '')
+STATION_SHARDS = int(os.environ.get('STATION_SHARDS', 16))
+# Frames naming an unknown station create it, at most until MAX_STATIONS stations exist
+# (keep it at or below serve.py's journal station table). STATIONS_ALLOW_NEW=0 only
+# accepts the configured stations and those with stored history
+MAX_STATIONS = int(os.environ.get('MAX_STATIONS', 64))
+STATIONS_ALLOW_NEW = os.environ.get('STATIONS_ALLOW_NEW', '1') == '1'
+
+# One column per sensor in the history buffer and store
+HISTORY_COLUMNS = list(SENSOR_IDS.keys())
+
+# Live state changes go through the state backend. A single process applies them
+# directly, workers started by serve.py share them through a shared-memory journal.
+state_backend = current_backend()
+
+# Threshold rules (rules.json), evaluated incrementally as values arrive
+RULES_PATH = os.environ.get('RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+RULES_CONFIG = load_config(RULES_PATH)
+
+# Change-only storage (deadband.json): values within a sensor's deadband of the last stored
+# value are applied to the live state and rules but not written to Firebase or history.
+# Set DEADBAND_PATH to an empty string to store every value
+DEADBAND_PATH = os.environ.get('DEADBAND_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deadband.json'))
+deadband = Deadband.from_config(load_deadband_config(DEADBAND_PATH), RULES_CONFIG) if DEADBAND_PATH else None
+
+def _store_value(station_id, sensor_name, value, when):
+    """True if a value should be written to Firebase and history, False if it is within the deadband
+
+    The value only becomes the deadband reference with _stored_value(), once its write is queued.
+    """
+    return deadband is None or deadband.check((station_id, sensor_name), sensor_name, value, when, record=False)
+
+def _stored_value(station_id, sensor_name, value, when):
+    if deadband is not None:
+        deadband.record((station_id, sensor_name), sensor_name, value, when)
+
+# Online fire-risk scoring from rolling per-sensor statistics plus the camera
+RISK_HALF_LIFE = float(os.environ.get('RISK_HALF_LIFE', 300))  # seconds
+RISK_RATE_WINDOWS = [float(w) for w in os.environ.get('RISK_RATE_WINDOWS', '60,300,900').split(',')]
+# Samples closer together than this (seconds) are not used for rates of change
+RISK_MIN_RATE_DT = float(os.environ.get('RISK_MIN_RATE_DT', 1.0))
+
+def _new_station(station_id):
+    """Build the state of one station, restoring it from its history store if there is one"""
+    store = None
+    if HISTORY_STORE_DIR:
+        # With several workers only one of them writes the store, the others follow it
+        store = HistoryStore(os.path.join(HISTORY_STORE_DIR, f"station-{station_id}"), HISTORY_COLUMNS,
+                             fsync=HISTORY_STORE_FSYNC, read_only=not state_backend.persist)
+    station = StationState(
+        station_id,
+        HISTORY_COLUMNS,
+        history=TimeSeriesBuffer(HISTORY_COLUMNS, HISTORY_CAPACITY),
+        rollups=RollupSet(HISTORY_COLUMNS),
+        rules=RuleEngine.from_config(RULES_CONFIG),
+        risk=RiskModel([name for name in HISTORY_COLUMNS if name != "Fire_Probability"],
+                       half_life=RISK_HALF_LIFE, rate_windows=RISK_RATE_WINDOWS,
+                       min_rate_dt=RISK_MIN_RATE_DT),
+        store=store
+    )
+    # After startup a follower worker would restore changes the writer already persisted
+    # and then replay them from the journal again, new stations start empty there instead
+    restored = station.restore(from_store=state_backend.persist or not stations_loaded)
+    if restored:
+        logger.info("history restored station=%s samples=%d", station_id, restored)
+    return station
+
+stations = StationRegistry(_new_station, shards=STATION_SHARDS, max_stations=MAX_STATIONS)
+
+def _load_stations():
+    """Register configured stations and bring up every station that has stored history"""
+    station_sensors = {DEFAULT_STATION: SENSOR_IDS}
+    if STATIONS_PATH:
+        with open(STATIONS_PATH, encoding='utf-8') as f:
+            station_sensors.update(json.load(f))
+    for station_id, sensor_ids in station_sensors.items():
+        stations.register_sensors(station_id, sensor_ids)
+        stations.get_or_create(station_id)
+    if HISTORY_STORE_DIR and os.path.isdir(HISTORY_STORE_DIR):
+        for name in os.listdir(HISTORY_STORE_DIR):
+            if name.startswith('station-') and valid_station_id(name[8:]):
+                stations.get_or_create(name[8:])
+
+stations_loaded = False
+_load_stations()
+stations_loaded = True
+
+# Server-Sent Events push of state deltas (/api/stream)
+STREAM_CLIENT_BUFFER = int(os.environ.get('STREAM_CLIENT_BUFFER', 64))
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 256))
+STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+# Bulk export (/api/export) streams chunks of EXPORT_CHUNK_ROWS samples, at most
+# EXPORT_MAX_CONCURRENT exports run at once (across all serve.py workers) so they cannot starve ingest
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 5000))
+EXPORT_MAX_CONCURRENT = int(os.environ.get('EXPORT_MAX_CONCURRENT', 2))
+EXPORT_RETRY_AFTER = 10  # seconds
+export_limiter = export.ExportLimiter(EXPORT_MAX_CONCURRENT, shared=state_backend.export_count)
+# Longest a /api/status long-poll is held
+STATUS_MAX_WAIT = float(os.environ.get('STATUS_MAX_WAIT', 30))
+broadcaster = Broadcaster(client_buffer=STREAM_CLIENT_BUFFER, max_clients=STREAM_MAX_CLIENTS)
 
 # API routes
 def _get_sensor(id, limit=20):
-    sensor_ref = db.reference('/data').child(id)
-    return sensor_ref.get()
+    sensor = data_cache.get_or_load(id, lambda: storage.get_data(id))
+    if not sensor or not FIREBASE_FULL_HISTORY:
+        return sensor
+    # Only fetch the last `limit` history samples, not the whole node
+    history = history_cache.get_or_load(
+        (id, limit),
+        lambda: storage.get_history(id, limit)
+    )
+    sensor = dict(sensor)
+    sensor['history'] = history or {}
+    return sensor
+
+def _cache_sensor_write(id, data):
+    """Write an ingested value through to the read caches"""
+    data_cache.put(id, data)
+    if FIREBASE_FULL_HISTORY:
+        history_cache.invalidate_where(lambda key: key[0] == id)
+
+def _station_or_404(station_id):
+    station = stations.get(station_id)
+    if station is None:
+        abort(404)
+    return station
 
 @app.errorhandler(404)
 def not_found(error):
     return make_response(jsonify({'error': NOT_FOUND}), 404)
 
+@app.errorhandler(403)
+def forbidden(error):
+    return make_response(jsonify({'error': FORBIDDEN}), 403)
+
 @app.errorhandler(400)
 def bad_request(error):
     return make_response(jsonify({'error': BAD_REQUEST}), 400)
 
+@app.errorhandler(503)
+def service_unavailable(error):
+    return make_response(jsonify({'error': SERVICE_UNAVAILABLE}), 503)
+
 @app.route('/api/sensors', methods=['GET'])
 def get_sensors():
-    result = db.reference('/sensors').get()
+    result = registry_cache.get_or_load('sensors', storage.list_sensors)
     return jsonify(result), 200
 
 @app.route('/api/sensors/<id>', methods=['GET'])
 def get_sensor(id):
-    sensor = _get_sensor(id)
+    limit = request.args.get('limit', 20, type=int)
+    if limit <= 0:
+        abort(400)
+    sensor = _get_sensor(id, limit)
     if not sensor:
         abort(404)
     return jsonify(sensor), 200
@@ -81,36 +295,144 @@ def create_sensor():
     sensor_name = request.json.get('sensor_name')
     
     sensor_info = {"sensor_name": sensor_name, "description": description}
-    sensor_id = db.reference('/sensors').push(sensor_info).key
+    sensor_id = storage.create_sensor(sensor_info)
+    registry_cache.invalidate('sensors')
     return str(sensor_id), 201
 
+# Most frames one batch request may carry (gateway spool replay)
+FRAME_BATCH_MAX = int(os.environ.get('FRAME_BATCH_MAX', 500))
+
+# Ingest admission control, set INGEST_ADMISSION=0 to turn it off.
+# Token buckets (rate per second, burst) per sensor ID and per station, shared by all
+# serve.py workers, and a cap on concurrent ingest requests per worker with a bounded
+# wait queue for live data. Replayed backlog (frame batches and frames marked
+# "replay": true) never waits for a slot and yields to waiting live requests. It draws on
+# its own per-station budget of REPLAY_RATE frames per second instead of the live buckets,
+# so a spool drains well above the live rate but not without bound. Single-sensor PUTs
+# are always live
+INGEST_ADMISSION = os.environ.get('INGEST_ADMISSION', '1') == '1'
+SENSOR_RATE = float(os.environ.get('SENSOR_RATE', 1))
+SENSOR_BURST = float(os.environ.get('SENSOR_BURST', 10))
+STATION_RATE = float(os.environ.get('STATION_RATE', 10))
+STATION_BURST = float(os.environ.get('STATION_BURST', 50))
+REPLAY_RATE = float(os.environ.get('REPLAY_RATE', 100))  # frames per second per station
+REPLAY_BURST = float(os.environ.get('REPLAY_BURST', FRAME_BATCH_MAX))
+INGEST_MAX_ACTIVE = int(os.environ.get('INGEST_MAX_ACTIVE', 8))
+INGEST_MAX_WAITING = int(os.environ.get('INGEST_MAX_WAITING', 32))
+INGEST_WAIT_TIMEOUT = float(os.environ.get('INGEST_WAIT_TIMEOUT', 1.0))
+INGEST_ENDPOINTS = {'update_sensor', 'update_frame', 'update_station_frame'}
+admission = None
+if INGEST_ADMISSION:
+    admission = Admission(
+        ConcurrencyGate(INGEST_MAX_ACTIVE, INGEST_MAX_WAITING, INGEST_WAIT_TIMEOUT),
+        RateLimiter({
+            'sensor': (SENSOR_RATE, SENSOR_BURST),
+            'station': (STATION_RATE, STATION_BURST),
+            'replay': (REPLAY_RATE, REPLAY_BURST),
+        }, table=state_backend.rate_buckets)
+    )
+
+def _is_replay(body):
+    """True for a frame batch or a frame marked as replayed (frame endpoints only)"""
+    return isinstance(body, dict) and ('frames' in body or body.get('replay') is True)
+
+def _too_many_requests(reason, retry_after):
+    response = make_response(jsonify({'error': TOO_MANY_REQUESTS, 'reason': reason}), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def _charge(costs):
+    """Debit the ingest rate limits ({(kind, key): cost}), returns a 429 response if one of them ran out"""
+    if admission is None:
+        return None
+    refused = admission.charge([(kind, key, cost) for (kind, key), cost in costs.items()])
+    return _too_many_requests(*refused) if refused else None
+
+def _live_costs(sensor_ids):
+    """Per-sensor and per-station charges of live values
+
+    Only IDs that resolve to a station get their own bucket, unknown IDs share
+    one, so made-up IDs cannot fill the bucket table.
+    """
+    costs = {}
+    for id in sensor_ids:
+        location = stations.resolve(id)
+        keys = [('sensor', id), ('station', location[0])] if location else [('sensor', None)]
+        for key in keys:
+            costs[key] = costs.get(key, 0) + 1
+    # A station pays once per request, however many of its sensors it carries
+    return {key: 1 if key[0] == 'station' else cost for key, cost in costs.items()}
+
+def _replay_costs(frames):
+    """Replay charges: one per frame to the budget of the frame's station"""
+    costs = {}
+    for frame in frames:
+        key = ('replay', _frame_station(frame))
+        costs[key] = costs.get(key, 0) + 1
+    return costs
+
+def _frame_station(frame):
+    """Known station a frame belongs to, None if it names none"""
+    if not isinstance(frame, dict):
+        return None
+    if 'station' in frame:
+        station_id = str(frame['station'])
+        return station_id if stations.get(station_id) is not None else None
+    if isinstance(frame.get('sensors'), dict):
+        for id in frame['sensors']:
+            location = stations.resolve(id)
+            if location:
+                return location[0]
+    return None
+
+def _sensor_value(value):
+    """A sensor value as a finite float, None if it is not one"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
 @app.route('/api/sensors/<id>', methods=['PUT'])
 def update_sensor(id):
-    if not request.json:
+    with STAGE_SECONDS.time('parse'):
+        body = request.json
+    if not body:
         abort(400)
+    logger.debug("sensor data received id=%s data=%s", id, body)
+    throttled = _charge(_live_costs([id]))
+    if throttled is not None:
+        return throttled
     
-    # Print received data for debugging
-    print(f"Received data for sensor ID {id}: {request.json}")
-    
-    # Update Firebase database
-    entry_ref = db.reference('/data').child(id)
-    data = request.json.copy()
+    data = body.copy()
+    # Checked before anything is queued or applied, a bad value must not leave a half-updated station
+    if 'value' in data:
+        data['value'] = _sensor_value(data['value'])
+        if data['value'] is None:
+            abort(400)
     data['last_updated'] = datetime.datetime.now().strftime("%Y-%m-%d-%H:%M:%S")
-    entry_ref.set(data)
+    now = time.time()
     
-    # Find corresponding sensor name by ID
-    sensor_name = None
-    for name, sid in SENSOR_IDS.items():
-        if sid == id:
-            sensor_name = name
-            break
+    # Reverse index lookup instead of scanning every station's sensor IDs
+    location = stations.resolve(id)
+    # Values within the deadband still reach the live state and rules, but are not stored
+    store = not location or 'value' not in data or _store_value(location[0], location[1], data['value'], now)
     
-    if sensor_name and 'value' in data:
-        old_value = latest_data[sensor_name]
-        latest_data[sensor_name] = data['value']
-        latest_data['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        print(f"Updated sensor {sensor_name} from {old_value} to {data['value']}")
+    # Queue the Firebase write, the writer thread flushes it in the background
+    if store:
+        if not firebase_writer.submit(id, data):
+            # Not remembered by the deadband, so the client's retry is stored
+            abort(503)
+        _cache_sensor_write(id, data)
+        if location and 'value' in data:
+            _stored_value(location[0], location[1], data['value'], now)
+    
+    if location and 'value' in data:
+        station_id, sensor_name = location
+        station = stations.get_or_create(station_id)
+        ops = [(OP_VALUE, sensor_name, data['value'], now)]
         
         # Only add to history after receiving updates for all sensors
         # or when a significant time has passed since the last history entry
@@ -119,204 +441,797 @@ def update_sensor(id):
         # Add to history if this is a fire probability update (camera status)
         if sensor_name == "Fire_Probability":
             add_to_history = True
-            
+        
+        with station.lock:
+            last_history = station.history.last_time()
+        
         # Or add to history if we haven't added any entries yet
-        if len(data_history) == 0:
+        if last_history is None:
             add_to_history = True
         
         # Or add to history if some time has passed
         time_threshold = 5  # seconds
-        if len(data_history) > 0:
-            try:
-                last_update = datetime.datetime.strptime(data_history[-1]['timestamp'], "%Y-%m-%d %H:%M:%S")
-                if (datetime.datetime.now() - last_update).total_seconds() > time_threshold:
-                    add_to_history = True
-            except:
-                add_to_history = True
-        
-        if add_to_history:
-            # Create a complete data record and add to history
-            history_entry = latest_data.copy()
-            data_history.append(history_entry)
-            print(f"Added new history entry at {history_entry['timestamp']}")
+        if last_history is not None and now - last_history > time_threshold:
+            add_to_history = True
         
-        # Check fire risk if it's not directly from the camera
-        if sensor_name != "Fire_Probability":
-            check_fire_risk()
+        if add_to_history and store:
+            ops.append((OP_HISTORY, None, None, now))
+        state_backend.submit(station_id, ops)
     else:
-        if not sensor_name:
-            print(f"WARNING: Received data for unknown sensor ID: {id}")
-            print(f"Available sensor IDs: {SENSOR_IDS}")
+        if not location:
+            logger.warning("unknown sensor id=%s", id)
         elif 'value' not in data:
-            print(f"WARNING: Received data doesn't contain 'value' field: {data}")
+            logger.warning("sensor data without value id=%s data=%s", id, data)
     
     return jsonify({}), 200
 
+@app.route('/api/frames', methods=['PUT'])
+def update_frame():
+    """Apply a whole LoRa frame (all sensor values, one timestamp) in one request
+
+    `sensors` is keyed by Firebase sensor ID, or by sensor name when the frame
+    also names its `station`. {"frames": [frame, ...]} applies a batch in order.
+    """
+    with STAGE_SECONDS.time('parse'):
+        body = request.json
+    if isinstance(body, dict) and 'frames' in body:
+        return _apply_frame_batch(body['frames'])
+    with STAGE_SECONDS.time('parse'):
+        prepared = _prepare_frame(body)
+    if prepared is None:
+        abort(400)
+    throttled = _charge(_replay_costs([body]) if _is_replay(body) else _live_costs(prepared[0]))
+    if throttled is not None:
+        return throttled
+    result = _apply_frame(*prepared)
+    if result is None:
+        abort(503)
+    return jsonify(result), 200
+
+@app.route('/api/stations/<station_id>/frames', methods=['PUT'])
+def update_station_frame(station_id):
+    """Apply a frame whose sensors are keyed by sensor name to one station"""
+    with STAGE_SECONDS.time('parse'):
+        body = request.json
+        prepared = _prepare_frame(body, station_id)
+    if prepared is None:
+        abort(400)
+    throttled = _charge({('replay', station_id): 1} if _is_replay(body) else _live_costs(prepared[0]))
+    if throttled is not None:
+        return throttled
+    result = _apply_frame(*prepared)
+    if result is None:
+        abort(503)
+    return jsonify(result), 200
+
+def _apply_frame_batch(frames):
+    """Apply frames in order; invalid frames are counted, not fatal to the batch"""
+    if not isinstance(frames, list) or len(frames) > FRAME_BATCH_MAX:
+        abort(400)
+    # Batches are backlog replay, charged to the replay budgets of their stations as a whole
+    throttled = _charge(_replay_costs(frames))
+    if throttled is not None:
+        return throttled
+    accepted = 0
+    rejected = 0
+    applied = 0
+    for frame in frames:
+        prepared = _prepare_frame(frame)
+        if prepared is None:
+            rejected += 1
+            accepted += 1
+            continue
+        result = _apply_frame(*prepared)
+        if result is None:
+            # Write queue full: the sender resends everything after the first `accepted` frames
+            return jsonify({'error': SERVICE_UNAVAILABLE, 'accepted': accepted}), 503
+        accepted += 1
+        applied += result['applied']
+    return jsonify({'accepted': accepted, 'rejected': rejected, 'applied': applied}), 200
+
+def _frame_time(frame):
+    # Frame time is epoch seconds from the gateway, fall back to receive time
+    try:
+        when = float(frame['timestamp'])
+        datetime.datetime.fromtimestamp(when)
+        return when
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return time.time()
+
+def _prepare_frame(frame, station_id=None):
+    """Sensor values of a frame keyed by sensor ID as (sensors, time, unknown), None if invalid
+
+    Values are converted to float, a frame with a non-numeric or non-finite value is invalid,
+    and so is a frame for a station that may not be created.
+    """
+    if not isinstance(frame, dict) or not isinstance(frame.get('sensors'), dict) or not frame['sensors']:
+        return None
+    if station_id is None and 'station' in frame:
+        station_id = str(frame['station'])
+    values = {}
+    for key, value in frame['sensors'].items():
+        values[key] = _sensor_value(value)
+        if values[key] is None:
+            return None
+    if station_id is None:
+        return values, _frame_time(frame), []
+    
+    # Translate sensor names of a station frame to sensor IDs
+    if not valid_station_id(station_id):
+        return None
+    unknown = [name for name in values if name not in HISTORY_COLUMNS]
+    if len(unknown) == len(values):
+        return None
+    if stations.get(station_id) is None:
+        # Unknown station: refused when new stations are off or MAX_STATIONS is reached
+        if not STATIONS_ALLOW_NEW or stations.get_or_create(station_id, limit=True) is None:
+            return None
+    sensors = {}
+    for name, value in values.items():
+        if name not in HISTORY_COLUMNS:
+            continue
+        # Stations without registered Firebase IDs are stored under /data/stations/<station>/<sensor>
+        sensor_id = stations.sensor_id(station_id, name)
+        if sensor_id is None:
+            sensor_id = f"stations/{station_id}/{name}"
+            stations.register_sensors(station_id, {name: sensor_id})
+        sensors[sensor_id] = value
+    return sensors, _frame_time(frame), unknown
+
+def _apply_frame(sensors, when, unknown):
+    """Queue the Firebase writes of a frame and apply it, returns None if the write queue is full"""
+    last_updated = datetime.datetime.fromtimestamp(when).strftime("%Y-%m-%d-%H:%M:%S")
+    
+    # Group values by station, each station is applied under its own lock.
+    # Only values outside the deadband are written, the state and rules get all of them
+    by_station = {}
+    stored = {}
+    writes = {}
+    unknown = list(unknown)
+    for id, value in sensors.items():
+        location = stations.resolve(id)
+        if location:
+            by_station.setdefault(location[0], []).append((OP_VALUE, location[1], value, when))
+            if not _store_value(location[0], location[1], value, when):
+                continue
+            stored.setdefault(location[0], []).append((location[1], value))
+        else:
+            unknown.append(id)
+        writes[id] = {'value': value, 'last_updated': last_updated}
+    
+    # Queued writes of one frame are flushed together as one multi-path update
+    if writes and not firebase_writer.submit_many(writes):
+        return None
+    for id, data in writes.items():
+        _cache_sensor_write(id, data)
+    for station_id, values in stored.items():
+        for sensor_name, value in values:
+            _stored_value(station_id, sensor_name, value, when)
+    
+    applied = 0
+    for station_id, ops in by_station.items():
+        applied += len(ops)
+        # A frame is a complete snapshot, so it becomes one history entry unless nothing moved
+        if station_id in stored:
+            ops.append((OP_HISTORY, None, None, when))
+        state_backend.submit(station_id, ops)
+    
+    if unknown:
+        logger.warning("frame with unknown sensors unknown=%s", unknown)
+    
+    return {'applied': applied, 'stored': len(writes), 'unknown': unknown}
+
+def _apply_ops(station_id, ops, local):
+    """Apply a batch of state changes to a station (called by the state backend)
+
+    `local` is False for changes ingested by another worker.
+    """
+    station = stations.get_or_create(station_id)
+    changed = {}
+    values = 0
+    history = None
+    # Apply every change under one lock so readers never see a half-applied frame
+    with station.lock:
+        for op, sensor_name, value, when in ops:
+            if op == OP_VALUE:
+                values += 1
+                if _apply_value(station, sensor_name, value, when, local):
+                    changed[sensor_name] = value
+            elif op == OP_HISTORY:
+                _add_history_entry(station, when, local)
+                history = when
+        station.update_status()
+        delta = station.delta(changed, history)
+    if not local:
+        # Another worker ingested these, drop the cached Firebase copies it replaced
+        for sensor_name in changed:
+            sensor_id = stations.sensor_id(station_id, sensor_name)
+            if sensor_id is None:
+                sensor_id = f"stations/{station_id}/{sensor_name}"
+                stations.register_sensors(station_id, {sensor_name: sensor_id})
+            data_cache.invalidate(sensor_id)
+    if delta:
+        broadcaster.publish('delta', delta, topic=station_id)
+    INGESTED.inc(station_id, amount=values)
+    if local and values > 1:
+        logger.debug("frame applied station=%s sensors=%d time=%s", station_id, values, station.latest['timestamp'])
+    # Rescore fire risk, camera updates count too
+    check_fire_risk(station, local)
+
+state_backend.start(_apply_ops)
+
+_shut_down = False
+
+def shutdown():
+    """Stop state sync, flush pending Firebase writes, close the history stores, then stop logging
+
+    Runs at exit. serve.py workers leave through os._exit, which skips atexit, so they call it themselves.
+    """
+    global _shut_down
+    if _shut_down:
+        return
+    _shut_down = True
+    state_backend.stop()
+    if not firebase_writer.stop():
+        logger.warning("firebase writes still pending at shutdown queue_depth=%d", firebase_writer.stats()['queue_depth'])
+    for station in stations.all():
+        if station.store is not None:
+            station.store.close()
+    log_listener.stop()
+
+atexit.register(shutdown)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiler.active:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        profiler.begin_request(route, request.method, request.path)
+
+@app.teardown_request
+def end_profiled_request(exc):
+    profiler.end_request()
+
+@app.after_request
+def record_request_metrics(response):
+    # Route pattern, not the raw path, so station and sensor IDs do not blow up the label set
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(request.method, route, str(response.status_code))
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, request.method, route)
+    return response
+
+@app.before_request
+def sync_state():
+    # Catch up on changes ingested by other workers so every read sees them
+    state_backend.sync()
+
+@app.before_request
+def admit_ingest():
+    """Take a concurrency slot for an ingest request, or refuse it with 429"""
+    if admission is None or request.endpoint not in INGEST_ENDPOINTS:
+        return None
+    replay = request.endpoint != 'update_sensor' and _is_replay(request.get_json(silent=True))
+    priority = REPLAY if replay else LIVE
+    refused = admission.enter(priority)
+    if refused is not None:
+        return _too_many_requests(*refused)
+    g.ingest_admitted = True
+    return None
+
+@app.teardown_request
+def leave_ingest(exc):
+    if g.pop('ingest_admitted', False):
+        admission.leave()
+
+def _apply_value(station, sensor_name, value, when, log=True):
+    """Store one sensor value, returns True if it changed (caller holds station.lock)"""
+    with STAGE_SECONDS.time('state'):
+        old_value, changed = station.apply_value(sensor_name, value, when)
+    # Rules see every sample, including values the deadband kept out of storage
+    with STAGE_SECONDS.time('rules'):
+        station.rules.update(sensor_name, value)
+    if log:
+        logger.debug("sensor updated station=%s sensor=%s old=%s new=%s", station.station_id, sensor_name, old_value, value)
+    return changed
+
+def _add_history_entry(station, when, log=True):
+    """Append the station's current sensor values to history (caller holds station.lock)"""
+    with STAGE_SECONDS.time('history'):
+        station.add_history_entry(when)
+    if log:
+        logger.debug("history entry added station=%s time=%s", station.station_id, station.latest['timestamp'])
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """Server-Sent Events: a snapshot on connect, then deltas when the state changes
+
+    ?station=<id> limits the stream to one station, otherwise deltas of all
+    stations are sent and the snapshot is of the default station.
+    """
+    station_id = request.args.get('station')
+    station = _station_or_404(station_id or DEFAULT_STATION)
+    sub = broadcaster.subscribe(station_id)
+    if sub is None:
+        abort(503)
+    
+    def events():
+        try:
+            with station.lock:
+                snapshot = station.snapshot()
+            yield format_event('snapshot', snapshot)
+            while True:
+                message = sub.get(STREAM_HEARTBEAT)
+                # A comment line keeps proxies from closing an idle connection
+                yield message if message is not None else ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(sub)
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _history_rows(station, n):
+    """Newest n history samples as row dicts, oldest first (for small displays only)"""
+    with station.lock:
+        times, columns = station.history.last(n)
+        times = times.tolist()
+        columns = {name: values.tolist() for name, values in columns.items()}
+    rows = []
+    for i, when in enumerate(times):
+        row = {name: _json_number(values[i]) for name, values in columns.items()}
+        row['timestamp'] = datetime.datetime.fromtimestamp(when).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append(row)
+    return rows
+
+def _json_number(value):
+    # NaN (missing/non-numeric sample) is not valid JSON
+    return None if value != value else value
+
+def _parse_epoch(value):
+    """Parse a from/to query value given as epoch seconds or ISO 8601"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/stations', methods=['GET'])
+def get_stations():
+    """Summary of every station"""
+    result = []
+    for station in stations.all():
+        with station.lock:
+            result.append(station.summary())
+    return jsonify(result), 200
+
+@app.route('/api/stations/<station_id>', methods=['GET'])
+def get_station(station_id):
+    """Latest values and status of one station"""
+    station = _station_or_404(station_id)
+    with station.lock:
+        result = station.summary()
+        result['latest_data'] = dict(station.latest)
+    result['sensor_ids'] = stations.sensor_ids(station_id)
+    return jsonify(result), 200
+
+@app.route('/api/status', methods=['GET'], defaults={'station_id': None})
+@app.route('/api/stations/<station_id>/status', methods=['GET'])
+def get_status(station_id):
+    """Compact status for actuators: "<version> <warnings> <fire status code>\\n" as plain text
+
+    Fire status codes: -1 camera disconnected, 0 safe, 1 low, 2 medium, 3 high risk.
+    With ?since=<version> the request is held until the status version differs
+    from it or ?timeout=<seconds> (at most STATUS_MAX_WAIT) passes, so an
+    actuator reacts as soon as a warning changes without polling.
+    """
+    station = _station_or_404(station_id or request.args.get('station', DEFAULT_STATION))
+    since = request.args.get('since', type=int)
+    timeout = min(max(request.args.get('timeout', STATUS_MAX_WAIT, type=float), 0.0), STATUS_MAX_WAIT)
+    with station.lock:
+        if since is not None:
+            station.wait_status(since, timeout)
+        version, warnings, fire_code = station.status()
+    response = make_response(f"{version} {warnings} {fire_code}\n", 200)
+    response.mimetype = 'text/plain'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/history', methods=['GET'], defaults={'station_id': None})
+@app.route('/api/stations/<station_id>/history', methods=['GET'])
+def get_history(station_id):
+    """Range or last-N query over sensor history, returned column-wise
+
+    With ?resolution=<seconds> the coarsest rollup tier that satisfies it and still
+    holds ?from= is used (a coarser one if the fine tiers have dropped it).
+    Raw queries over more than HISTORY_MAX_ROWS samples get 413.
+    """
+    station = _station_or_404(station_id or request.args.get('station', DEFAULT_STATION))
+    sensors = request.args.get('sensors')
+    if sensors:
+        sensors = [name.strip() for name in sensors.split(',') if name.strip()]
+        if any(name not in HISTORY_COLUMNS for name in sensors):
+            abort(400)
+    else:
+        sensors = HISTORY_COLUMNS
+    try:
+        start = _parse_epoch(request.args.get('from'))
+        end = _parse_epoch(request.args.get('to'))
+        last = request.args.get('last', type=int)
+    except ValueError:
+        abort(400)
+    
+    resolution = request.args.get('resolution', type=float)
+    tier = station.rollups.plan(resolution, start) if resolution else None
+    
+    if tier is not None:
+        # Coarse request, answer from the rollup tier instead of raw samples
+        with station.lock:
+            times, columns = tier.query(start, end, sensors)
+            # Copied so the JSON is built after the lock is released
+            times = times.copy()
+            columns = {name: {stat: values.copy() for stat, values in stats.items()} for name, stats in columns.items()}
+        result = {
+            'station': station.station_id,
+            'time': times.tolist(),
+            'tier': tier.name,
+            'resolution': tier.seconds,
+            'sensors': {
+                name: {stat: [_json_number(v) for v in values.tolist()] for stat, values in stats.items()}
+                for name, stats in columns.items()
+            }
+        }
+        result['count'] = len(result['time'])
+        return jsonify(result), 200
+    
+    times = None
+    with station.lock:
+        oldest = station.history.first_time()
+        if last is not None:
+            times, columns = station.history.last(last, sensors)
+        elif station.store is None or start is None or (oldest is not None and start >= oldest):
+            times, columns = station.history.range(start, end, sensors)
+        if times is not None and len(times) <= HISTORY_MAX_ROWS:
+            times = times.copy()
+            columns = {name: values.copy() for name, values in columns.items()}
+    if times is None:
+        # Older than the in-memory window, read the mapped segments on disk (the store has its own lock)
+        rows = station.store.count(start, end)
+        if rows > HISTORY_MAX_ROWS:
+            return _history_too_large(rows)
+        times, columns = station.store.range(start, end, sensors)
+    elif len(times) > HISTORY_MAX_ROWS:
+        return _history_too_large(len(times))
+    result = {
+        'station': station.station_id,
+        'time': times.tolist(),
+        'sensors': {name: [_json_number(v) for v in values.tolist()] for name, values in columns.items()}
+    }
+    result['count'] = len(result['time'])
+    return jsonify(result), 200
+
+def _history_too_large(rows):
+    return jsonify({
+        'error': f"{rows} samples in range, at most {HISTORY_MAX_ROWS} are returned; "
+                 "narrow from/to, pass ?resolution=<seconds> or use /api/export"
+    }), 413
+
+@app.route('/api/export', methods=['GET'])
+def export_history():
+    """Stream a time range of samples as CSV, NDJSON or Arrow IPC for offline use
+
+    ?stations=<id>,<id> (or "all", default the default station), ?sensors=<name>,...,
+    ?from=/?to= like /api/history, ?format=csv|ndjson|arrow. Rows are read and
+    encoded one chunk at a time, so memory use does not grow with the range.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        abort(400)
+    if fmt == 'arrow' and not export.arrow_available():
+        return jsonify({'error': 'Arrow export needs pyarrow installed'}), 501
+    
+    station_ids = request.args.get('stations', DEFAULT_STATION)
+    if station_ids == 'all':
+        selected = stations.all()
+    else:
+        selected = [_station_or_404(station_id.strip()) for station_id in station_ids.split(',') if station_id.strip()]
+    sensors = request.args.get('sensors')
+    if sensors:
+        sensors = [name.strip() for name in sensors.split(',') if name.strip()]
+        if any(name not in HISTORY_COLUMNS for name in sensors):
+            abort(400)
+    else:
+        sensors = HISTORY_COLUMNS
+    try:
+        start = _parse_epoch(request.args.get('from'))
+        end = _parse_epoch(request.args.get('to'))
+    except ValueError:
+        abort(400)
+    
+    if not export_limiter.acquire():
+        response = make_response(jsonify({'error': 'Too many exports running, retry later'}), 503)
+        response.headers['Retry-After'] = str(EXPORT_RETRY_AFTER)
+        return response
+    
+    def chunks():
+        for station in selected:
+            yield from _export_chunks(station, sensors, start, end)
+    
+    mimetype, extension = export.FORMATS[fmt]
+    response = Response(export.stream(fmt, chunks(), sensors), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="history.{extension}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the response is closed, also if the client disconnects mid-export
+    response.call_on_close(export_limiter.release)
+    return response
+
+def _export_chunks(station, sensors, start, end):
+    """(station ID, times, {sensor: values}) chunks of a station's samples in [start, end]"""
+    if station.store is not None:
+        # Everything ever stored, read segment by segment from the memory-mapped files
+        chunks = export.iter_chunks(station.store.iter_range(start, end), HISTORY_COLUMNS, sensors, EXPORT_CHUNK_ROWS)
+    else:
+        # No store, only the in-memory window (bounded by HISTORY_CAPACITY)
+        with station.lock:
+            times, columns = station.history.range(start, end, sensors)
+            times = times.copy()
+            columns = {name: values.copy() for name, values in columns.items()}
+        chunks = ((times[lo:lo + EXPORT_CHUNK_ROWS], {name: values[lo:lo + EXPORT_CHUNK_ROWS] for name, values in columns.items()})
+                  for lo in range(0, len(times), EXPORT_CHUNK_ROWS))
+    for times, columns in chunks:
+        yield station.station_id, times, columns
+        # Let ingest threads run between chunks
+        time.sleep(0)
+
+@app.route('/api/rules', methods=['GET'], defaults={'station_id': None})
+@app.route('/api/stations/<station_id>/rules', methods=['GET'])
+def get_rules(station_id):
+    """Configured rules and the current warning state"""
+    station = _station_or_404(station_id or request.args.get('station', DEFAULT_STATION))
+    with station.lock:
+        state = station.rules.state()
+    rules = [rule.to_dict() for rule in station.rules.rules.values()]
+    return jsonify({'station': station.station_id, 'rules': rules, 'state': state}), 200
+
+@app.route('/api/rules/backtest', methods=['GET'], defaults={'station_id': None})
+@app.route('/api/stations/<station_id>/rules/backtest', methods=['GET'])
+def backtest_rules(station_id):
+    """Replay the rules over stored history, per sensor samples in warning and warning onsets"""
+    station = _station_or_404(station_id or request.args.get('station', DEFAULT_STATION))
+    try:
+        start = _parse_epoch(request.args.get('from'))
+        end = _parse_epoch(request.args.get('to'))
+    except ValueError:
+        abort(400)
+    
+    # A fresh engine so the backtest does not disturb the live rule state. The rule states carry
+    # from chunk to chunk, so the range is read in bounded pieces without holding the station lock.
+    engine = RuleEngine.from_config(RULES_CONFIG)
+    sensors = [name for name in HISTORY_COLUMNS if name in engine.rules]
+    samples = 0
+    result = {sensor: {'samples_in_warning': 0, 'onsets': 0} for sensor in sensors}
+    for _, times, columns in _export_chunks(station, sensors, start, end):
+        samples += len(times)
+        before = set(engine.active)
+        for sensor, active in engine.evaluate_batch(columns).items():
+            if len(active):
+                result[sensor]['samples_in_warning'] += int(active.sum())
+                # Active at the start of a chunk is an onset only if the previous chunk ended inactive
+                result[sensor]['onsets'] += int(active[0] and sensor not in before) + int((active[1:] & ~active[:-1]).sum())
+    return jsonify({'station': station.station_id, 'samples': samples, 'rules': result}), 200
+
 @app.route('/api/sensors/<id>', methods=['DELETE'])
 def delete_sensor(id):
-    db.reference('/sensors').child(id).delete()
-    db.reference('/data').child(id).delete()
+    firebase_writer.discard(id)
+    storage.delete_sensor(id, history=FIREBASE_FULL_HISTORY)
+    registry_cache.invalidate('sensors')
+    data_cache.invalidate(id)
+    history_cache.invalidate_where(lambda key: key[0] == id)
     return jsonify({}), 204
 
 @app.route('/api/debug', methods=['GET'])
 def debug_data():
     """Endpoint to debug current data state"""
-    # 定义阈值（与dashboard中的相同）
-    thresholds = {
-        "Temperature": {"high": 28, "unit": "°C"},
-        "Humidity": {"low": 20, "unit": "%"},      # 改为20%
-        "Wind_Speed": {"high": 1, "unit": "km/h"},
-        "MQ135_CO2": {"high": 800, "unit": "ppm"},
-        "MQ2_Smoke": {"high": 40, "unit": "ppm"},  # 改为40ppm
-        "MQ7_CO": {"high": 4, "unit": "ppm"},
-        "MQ9_Flammable": {"high": 0.8, "unit": "ppm"}
-    }
-    
-    # 计算超过阈值的传感器数量
-    warning_count = 0
-    
-    # 检查所有传感器的阈值
-    for sensor_name, threshold in thresholds.items():
-        value = latest_data[sensor_name]
-        if ("high" in threshold and value > threshold["high"]) or \
-           ("low" in threshold and value < threshold["low"]):
-            warning_count += 1
-    
-    # 检查火灾概率
-    fire_prob = latest_data["Fire_Probability"]
-    if fire_prob != -1 and fire_prob > 0.2:  # 如果摄像头连接且火灾概率超过0.2
-        warning_count += 1
+    station = _station_or_404(request.args.get('station', DEFAULT_STATION))
+    with station.lock:
+        latest = dict(station.latest)
+        warning_count = station.rules.warning_count
+        rules_state = station.rules.state()
+        latest_risk = station.latest_risk
+        history_count = len(station.history)
     
     debug_info = {
-        'latest_data': latest_data,
-        'history_count': len(data_history),
-        'history': list(data_history)[-5:] if data_history else [],
-        'warnings': warning_count
+        'station': station.station_id,
+        'latest_data': latest,
+        'history_count': history_count,
+        'history': _history_rows(station, 5),
+        'warnings': warning_count,
+        'rules': rules_state,
+        'risk': latest_risk,
+        'stations': len(stations),
+        'storage': storage.name,
+        'firebase_writer': firebase_writer.stats(),
+        'cache': {'registry': registry_cache.stats(), 'data': data_cache.stats()},
+        'stream': broadcaster.stats(),
+        'export': export_limiter.stats(),
+        'admission': admission.stats() if admission is not None else None,
+        'state_backend': state_backend.stats(),
+        'deadband': deadband.stats() if deadband is not None else None
     }
     return jsonify(debug_info), 200
 
-@app.route('/dashboard')
-def dashboard():
-    """Simple HTML dashboard without Gradio"""
-    latest = latest_data
-    fire_prob = latest['Fire_Probability']
-    fire_status = "Unknown"
-    fire_color = "gray"
-    camera_status = ""
-    
-    # 定义每个传感器的阈值
-    thresholds = {
-        "Temperature": {"high": 28, "unit": "°C"},
-        "Humidity": {"low": 20, "unit": "%"},      # 改为20%
-        "Wind_Speed": {"high": 1, "unit": "km/h"},
-        "MQ135_CO2": {"high": 800, "unit": "ppm"},
-        "MQ2_Smoke": {"high": 40, "unit": "ppm"},  # 改为40ppm
-        "MQ7_CO": {"high": 4, "unit": "ppm"},
-        "MQ9_Flammable": {"high": 0.8, "unit": "ppm"}
-    }
-    
-    # 检查摄像头状态
-    if fire_prob == -1:
-        fire_status = "Camera Disconnected"
-        fire_color = "gray"
-        camera_status = "<span style='color: orange; font-size: 14px;'>(⚠️ Camera disconnected, visual flame detection unavailable)</span>"
-    else:
-        if fire_prob < 0.2:
-            fire_status = "Safe"
-            fire_color = "green"
-        elif fire_prob < 0.5:
-            fire_status = "Low Risk"
-            fire_color = "orange"
-        elif fire_prob < 0.7:
-            fire_status = "Medium Risk"
-            fire_color = "darkorange"
-        else:
-            fire_status = "High Risk"
-            fire_color = "red"
-    
-    # 检查每个传感器值是否超过阈值的函数
-    def check_threshold(sensor_name, value):
-        if sensor_name not in thresholds:
-            return False, ""
-        
-        threshold = thresholds[sensor_name]
-        unit = threshold["unit"]
-        
-        if "high" in threshold and value > threshold["high"]:
-            return True, f"⚠️ High: > {threshold['high']}{unit}"
-        if "low" in threshold and value < threshold["low"]:
-            return True, f"⚠️ Low: < {threshold['low']}{unit}"
-        return False, ""
+def _collect_stations(read):
+    # read(station) -> [(label values, value), ...], called under the station lock
+    samples = []
+    for station in stations.all():
+        with station.lock:
+            samples.extend(read(station))
+    return samples
+
+def _staleness(station):
+    now = time.time()
+    return [((station.station_id, name), round(now - when, 3)) for name, when in station.updated_at.items()]
+
+metrics.gauge('forest_fire_history_samples', 'Samples in the in-memory history window', ('station',),
+              lambda: _collect_stations(lambda station: [((station.station_id,), len(station.history))]))
+metrics.gauge('forest_fire_sensor_staleness_seconds', 'Seconds since the latest value of each sensor',
+              ('station', 'sensor'), lambda: _collect_stations(_staleness))
+metrics.gauge('forest_fire_warnings', 'Active rule warnings', ('station',),
+              lambda: _collect_stations(lambda station: [((station.station_id,), station.rules.warning_count)]))
+metrics.gauge('forest_fire_firebase_queue_depth', 'Sensor writes waiting for the Firebase writer', (),
+              lambda: [((), firebase_writer.stats()['queue_depth'])])
+metrics.gauge('forest_fire_firebase_lag_seconds', 'Age of the oldest pending Firebase write', (),
+              lambda: [((), firebase_writer.stats()['lag_seconds'])])
+metrics.gauge('forest_fire_firebase_writes_total', 'Firebase writes by result', ('result',),
+              lambda: [((key,), firebase_writer.stats()[key]) for key in ('written', 'coalesced', 'dropped', 'errors')],
+              type='counter')
+metrics.gauge('forest_fire_stream_clients', 'Connected /api/stream clients', (),
+              lambda: [((), broadcaster.stats()['clients'])])
+metrics.gauge('forest_fire_state_lag', 'State journal records this worker has not applied yet', (),
+              lambda: [((), state_backend.stats()['lag'])] if 'lag' in state_backend.stats() else [])
+metrics.gauge('forest_fire_ingest_admitted_total', 'Ingest requests admitted by priority (live or replay)',
+              ('priority',), lambda: [((k,), v) for k, v in admission.stats()['admitted'].items()] if admission is not None else [],
+              type='counter')
+metrics.gauge('forest_fire_ingest_throttled_total', 'Ingest requests refused with 429 by reason', ('reason',),
+              lambda: [((k,), v) for k, v in admission.stats()['throttled'].items()] if admission is not None else [],
+              type='counter')
+metrics.gauge('forest_fire_log_dropped_total', 'Log records dropped because the log queue was full', (),
+              lambda: [((), log_handler.dropped)], type='counter')
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this process's metrics"""
+    response = make_response(metrics.render(), 200)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+# Admin endpoints need "Authorization: Bearer <ADMIN_TOKEN>", without ADMIN_TOKEN they do not exist
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+
+def _require_admin():
+    if not ADMIN_TOKEN:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(supplied, f"Bearer {ADMIN_TOKEN}".encode('utf-8')):
+        abort(403)
+
+def _profile_status():
+    status = profiler.status()
+    # With serve.py every worker profiles only itself
+    status['worker'] = state_backend.stats().get('worker')
+    return status
+
+@app.route('/api/admin/profile', methods=['POST'])
+def start_profile():
+    """Start a sampling profile of this process
 
-    html = f"""
+    ?seconds= (at most PROFILE_MAX_SECONDS), ?route=<route pattern, e.g.
+    /api/frames> to sample only requests for that route, ?interval= seconds
+    between samples, ?slowest=<n> requests to keep per-request stacks for.
+    """
+    _require_admin()
+    seconds = request.args.get('seconds', 10, type=float)
+    interval = request.args.get('interval', 0.005, type=float)
+    slowest = request.args.get('slowest', 10, type=int)
+    route = request.args.get('route') or None
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1 or not 0 <= slowest <= 100:
+        abort(400)
+    if route is not None and route not in {rule.rule for rule in app.url_map.iter_rules()}:
+        abort(400)
+    if not profiler.start(seconds, route, interval, slowest):
+        return jsonify({'error': 'A profile is already running', 'profile': _profile_status()}), 409
+    return jsonify(_profile_status()), 202
+
+@app.route('/api/admin/profile', methods=['GET'])
+def get_profile():
+    _require_admin()
+    return jsonify(_profile_status()), 200
+
+@app.route('/api/admin/profile', methods=['DELETE'])
+def stop_profile():
+    _require_admin()
+    profiler.stop()
+    return jsonify(_profile_status()), 200
+
+@app.route('/api/admin/profile/collapsed', methods=['GET'])
+def get_profile_collapsed():
+    """Sampled stacks in the collapsed format, for flamegraph.pl, inferno or speedscope"""
+    _require_admin()
+    response = make_response(profiler.collapsed(), 200)
+    response.mimetype = 'text/plain'
+    response.headers['Content-Disposition'] = 'attachment; filename="profile.collapsed"'
+    return response
+
+@app.route('/api/admin/profile/slowest', methods=['GET'])
+def get_profile_slowest():
+    """The slowest requests seen during the profile with their own sampled stacks"""
+    _require_admin()
+    return jsonify({'profile': _profile_status(), 'requests': profiler.slowest_requests()}), 200
+
+# 传感器卡片的显示顺序和颜色
+SENSORS_DISPLAY = [
+    ("Temperature", "#e74c3c"),
+    ("Humidity", "#3498db"),
+    ("Wind_Speed", "#2ecc71"),
+    ("MQ135_CO2", "#9b59b6"),
+    ("MQ2_Smoke", "#f39c12"),
+    ("MQ7_CO", "#16a085"),
+    ("MQ9_Flammable", "#d35400")
+]
+
+DASHBOARD_GZIP = os.environ.get('DASHBOARD_GZIP', '1') == '1'
+
+DASHBOARD_TEMPLATE = """
     <!DOCTYPE html>
     <html>
     <head>
         <title>Forest Fire Monitoring System</title>
-        <meta http-equiv="refresh" content="5">
+        <noscript><meta http-equiv="refresh" content="5"></noscript>
         <style>
-            body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #f0f2f5; }}
-            .container {{ max-width: 1200px; margin: 0 auto; }}
-            .dashboard {{ display: grid; grid-template-columns: repeat(3, 1fr); gap: 15px; }}
-            .card {{ background: white; padding: 15px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-            .card h3 {{ margin: 0 0 10px 0; }}
-            .value {{ font-size: 24px; font-weight: bold; margin: 0; }}
-            .warning {{ color: red; font-size: 12px; margin-top: 5px; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-            th, td {{ padding: 8px; text-align: left; border: 1px solid #ddd; }}
-            th {{ background: #f2f2f2; }}
-            tr:nth-child(even) {{ background: #f9f9f9; }}
+            body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #f0f2f5; }
+            .container { max-width: 1200px; margin: 0 auto; }
+            .dashboard { display: grid; grid-template-columns: repeat(3, 1fr); gap: 15px; }
+            .card { background: white; padding: 15px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+            .card h3 { margin: 0 0 10px 0; }
+            .value { font-size: 24px; font-weight: bold; margin: 0; }
+            .warning { color: red; font-size: 12px; margin-top: 5px; }
+            table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+            th, td { padding: 8px; text-align: left; border: 1px solid #ddd; }
+            th { background: #f2f2f2; }
+            tr:nth-child(even) { background: #f9f9f9; }
         </style>
     </head>
     <body>
         <div class="container">
-            <h1>🔥 Forest Fire Monitoring Dashboard</h1>
-            <p>Last updated: {latest['timestamp']}</p>
+            <h1>🔥 Forest Fire Monitoring Dashboard{% if station != default_station %} - Station {{ station }}{% endif %}</h1>
+            <p>Last updated: <span id="timestamp">{{ timestamp }}</span></p>
             
             <div class="dashboard">
-    """
-    
-    # 生成每个传感器的卡片
-    sensors_display = [
-        ("Temperature", "#e74c3c", latest['Temperature']),
-        ("Humidity", "#3498db", latest['Humidity']),
-        ("Wind_Speed", "#2ecc71", latest['Wind_Speed']),
-        ("MQ135_CO2", "#9b59b6", latest['MQ135_CO2']),
-        ("MQ2_Smoke", "#f39c12", latest['MQ2_Smoke']),
-        ("MQ7_CO", "#16a085", latest['MQ7_CO']),
-        ("MQ9_Flammable", "#d35400", latest['MQ9_Flammable'])
-    ]
-    
-    for sensor_name, color, value in sensors_display:
-        is_warning, warning_text = check_threshold(sensor_name, value)
-        value_color = "red" if is_warning else color
-        unit = thresholds[sensor_name]["unit"]
-        
-        html += f"""
-                <div class="card">
-                    <h3 style="color: {color};">{sensor_name}</h3>
-                    <p class="value" style="color: {value_color};">{value}{unit}</p>
-                    <p class="warning">{warning_text}</p>
+            {% for card in cards %}
+                <div class="card" data-sensor="{{ card.name }}" data-color="{{ card.color }}" data-unit="{{ card.unit }}">
+                    <h3 style="color: {{ card.color }};">{{ card.name }}</h3>
+                    <p class="value" style="color: {{ card.value_color }};">{{ card.value }}{{ card.unit }}</p>
+                    <p class="warning">{{ card.warning }}</p>
                 </div>
-        """
-    
-    # 添加系统状态和火灾检测卡片
-    html += f"""
+            {% endfor %}
                 <div class="card">
                     <h3 style="color: #e67e22;">System Status</h3>
                     <p class="value">Active</p>
                 </div>
                 
-                <div class="card">
-                    <h3 style="color: {fire_color};">Fire Visual Detection {camera_status}</h3>
-                    <p class="value" style="color: {fire_color};">
-                        {fire_status} {'' if fire_prob == -1 else f'({fire_prob:.2f})'}
+                <div class="card" id="fire">
+                    <h3 style="color: {{ fire.color }};">Fire Visual Detection <span class="disconnected" style='color: orange; font-size: 14px;{% if not fire.disconnected %} display: none;{% endif %}'>(⚠️ Camera disconnected, visual flame detection unavailable)</span></h3>
+                    <p class="value" style="color: {{ fire.color }};">
+                        {{ fire.display }}
                     </p>
                 </div>
             </div>
 
-            <h2>History (Latest {len(data_history)} records)</h2>
-            <table>
+            <h2>History (Latest <span id="history-count">{{ history|length }}</span> records)</h2>
+            <table id="history">
                 <tr>
                     <th>Time</th>
                     <th>Temperature</th>
@@ -324,47 +1239,15 @@ def dashboard():
                     <th>Wind</th>
                     <th>Fire Detection</th>
                 </tr>
-                """
-    
-    # Add history rows
-    for d in list(data_history)[::-1]:  # Reverse display, newest first
-        fire_color = 'gray'
-        if d['Fire_Probability'] != -1:
-            if d['Fire_Probability'] < 0.2:
-                fire_color = 'green'
-            elif d['Fire_Probability'] < 0.5:
-                fire_color = 'orange'
-            elif d['Fire_Probability'] < 0.7:
-                fire_color = 'darkorange'
-            else:
-                fire_color = 'red'
-        
-        fire_status = 'Camera Disconnected'
-        if d['Fire_Probability'] != -1:
-            if d['Fire_Probability'] < 0.2:
-                fire_status = 'Safe'
-            elif d['Fire_Probability'] < 0.5:
-                fire_status = 'Low Risk'
-            elif d['Fire_Probability'] < 0.7:
-                fire_status = 'Medium Risk'
-            else:
-                fire_status = 'High Risk'
-        
-        status_display = fire_status
-        if d['Fire_Probability'] != -1:
-            status_display += f" ({d['Fire_Probability']:.2f})"
-        
-        html += f"""
+            {% for row in history %}
                 <tr>
-                    <td>{d['timestamp']}</td>
-                    <td>{d['Temperature']}°C</td>
-                    <td>{d['Humidity']}%</td>
-                    <td>{d['Wind_Speed']} km/h</td>
-                    <td style="color: {fire_color};">{status_display}</td>
+                    <td>{{ row.timestamp }}</td>
+                    <td>{{ row.Temperature }}°C</td>
+                    <td>{{ row.Humidity }}%</td>
+                    <td>{{ row.Wind_Speed }} km/h</td>
+                    <td style="color: {{ row.fire.color }};">{{ row.fire.display }}</td>
                 </tr>
-        """
-    
-    html += """
+            {% endfor %}
             </table>
             
             <div style="margin-top: 20px; text-align: center;">
@@ -373,16 +1256,149 @@ def dashboard():
         </div>
         
         <script>
-            // Simple JavaScript to highlight values that change
+            // Apply pushed deltas to the page instead of polling every 5s. The snapshot sent on
+            // (re)connect only triggers a reload if the page missed changes in between.
             document.addEventListener('DOMContentLoaded', function() {
-                // Future enhancement: Add animations for changing values
+                var version = {{ version }};
+                var maxHistory = {{ max_history }};
+                // Like the server's rendering of a float: 21 -> "21.0"
+                function number(v) { return Number.isInteger(v) ? v.toFixed(1) : String(v); }
+                function cell(row, text, color) {
+                    var td = row.insertCell();
+                    td.textContent = text;
+                    if (color) { td.style.color = color; }
+                }
+                function apply(delta) {
+                    version = delta.version;
+                    document.getElementById('timestamp').textContent = delta.timestamp;
+                    document.querySelectorAll('.card[data-sensor]').forEach(function(card) {
+                        var name = card.dataset.sensor;
+                        var value = card.querySelector('.value');
+                        var warning = delta.alerts[name] || '';
+                        if (name in delta.changed) { value.textContent = number(delta.changed[name]) + card.dataset.unit; }
+                        value.style.color = warning ? 'red' : card.dataset.color;
+                        card.querySelector('.warning').textContent = warning;
+                    });
+                    var fire = document.getElementById('fire');
+                    var status = fire.querySelector('.value');
+                    fire.querySelector('h3').style.color = delta.fire.color;
+                    fire.querySelector('.disconnected').style.display = delta.fire.disconnected ? '' : 'none';
+                    status.textContent = delta.fire.display;
+                    status.style.color = delta.fire.color;
+                    if (delta.history) {
+                        var table = document.getElementById('history');
+                        var row = table.insertRow(1);  // newest first, below the header
+                        cell(row, delta.history.timestamp);
+                        cell(row, number(delta.history.Temperature) + '°C');
+                        cell(row, number(delta.history.Humidity) + '%');
+                        cell(row, number(delta.history.Wind_Speed) + ' km/h');
+                        cell(row, delta.fire.display, delta.fire.color);
+                        while (table.rows.length > maxHistory + 1) { table.deleteRow(-1); }
+                        document.getElementById('history-count').textContent = table.rows.length - 1;
+                    }
+                }
+                var source = new EventSource('/api/stream?station={{ station|urlencode }}');
+                source.addEventListener('snapshot', function(e) {
+                    if (JSON.parse(e.data).version !== version) { location.reload(); }
+                });
+                source.addEventListener('delta', function(e) { apply(JSON.parse(e.data)); });
             });
         </script>
     </body>
     </html>
-    """
+"""
+
+# Compiled once at import, rendered once per station state version
+dashboard_template = app.jinja_env.from_string(DASHBOARD_TEMPLATE)
+# station ID -> cached page
+dashboard_cache = {}
+# Versions restart at 0 with the process, keep ETags from a previous run from matching.
+# serve.py sets SERVER_BOOT_ID so every worker produces the same ETags.
+DASHBOARD_BOOT_ID = os.environ.get('SERVER_BOOT_ID') or f"{int(time.time()):x}"
+dashboard_lock = threading.Lock()
+
+def _render_dashboard(station):
+    """Render the dashboard page for a station's current state"""
+    with station.lock:
+        latest = dict(station.latest)
+        version = station.version
+        fire = station.fire_state
+        cards = []
+        for sensor_name, color in SENSORS_DISPLAY:
+            is_warning = station.rules.is_active(sensor_name)
+            cards.append({
+                'name': sensor_name,
+                'color': color,
+                'value': latest[sensor_name],
+                'value_color': "red" if is_warning else color,
+                'unit': station.rules.unit(sensor_name),
+                'warning': station.rules.warning_text(sensor_name)
+            })
+    history_rows = _history_rows(station, MAX_HISTORY)
+    
+    history = []
+    for row in history_rows[::-1]:  # Reverse display, newest first
+        row['fire'] = fire_status(row['Fire_Probability'])
+        history.append(row)
     
-    return html
+    return dashboard_template.render(station=station.station_id, default_station=DEFAULT_STATION, version=version,
+                                     timestamp=latest['timestamp'], cards=cards, fire=fire, history=history,
+                                     max_history=MAX_HISTORY)
+
+def _dashboard_page(station):
+    """Cached rendered page for the station's current version, re-rendered only after a change"""
+    version = station.version
+    page = dashboard_cache.get(station.station_id)
+    if page is not None and page['version'] == version:
+        return page
+    with dashboard_lock:
+        # Another request may have rendered this version while we waited
+        page = dashboard_cache.get(station.station_id)
+        if page is not None and page['version'] == version:
+            return page
+        body = _render_dashboard(station).encode('utf-8')
+        page = {
+            'version': version,
+            'body': body,
+            'gzip': None,
+            'etag': f"dash-{DASHBOARD_BOOT_ID}-{station.station_id}-{version}",
+            'last_modified': datetime.datetime.fromtimestamp(station.changed_at, datetime.timezone.utc)
+        }
+        dashboard_cache[station.station_id] = page
+        return page
+
+@app.route('/dashboard', defaults={'station_id': None})
+@app.route('/stations/<station_id>/dashboard')
+def dashboard(station_id):
+    """Simple HTML dashboard without Gradio, served from the render cache"""
+    page = _dashboard_page(_station_or_404(station_id or DEFAULT_STATION))
+    use_gzip = DASHBOARD_GZIP and 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = page['etag'] + ('-gz' if use_gzip else '')
+    
+    # Unchanged since the browser's copy, skip the body entirely
+    not_modified = False
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since:
+        not_modified = request.if_modified_since >= page['last_modified'].replace(microsecond=0)
+    
+    if not_modified:
+        response = make_response('', 304)
+    else:
+        body = page['body']
+        if use_gzip:
+            if page['gzip'] is None:
+                page['gzip'] = gzip.compress(body, 6)
+            body = page['gzip']
+        response = make_response(body, 200)
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.last_modified = page['last_modified']
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 # Add favicon route to avoid 404 errors
 @app.route('/favicon.ico')
@@ -406,23 +1422,30 @@ def index():
     """
 
 # Fire risk assessment
-def check_fire_risk():
-    # 不再需要计算风险分数，只记录当前传感器值用于调试
-    print(f"Current sensor values:")
-    for key, value in latest_data.items():
-        if key != 'timestamp':
-            print(f"  {key}: {value}")
-    
-    # 如果摄像头断开（Fire_Probability = -1），保持该值
-    # 否则不做任何修改，保持摄像头发送的原始概率值
-    if latest_data["Fire_Probability"] == -1:
-        print("Camera is disconnected, keeping Fire_Probability as -1")
-    else:
-        print(f"Using camera's fire probability: {latest_data['Fire_Probability']:.2f}")
+def check_fire_risk(station, log=True):
+    """Recompute a station's composite fire-risk score from the rolling statistics"""
+    with STAGE_SECONDS.time('risk'), station.lock:
+        risk = station.score_risk()
+        camera = station.risk.camera
+    if log:
+        logger.debug("fire risk station=%s score=%.2f level=%s camera=%s", station.station_id, risk['score'], risk['level'], camera)
+    return risk
+
+@app.route('/api/risk', methods=['GET'], defaults={'station_id': None})
+@app.route('/api/stations/<station_id>/risk', methods=['GET'])
+def get_risk(station_id):
+    """Composite fire-risk score with its components and per-sensor rolling statistics"""
+    station = _station_or_404(station_id or request.args.get('station', DEFAULT_STATION))
+    with station.lock:
+        snapshot = station.risk.snapshot()
+    snapshot['station'] = station.station_id
+    return jsonify(snapshot), 200
 
 if __name__ == '__main__':
     print("Starting Forest Fire Monitoring System...")
     print("Dashboard will be available at: http://localhost:50000/dashboard")
     print("API endpoints available at: http://localhost:50000/api/*")
-    # Start the Flask app with debug mode off for production use
+    # A service manager stops us with SIGTERM, leave through atexit so pending writes are flushed
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    # Single process, use serve.py to run several workers sharing the live state
     app.run(host='0.0.0.0', port=50000, debug=False) 
\ No newline at end of file
@@ -0,0 +1,239 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+
+class HistoryStore:
+    """Append-only on-disk store of sensor samples
+
+    Every sample is one fixed-width little-endian record: epoch time followed
+    by one float64 per column. Records go to time-partitioned segment files
+    (one per `segment_seconds`, a day by default). A crash can at most leave a
+    torn last record, which is truncated away when the store is reopened.
+    Reads memory-map the segments and return numpy views over the mapping, so
+    range queries do not copy the data.
+
+    The directory is created by the first append, so a store that never gets
+    a sample leaves nothing on disk.
+
+    With read_only=True the store never writes and rescans the directory on
+    every read, so it can follow a store another process is appending to.
+    """
+
+    META_FILE = 'columns.json'
+
+    def __init__(self, directory, columns, segment_seconds=86400, fsync=False, read_only=False):
+        self.directory = directory
+        self.columns = list(columns)
+        self.segment_seconds = segment_seconds
+        self.fsync = fsync
+        self.read_only = read_only
+        self.width = len(self.columns) + 1
+        self.record_size = 8 * self.width
+        self._record = struct.Struct('<%dd' % self.width)
+        self._lock = threading.RLock()
+        # partition start -> (mmap, size in bytes) for segments opened for reading
+        self._maps = {}
+        self._fd = None
+        self._fd_partition = None
+        self._last_time = None
+
+        self._check_columns()
+        self._partitions = sorted(self._scan_partitions())
+        if not read_only:
+            # A reader must not truncate a record the writer is in the middle of
+            for partition in self._partitions:
+                self._repair(partition)
+        self._load_last_time()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return sum(len(self._view(p)) for p in self._partitions)
+
+    def last_time(self):
+        with self._lock:
+            self._refresh()
+            return self._last_time
+
+    def append(self, when, values):
+        """Append one sample; values is a mapping of column name to number"""
+        row = [when]
+        for name in self.columns:
+            try:
+                row.append(float(values.get(name)))
+            except (TypeError, ValueError):
+                row.append(float('nan'))
+        self.append_row(row)
+
+    def append_row(self, row):
+        """Append one record given as [time, value per column]"""
+        if self.read_only:
+            raise ValueError(f"History store at {self.directory} is read-only")
+        with self._lock:
+            # Keep time monotonic so segments stay sorted for binary search
+            when = row[0]
+            if self._last_time is not None and when < self._last_time:
+                when = self._last_time
+            partition = self._partition_of(when)
+            fd = self._writer(partition)
+            # One write() per record, so a crash cannot interleave two records
+            os.write(fd, self._record.pack(when, *row[1:]))
+            if self.fsync:
+                os.fsync(fd)
+            self._last_time = when
+
+    def range(self, start=None, end=None, sensors=None):
+        """Samples with start <= time <= end as (times, {sensor: values})
+
+        Returns views into the mapped segment when the range fits in one
+        segment and copies only when it spans several.
+        """
+        parts = list(self.iter_range(start, end))
+        return self._combine(parts, sensors)
+
+    def count(self, start=None, end=None):
+        """Number of samples with start <= time <= end, without copying them"""
+        return sum(len(records) for records in self.iter_range(start, end))
+
+    def tail(self, n, sensors=None):
+        """Newest n samples as (times, {sensor: values}), oldest first"""
+        parts = []
+        remaining = n
+        with self._lock:
+            self._refresh()
+            for partition in reversed(self._partitions):
+                if remaining <= 0:
+                    break
+                records = self._view(partition)
+                if len(records) > remaining:
+                    records = records[len(records) - remaining:]
+                parts.insert(0, records)
+                remaining -= len(records)
+        return self._combine(parts, sensors)
+
+    def iter_range(self, start=None, end=None):
+        """Yield per-segment (n, 1 + columns) record views with start <= time <= end"""
+        with self._lock:
+            self._refresh()
+            partitions = list(self._partitions)
+        for partition in partitions:
+            if end is not None and partition > end:
+                break
+            if start is not None and partition + self.segment_seconds <= start:
+                continue
+            with self._lock:
+                records = self._view(partition)
+            times = records[:, 0]
+            lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+            hi = len(records) if end is None else int(np.searchsorted(times, end, side='right'))
+            if hi > lo:
+                yield records[lo:hi]
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                self._fd_partition = None
+            # Views handed out earlier keep their mapping alive until collected
+            self._maps.clear()
+
+    def _refresh(self):
+        """Pick up segments written by another process (caller holds lock)"""
+        if self.read_only:
+            self._partitions = sorted(self._scan_partitions())
+            self._load_last_time()
+
+    def _load_last_time(self):
+        if self._partitions:
+            records = self._view(self._partitions[-1])
+            if len(records):
+                self._last_time = float(records[-1, 0])
+
+    def _combine(self, parts, sensors):
+        names = self.columns if sensors is None else list(sensors)
+        cols = [self.columns.index(name) + 1 for name in names]
+        if not parts:
+            records = np.empty((0, self.width))
+        elif len(parts) == 1:
+            records = parts[0]
+        else:
+            records = np.concatenate(parts)
+        return records[:, 0], {name: records[:, col] for name, col in zip(names, cols)}
+
+    def _partition_of(self, when):
+        return int(when // self.segment_seconds) * self.segment_seconds
+
+    def _path(self, partition):
+        return os.path.join(self.directory, f"seg-{partition:012d}.bin")
+
+    def _scan_partitions(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith('seg-') and name.endswith('.bin'):
+                try:
+                    yield int(name[4:-4])
+                except ValueError:
+                    continue
+
+    def _check_columns(self):
+        meta_path = os.path.join(self.directory, self.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)['columns']
+            if stored != self.columns:
+                raise ValueError(f"History store at {self.directory} has columns {stored}, expected {self.columns}")
+
+    def _create(self):
+        """Create the directory and column metadata before the first segment is written"""
+        meta_path = os.path.join(self.directory, self.META_FILE)
+        if os.path.exists(meta_path):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'columns': self.columns}, f)
+        os.replace(tmp_path, meta_path)
+
+    def _repair(self, partition):
+        """Drop a torn trailing record left by a crash mid-append"""
+        path = self._path(partition)
+        size = os.path.getsize(path)
+        if size % self.record_size:
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % self.record_size)
+
+    def _writer(self, partition):
+        if self._fd_partition != partition:
+            if self._fd is not None:
+                os.close(self._fd)
+            if not self._partitions:
+                self._create()
+            self._fd = os.open(self._path(partition), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self._fd_partition = partition
+            if partition not in self._partitions:
+                self._partitions.append(partition)
+                self._partitions.sort()
+        return self._fd
+
+    def _view(self, partition):
+        """Zero-copy (n, width) float64 view of a segment, remapped if it has grown"""
+        size = os.path.getsize(self._path(partition))
+        size -= size % self.record_size
+        cached = self._maps.get(partition)
+        if cached is None or cached[1] != size:
+            if size == 0:
+                return np.empty((0, self.width))
+            with open(self._path(partition), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            cached = (mm, size)
+            self._maps[partition] = cached
+        mm, size = cached
+        records = np.frombuffer(mm, dtype='<f8', count=size // 8)
+        return records.reshape(-1, self.width)
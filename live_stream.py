@@ -0,0 +1,88 @@
+import json
+import threading
+from collections import deque
+
+
+class Subscription:
+    """One connected client's bounded message buffer"""
+
+    def __init__(self, maxlen, topic=None):
+        # Only messages for this topic (e.g. a station ID) are delivered, None means all
+        self.topic = topic
+        self._messages = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, message):
+        """Never blocks: a full buffer drops its oldest message"""
+        with self._cond:
+            if len(self._messages) == self._messages.maxlen:
+                self.dropped += 1
+            self._messages.append(message)
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Next message, or None after timeout"""
+        with self._cond:
+            if not self._messages and not self.closed:
+                self._cond.wait(timeout)
+            if self._messages:
+                return self._messages.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class Broadcaster:
+    """Fan-out of small state deltas to Server-Sent Events clients
+
+    publish() only appends to each client's bounded buffer, so a slow or stuck
+    client can never hold up the ingest request that produced the change.
+    """
+
+    def __init__(self, client_buffer=64, max_clients=256):
+        self.client_buffer = client_buffer
+        self.max_clients = max_clients
+        self._clients = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, topic=None):
+        """Register a client, returns None if max_clients is reached"""
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            sub = Subscription(self.client_buffer, topic)
+            self._clients.add(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._clients.discard(sub)
+        sub.close()
+
+    def publish(self, event, data, topic=None):
+        message = format_event(event, data)
+        with self._lock:
+            clients = list(self._clients)
+            self.published += 1
+        for sub in clients:
+            if sub.topic is None or sub.topic == topic:
+                sub.put(message)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'published': self.published,
+                'dropped': sum(sub.dropped for sub in self._clients),
+            }
+
+
+def format_event(event, data):
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
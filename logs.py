@@ -0,0 +1,54 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking the caller"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(name, level='INFO', queue_size=10000, stream=None):
+    """Logger whose records are written by a background thread
+
+    Request threads only format the message and put the record on a bounded
+    queue, the listener thread does the I/O. Returns (logger, handler,
+    listener); call listener.stop() at exit to flush what is queued.
+    """
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(handler.queue, output, respect_handler_level=False)
+    listener.start()
+
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger, handler, listener
+
+
+def route_logger(name, handler, level='INFO'):
+    """Send another library's logger (e.g. werkzeug's access log) through a queued handler
+
+    Replaces its handlers, so nothing it logs is written on the calling thread.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
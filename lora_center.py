@@ -1,13 +1,62 @@
-import RPi.GPIO as GPIO
 import time
-from SX127x.LoRa import LoRa
-from SX127x.board_config import BOARD
-from SX127x.constants import MODE
 import json
+import os
+import queue
+import random
+import struct
+import threading
+import zlib
+from collections import deque
 import requests  # Add requests library for HTTP requests
+from requests.adapters import HTTPAdapter
+from deadband import Deadband, load_config as load_deadband_config
 
 # Flask server address
 FLASK_SERVER_URL = "http://192.168.2.90:50000/api/sensors/"
+# Batch endpoint taking a whole frame, or {"frames": [...]}, per request
+FLASK_FRAME_URL = "http://192.168.2.90:50000/api/frames"
+
+# Forwarding runs on background threads over one keep-alive connection pool,
+# the radio loop only puts frames on the queue
+FORWARD_WORKERS = 4
+FORWARD_QUEUE_SIZE = 1000
+FORWARD_TIMEOUT = 5  # seconds per request
+
+# Store-and-forward spool: frames are kept on disk until the server acknowledges them.
+# Set SPOOL_DIR to an empty string to disable it
+SPOOL_DIR = os.environ.get('SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool'))
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+SPOOL_MAX_AGE = 7 * 24 * 3600  # seconds, older frames are not replayed
+SPOOL_SEGMENT_BYTES = 1024 * 1024
+SPOOL_FSYNC = True
+REPLAY_BATCH = 200  # frames per replay request
+REPLAY_PAUSE = 0.05  # seconds between replay batches
+REPLAY_IDLE_INTERVAL = 1.0  # seconds between checks for backlog
+REPLAY_BACKOFF_MIN = 1.0
+REPLAY_BACKOFF_MAX = 60.0
+
+# Change-only forwarding, off by default: the server's rules (debounce) and risk model (rates
+# of change) need every sample, and the server applies the deadband to what it stores anyway.
+# With GATEWAY_DEADBAND=1 values within the per-sensor deadband of the last forwarded value
+# are not sent, at least one value per max_silence still is, for links where airtime matters
+# more. Rule thresholds from RULES_PATH always pass, so alerts reach the server at full rate
+GATEWAY_DEADBAND = os.environ.get('GATEWAY_DEADBAND', '0') == '1'
+DEADBAND_PATH = os.environ.get('DEADBAND_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deadband.json'))
+RULES_PATH = os.environ.get('RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+
+# ---- LoRa radio ----
+RESET_PIN = 25
+NSS_PIN = 8
+# Set LORA_FAKE_RADIO=1 to run without the SX127x board, e.g. on a normal Linux box
+LORA_FAKE_RADIO = os.environ.get('LORA_FAKE_RADIO', '0') == '1'
+RX_QUEUE_SIZE = 256  # received packets waiting to be decoded
+STATS_INTERVAL = 60  # seconds between stats printouts
+
+# Binary frame sent by esp32main.ino (see the layout there), JSON text frames are still accepted
+FRAME_MAGIC = 0xF5
+FRAME_V1 = struct.Struct('<BBHHBhHHIIIIh')
+# Frames from this station are sent with the Firebase sensor IDs below, others by sensor name
+DEFAULT_STATION = 1
 
 # Sensor ID mapping, please replace with actual Firebase assigned IDs
 SENSOR_IDS = {
@@ -21,162 +70,814 @@ SENSOR_IDS = {
     "fire_prob": "-OMZ5SCV9iN5PHStzJMR"    # Fire_Probability
 }
 
-# ---- Force RESET HIGH ----
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
+class FrameSpool:
+    """Append-only on-disk spool of frames that have not reached the server yet
 
-RESET_PIN = 25
-NSS_PIN = 8
+    Every frame is written here before it is sent, as a record of payload
+    length, CRC32, sequence number and spool time followed by the JSON
+    frame, in segment files of up to `segment_bytes`. Acknowledged sequence
+    numbers advance a watermark kept in the `ack` file; segments below it are
+    deleted. After a reboot everything above the watermark is sent again, so
+    delivery is at least once. The oldest segments are dropped beyond
+    `max_bytes`, and frames older than `max_age` seconds are not replayed.
+    """
 
-GPIO.setup(RESET_PIN, GPIO.OUT)
-GPIO.output(RESET_PIN, GPIO.HIGH)
+    RECORD = struct.Struct('<IIQd')  # payload length, crc32, sequence, spool time
+    ACK_FILE = 'ack'
 
-GPIO.setup(NSS_PIN, GPIO.OUT)
-GPIO.output(NSS_PIN, GPIO.HIGH)  # Ensure NSS idle HIGH
+    def __init__(self, directory, max_bytes=SPOOL_MAX_BYTES, max_age=SPOOL_MAX_AGE,
+                 segment_bytes=SPOOL_SEGMENT_BYTES, fsync=SPOOL_FSYNC):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        # [first sequence, path, size in bytes], oldest first
+        self._segments = []
+        self._fd = None
+        # Every sequence up to the watermark is acknowledged
+        self._watermark = 0
+        self._acked_above = set()
+        # Handed out for sending and not acknowledged or released yet
+        self._in_flight = set()
+        # Records below this sequence are all acknowledged or in flight
+        self._cursor = 1
+        self.expired = 0
+        self.evicted = 0
 
-# ---- LoRa Setup ----
-BOARD.setup()
+        os.makedirs(directory, exist_ok=True)
+        ack_path = os.path.join(directory, self.ACK_FILE)
+        if os.path.exists(ack_path):
+            with open(ack_path) as f:
+                self._watermark = int(f.read().strip() or 0)
+        for name in sorted(os.listdir(directory)):
+            if name.startswith('spool-') and name.endswith('.log'):
+                path = os.path.join(directory, name)
+                self._segments.append([int(name[6:-4]), path, self._repair(path)])
+        self._next_seq = self._watermark + 1
+        if self._segments:
+            last = list(self._read_segment(self._segments[-1][1]))
+            self._next_seq = max(self._next_seq, (last[-1] + 1) if last else self._segments[-1][0])
+        self._cursor = self._watermark + 1
+        self._drop_acked_segments()
 
-class LoRaSelfPing(LoRa):
-    def __init__(self, verbose=False):
-        super(LoRaSelfPing, self).__init__(verbose)
-        self.set_dio_mapping([1, 0, 0, 0, 0, 0])  # DIO0 for TX_DONE
+    def append(self, frame, in_flight=False):
+        """Durably record a frame, returns its sequence number"""
+        payload = json.dumps(frame, separators=(',', ':')).encode('utf-8')
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            record = self.RECORD.pack(len(payload), zlib.crc32(payload), seq, time.time()) + payload
+            if self._fd is None or self._segments[-1][2] + len(record) > self.segment_bytes:
+                self._rotate(seq)
+            # One write() per record, a crash can only leave a torn last record
+            os.write(self._fd, record)
+            if self.fsync:
+                os.fsync(self._fd)
+            self._segments[-1][2] += len(record)
+            if in_flight:
+                self._in_flight.add(seq)
+            self._enforce_size()
+            return seq
 
-lora = LoRaSelfPing(verbose=False)
-lora.set_freq(915.0)
-lora.set_spreading_factor(7)
-lora.set_bw(7)
-lora.set_coding_rate(5)
-lora.set_preamble(8)
-lora.set_sync_word(0x12)
-lora.set_pa_config(pa_select=1)  # PA_BOOST
+    def ack(self, seqs):
+        """Mark frames as delivered"""
+        with self._lock:
+            for seq in seqs:
+                self._in_flight.discard(seq)
+                if seq > self._watermark:
+                    self._acked_above.add(seq)
+            self._advance()
 
-print("Self-ping test ready!")
+    def release(self, seqs):
+        """Return frames that were not delivered, they are handed out again by pending()"""
+        with self._lock:
+            for seq in seqs:
+                self._in_flight.discard(seq)
+                self._cursor = min(self._cursor, seq)
 
-def send_sensor_data_to_server(data):
-    """Send sensor data to Flask server"""
-    print(f"Sending data to Flask server: {FLASK_SERVER_URL}")
-    
-    try:
-        # Send individual PUT requests for each sensor
-        if "mq135" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["mq135"], 
-                json={"value": data["mq135"]},
-                timeout=5
-            )
-            print(f"MQ135 data send status: {response.status_code}")
-            
-        if "mq2" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["mq2"], 
-                json={"value": data["mq2"]},
-                timeout=5
-            )
-            print(f"MQ2 data send status: {response.status_code}")
-            
-        if "mq7" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["mq7"], 
-                json={"value": data["mq7"]},
-                timeout=5
-            )
-            print(f"MQ7 data send status: {response.status_code}")
-            
-        if "mq9" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["mq9"], 
-                json={"value": data["mq9"]},
-                timeout=5
-            )
-            print(f"MQ9 data send status: {response.status_code}")
-            
-        if "temperature" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["temperature"], 
-                json={"value": data["temperature"]},
-                timeout=5
-            )
-            print(f"Temperature data send status: {response.status_code}")
-            
-        if "humidity" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["humidity"], 
-                json={"value": data["humidity"]},
-                timeout=5
-            )
-            print(f"Humidity data send status: {response.status_code}")
-            
-        if "wind_speed" in data:
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["wind_speed"], 
-                json={"value": data["wind_speed"]},
-                timeout=5
-            )
-            print(f"Wind speed data send status: {response.status_code}")
-            
-        # Special handling for fire_prob parameter, ensure -1 value is correctly sent
-        if "fire_prob" in data:
-            # Send even if value is -1, which means camera is disconnected
-            response = requests.put(
-                FLASK_SERVER_URL + SENSOR_IDS["fire_prob"], 
-                json={"value": data["fire_prob"]},
-                timeout=5
-            )
-            
-            # Print camera status information
-            if data["fire_prob"] == -1:
-                print("⚠️ Camera disconnected, fire detection status: Unknown")
+    def pending(self, limit):
+        """Up to `limit` oldest undelivered frames as [(sequence, frame)], marked in flight"""
+        batch = []
+        expired = []
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            segments = [segment for i, segment in enumerate(self._segments)
+                        if i + 1 == len(self._segments) or self._segments[i + 1][0] > self._cursor]
+            skipped_to = None
+            for first, path, _ in segments:
+                for seq, spooled_at, payload in self._read_segment(path, with_payload=True):
+                    if seq < self._cursor or seq <= self._watermark or seq in self._acked_above:
+                        continue
+                    if seq in self._in_flight:
+                        continue
+                    if spooled_at < cutoff:
+                        expired.append(seq)
+                        continue
+                    batch.append((seq, json.loads(payload)))
+                    self._in_flight.add(seq)
+                    if len(batch) >= limit:
+                        skipped_to = seq + 1
+                        break
+                if skipped_to is not None:
+                    break
+            # Everything before the next record is now acknowledged or in flight
+            self._cursor = skipped_to if skipped_to is not None else self._next_seq
+            if expired:
+                self.expired += len(expired)
+                self._acked_above.update(expired)
+                self._advance()
+        return batch
+
+    def backlog(self):
+        """Number of frames not acknowledged yet"""
+        with self._lock:
+            return self._next_seq - 1 - self._watermark - len(self._acked_above)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backlog': self._next_seq - 1 - self._watermark - len(self._acked_above),
+                'in_flight': len(self._in_flight),
+                'bytes': sum(size for _, _, size in self._segments),
+                'segments': len(self._segments),
+                'expired': self.expired,
+                'evicted': self.evicted,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _advance(self):
+        """Move the watermark over acknowledged sequences and persist it (caller holds lock)"""
+        start = self._watermark
+        while self._watermark + 1 in self._acked_above:
+            self._watermark += 1
+            self._acked_above.discard(self._watermark)
+        if self._watermark != start:
+            path = os.path.join(self.directory, self.ACK_FILE)
+            with open(path + '.tmp', 'w') as f:
+                f.write(str(self._watermark))
+            os.replace(path + '.tmp', path)
+            self._cursor = max(self._cursor, self._watermark + 1)
+            self._drop_acked_segments()
+
+    def _drop_acked_segments(self):
+        # A segment is done once the next one starts at or below the watermark + 1
+        while len(self._segments) > 1 and self._segments[1][0] <= self._watermark + 1:
+            os.remove(self._segments.pop(0)[1])
+
+    def _enforce_size(self):
+        """Drop the oldest segments beyond max_bytes (caller holds lock)"""
+        while len(self._segments) > 1 and sum(size for _, _, size in self._segments) > self.max_bytes:
+            first, path, _ = self._segments.pop(0)
+            last = self._segments[0][0] - 1
+            self.evicted += max(0, last - max(first - 1, self._watermark))
+            os.remove(path)
+            if last > self._watermark:
+                for seq in range(self._watermark + 1, last + 1):
+                    self._acked_above.add(seq)
+                self._advance()
+
+    def _rotate(self, seq):
+        if self._fd is not None:
+            os.close(self._fd)
+        path = os.path.join(self.directory, f"spool-{seq:012d}.log")
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segments.append([seq, path, 0])
+
+    def _repair(self, path):
+        """Truncate a torn or corrupt tail left by a crash, returns the valid size"""
+        size = 0
+        with open(path, 'rb') as f:
+            data = f.read()
+        while size + self.RECORD.size <= len(data):
+            length, crc, _, _ = self.RECORD.unpack_from(data, size)
+            end = size + self.RECORD.size + length
+            if end > len(data) or zlib.crc32(data[size + self.RECORD.size:end]) != crc:
+                break
+            size = end
+        if size != len(data):
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+        return size
+
+    def _read_segment(self, path, with_payload=False):
+        with open(path, 'rb') as f:
+            data = memoryview(f.read())
+        offset = 0
+        while offset + self.RECORD.size <= len(data):
+            length, _, seq, spooled_at = self.RECORD.unpack_from(data, offset)
+            start = offset + self.RECORD.size
+            if start + length > len(data):
+                break
+            if with_payload:
+                yield seq, spooled_at, bytes(data[start:start + length])
             else:
-                status = "Safe"
-                if data["fire_prob"] >= 70:
-                    status = "High Risk"
-                elif data["fire_prob"] >= 50:
-                    status = "Medium Risk"
-                elif data["fire_prob"] >= 20:
-                    status = "Low Risk"
-                print(f"🔍 Fire detection status: {status} ({data['fire_prob']}%)")
-            
-            print(f"Fire probability data send status: {response.status_code}")
-            
-        print("All data sent successfully")
-        
-    except Exception as e:
-        print(f"Error sending data: {e}")
-        # No retry attempt, just report the error
-
-try:
-    while True:
-        # RECEIVE phase
-        lora.set_dio_mapping([0, 0, 0, 0, 0, 0])  # DIO0 for RX_DONE
-        lora.set_mode(MODE.RXCONT)
-        print("Listening for esp32...")
-        reg_val = BOARD.spi.xfer2([0x01 & 0x7F, 0x00])
-        print("RegOpMode now reads:", hex(reg_val[1]))
-
-        rx_timeout = time.time() + 3
-        while time.time() < rx_timeout:
-            irq_flags = lora.get_irq_flags()
-            if irq_flags.get('rx_done'):
-                payload = lora.read_payload(nocheck=True)
-                msg = ''.join([chr(b) for b in payload])
-                print("🎉 Received:", msg)
-                try:
-                    data = json.loads(msg)
-                    print("Parsed JSON:", data)
-                    # Send data to Flask server
-                    send_sensor_data_to_server(data)
-                except json.JSONDecodeError:
-                    print("❗ Received data is not valid JSON")
-                lora.clear_irq_flags()
+                yield seq
+            offset = start + length
+
+
+class FrameForwarder:
+    """Sends frames to the Flask server from worker threads over a pooled HTTP session
+
+    submit() never blocks. With a spool every frame is recorded on disk
+    first and acknowledged once the server took it. While the server is
+    unreachable, or older frames are still waiting, workers leave frames in
+    the spool and the replay thread sends them in order in batches of up to
+    `replay_batch`, one batch at a time, with exponential backoff after a
+    failure. Without a spool a full queue drops the frame.
+    """
+
+    def __init__(self, url, spool=None, workers=FORWARD_WORKERS, max_queue=FORWARD_QUEUE_SIZE,
+                 timeout=FORWARD_TIMEOUT, replay_batch=REPLAY_BATCH, backoff_max=REPLAY_BACKOFF_MAX):
+        self.url = url
+        self.spool = spool
+        self.timeout = timeout
+        self.replay_batch = replay_batch
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers + 1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        # Cleared after a failed send, the replay thread sets it again once the server answers
+        self._healthy = threading.Event()
+        self._healthy.set()
+        # Latency of the last requests in seconds, for percentiles
+        self._latencies = deque(maxlen=256)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.replayed = 0
+        self.last_error = None
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._run, name=f"forwarder-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if spool is not None:
+            t = threading.Thread(target=self._replay, name="forwarder-replay", daemon=True)
+            t.start()
+            self._replay_thread = t
+
+    def submit(self, frame):
+        """Queue a frame for sending, returns False if it was dropped"""
+        seq = self.spool.append(frame, in_flight=True) if self.spool is not None else None
+        try:
+            self._queue.put_nowait((seq, frame))
+            return True
+        except queue.Full:
+            if seq is not None:
+                # Still on disk, the replay thread sends it
+                self.spool.release([seq])
+                return True
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def stop(self, timeout=5):
+        """Send what is still queued (up to timeout seconds), then stop the workers"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
                 break
-            time.sleep(0.1)
+        if self.spool is not None:
+            self._replay_thread.join(max(0.0, deadline - time.time()) + self.timeout)
+        self.session.close()
+        if self.spool is not None:
+            self.spool.close()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            result = {
+                'queue_depth': self._queue.qsize(),
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'replayed': self.replayed,
+                'healthy': self._healthy.is_set(),
+                'last_error': self.last_error,
+            }
+        if latencies:
+            result['latency_p50'] = latencies[len(latencies) // 2]
+            result['latency_p95'] = latencies[int(len(latencies) * 0.95)]
+            result['latency_max'] = latencies[-1]
+        if self.spool is not None:
+            result['spool'] = self.spool.stats()
+        return result
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                seq, frame = item
+                if seq is not None and (not self._healthy.is_set() or self.spool.backlog() > self._in_queue()):
+                    # Server down or older frames waiting: keep the order, let the replay thread send it
+                    self.spool.release([seq])
+                    continue
+                self._send(seq, frame)
+            finally:
+                self._queue.task_done()
+
+    def _in_queue(self):
+        # Frames handed to the workers count towards the spool backlog but are not waiting for replay
+        return self._queue.unfinished_tasks
+
+    def _send(self, seq, frame):
+        status, error, _ = self._put(frame)
+        if status is not None and status < 300:
+            print(f"Frame send status: {status} ({len(frame['sensors'])} sensors)")
+            if seq is not None:
+                self.spool.ack([seq])
+            return
+        if status is not None and 400 <= status < 500 and status != 429:
+            # The server will never take this frame, retrying cannot help
+            print(f"❗ Frame rejected by server: {error}")
+            with self._lock:
+                self.rejected += 1
+            if seq is not None:
+                self.spool.ack([seq])
+            return
+        print(f"Error sending data: {error}")
+        if seq is not None:
+            self._healthy.clear()
+            self.spool.release([seq])
+
+    def _put(self, body):
+        """One request, returns (status or None, error, response)"""
+        start = time.time()
+        try:
+            response = self.session.put(self.url, json=body, timeout=self.timeout)
+            status = response.status_code
+            error = None if status < 300 else f"HTTP {status}"
+        except requests.RequestException as e:
+            response = None
+            status = None
+            error = str(e)
+        with self._lock:
+            self._latencies.append(time.time() - start)
+            if status is not None and status < 300:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.last_error = error
+        return status, error, response
+
+    def _replay(self):
+        backoff = 0.0
+        delay = 0.0
+        while not self._stopping.wait(delay):
+            batch = self.spool.pending(self.replay_batch)
+            if not batch:
+                delay = REPLAY_IDLE_INTERVAL
+                continue
+            seqs = [seq for seq, _ in batch]
+            status, error, response = self._put({'frames': [frame for _, frame in batch], 'replay': True})
+            if status is not None and status < 300:
+                self.spool.ack(seqs)
+                with self._lock:
+                    self.replayed += len(seqs)
+                self._healthy.set()
+                print(f"Replayed {len(seqs)} spooled frames, backlog {self.spool.backlog()}")
+                # Keep draining with a short pause, one batch in flight at a time
+                backoff = 0.0
+                delay = REPLAY_PAUSE
+                continue
+            if status is not None and 400 <= status < 500 and status != 429:
+                print(f"❗ Replay batch rejected by server: {error}, dropping {len(seqs)} frames")
+                with self._lock:
+                    self.rejected += len(seqs)
+                self.spool.ack(seqs)
+                continue
+            # The server may have taken the start of the batch before it ran out of room
+            accepted = 0
+            if status == 503:
+                try:
+                    accepted = int(response.json().get('accepted', 0))
+                except (ValueError, AttributeError):
+                    accepted = 0
+            self.spool.ack(seqs[:accepted])
+            self.spool.release(seqs[accepted:])
+            self._healthy.clear()
+            backoff = min(self.backoff_max, max(REPLAY_BACKOFF_MIN, backoff * 2))
+            retry_after = response.headers.get('Retry-After') if response is not None else None
+            if retry_after and retry_after.isdigit():
+                backoff = max(backoff, float(retry_after))
+            delay = backoff * random.uniform(0.8, 1.2)
+            print(f"Replay failed ({error}), backlog {self.spool.backlog()}, retrying in {delay:.1f}s")
+
+def open_sx127x_radio():
+    """Set up the SX127x board for continuous RX with DIO0 mapped to RX_DONE"""
+    import RPi.GPIO as GPIO
+    from SX127x.LoRa import LoRa
+    from SX127x.board_config import BOARD
+    from SX127x.constants import MODE
+
+    # ---- Force RESET HIGH ----
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+
+    GPIO.setup(RESET_PIN, GPIO.OUT)
+    GPIO.output(RESET_PIN, GPIO.HIGH)
+
+    GPIO.setup(NSS_PIN, GPIO.OUT)
+    GPIO.output(NSS_PIN, GPIO.HIGH)  # Ensure NSS idle HIGH
+
+    # ---- LoRa Setup ----
+    BOARD.setup()
+
+    class SX127xRadio(LoRa):
+        """pySX127x radio; LoRa registers a GPIO edge callback on DIO0 that calls on_rx_done()"""
+
+        def __init__(self):
+            super(SX127xRadio, self).__init__(verbose=False)
+            self._on_rx_done = None
+            self.set_freq(915.0)
+            self.set_spreading_factor(7)
+            self.set_bw(7)
+            self.set_coding_rate(5)
+            self.set_preamble(8)
+            self.set_sync_word(0x12)
+            self.set_pa_config(pa_select=1)  # PA_BOOST
+
+        def start(self, on_rx_done):
+            self._on_rx_done = on_rx_done
+            self.set_dio_mapping([0, 0, 0, 0, 0, 0])  # DIO0 for RX_DONE
+            self.reset_ptr_rx()
+            self.set_mode(MODE.RXCONT)
+
+        def on_rx_done(self):
+            # Runs on the RPi.GPIO callback thread
+            if self._on_rx_done is not None:
+                self._on_rx_done()
+
+        def read_packet(self):
+            """(payload, RSSI dBm, SNR dB, CRC ok) of the packet in the FIFO"""
+            crc_ok = not self.get_irq_flags().get('crc_error')
+            payload = bytes(self.read_payload(nocheck=True))
+            rssi = self.get_pkt_rssi_value()
+            snr = self.get_pkt_snr_value()
+            self.clear_irq_flags(RxDone=1, PayloadCrcError=1)
+            # Back to continuous RX from the start of the FIFO
+            self.set_mode(MODE.SLEEP)
+            self.reset_ptr_rx()
+            self.set_mode(MODE.RXCONT)
+            return payload, rssi, snr, crc_ok
+
+        def stop(self):
+            self.set_mode(MODE.SLEEP)
+            BOARD.teardown()
+
+    return SX127xRadio()
+
+class FakeRadio:
+    """Stand-in for the SX127x so the receiver can run and be benchmarked on any Linux box
+
+    inject() puts a packet in the one-packet FIFO and raises RX_DONE on a
+    separate interrupt thread, like the RPi.GPIO callback thread. A packet
+    arriving before the previous one was read overwrites it, as on the chip.
+    """
+
+    def __init__(self):
+        self._fifo = None
+        self._lock = threading.Lock()
+        self._irq = queue.Queue()
+        self._on_rx_done = None
+        self._thread = None
+        self.overwritten = 0
+
+    def start(self, on_rx_done):
+        self._on_rx_done = on_rx_done
+        self._thread = threading.Thread(target=self._interrupts, name="fake-radio-irq", daemon=True)
+        self._thread.start()
+
+    def inject(self, payload, rssi=-60, snr=9.5, crc_ok=True):
+        """Simulate receiving one packet"""
+        with self._lock:
+            if self._fifo is not None:
+                self.overwritten += 1
+            self._fifo = (bytes(payload), rssi, snr, crc_ok)
+        self._irq.put(True)
+
+    def play(self, payloads, interval=0.0):
+        """Inject packets from an iterable on a background thread, returns the thread"""
+        def run():
+            for payload in payloads:
+                self.inject(payload)
+                if interval:
+                    time.sleep(interval)
+        t = threading.Thread(target=run, name="fake-radio-play", daemon=True)
+        t.start()
+        return t
+
+    def read_packet(self):
+        with self._lock:
+            packet, self._fifo = self._fifo, None
+        return packet
+
+    def stop(self):
+        if self._thread is not None:
+            self._irq.put(None)
+            self._thread.join()
+
+    def _interrupts(self):
+        while self._irq.get() is not None:
+            self._on_rx_done()
+
+class RadioReceiver:
+    """Reads packets on the RX_DONE interrupt and hands them to a processing thread
+
+    The interrupt callback only copies the packet out of the radio FIFO and
+    queues it, so the radio is back in RX right away and nothing is lost
+    while frames are decoded and forwarded. A full queue drops the packet.
+    """
+
+    def __init__(self, radio, handler, max_queue=RX_QUEUE_SIZE):
+        self.radio = radio
+        self.handler = handler
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.received = 0
+        self.crc_errors = 0
+        self.dropped = 0
+        self.handler_errors = 0
+        self._rssi = []
+        self._snr = []
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="lora-rx", daemon=True)
+        self._thread.start()
+        self.radio.start(self._on_rx_done)
+
+    def stop(self, timeout=5):
+        """Process what is still queued, then stop (stop the radio first)"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            rssi = self._rssi
+            snr = self._snr
+            result = {
+                'received': self.received,
+                'crc_errors': self.crc_errors,
+                'dropped': self.dropped,
+                'handler_errors': self.handler_errors,
+                'queue_depth': self._queue.qsize(),
+            }
+            if rssi:
+                result['rssi'] = {'last': rssi[-1], 'min': min(rssi), 'mean': round(sum(rssi) / len(rssi), 1)}
+                result['snr'] = {'last': snr[-1], 'min': min(snr), 'mean': round(sum(snr) / len(snr), 1)}
+        return result
+
+    def _on_rx_done(self):
+        packet = self.radio.read_packet()
+        if packet is None:
+            return
+        payload, rssi, snr, crc_ok = packet
+        with self._lock:
+            self.received += 1
+            # Signal quality of the last 100 packets
+            self._rssi = self._rssi[-99:] + [rssi]
+            self._snr = self._snr[-99:] + [snr]
+            if not crc_ok:
+                self.crc_errors += 1
+                return
+        try:
+            self._queue.put_nowait((payload, rssi, snr))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.handler(*item)
+            except Exception as e:
+                with self._lock:
+                    self.handler_errors += 1
+                print(f"❗ Error processing packet: {e}")
+
+# (frame field, scale, missing marker) in FRAME_V1 order after the header
+FRAME_V1_FIELDS = (
+    ("temperature", 100, -32768),
+    ("humidity", 100, 0xFFFF),
+    ("wind_speed", 100, 0xFFFF),
+    ("mq135", 100, 0xFFFFFFFF),
+    ("mq2", 100, 0xFFFFFFFF),
+    ("mq7", 100, 0xFFFFFFFF),
+    ("mq9", 100, 0xFFFFFFFF),
+    ("fire_prob", 100, -32768),
+)
+
+# Frame field -> sensor name on the server, for stations without Firebase sensor IDs
+SENSOR_NAMES = {
+    "mq135": "MQ135_CO2",
+    "mq2": "MQ2_Smoke",
+    "mq7": "MQ7_CO",
+    "mq9": "MQ9_Flammable",
+    "temperature": "Temperature",
+    "humidity": "Humidity",
+    "wind_speed": "Wind_Speed",
+    "fire_prob": "Fire_Probability"
+}
+
+def decode_frame(payload):
+    """Decode a received payload into a frame dict, binary or legacy JSON
+
+    Raises ValueError for anything that is neither.
+    """
+    view = memoryview(payload)
+    if len(view) and view[0] == FRAME_MAGIC:
+        if len(view) < 2 or view[1] != 1:
+            raise ValueError(f"Unsupported binary frame version {view[1] if len(view) > 1 else None}")
+        if len(view) < FRAME_V1.size:
+            raise ValueError(f"Binary frame too short ({len(view)} bytes)")
+        fields = FRAME_V1.unpack_from(view)
+        data = {"station": fields[2], "seq": fields[3]}
+        for (name, scale, missing), raw in zip(FRAME_V1_FIELDS, fields[5:]):
+            if raw != missing:
+                data[name] = raw / scale
+        # No camera reading is reported as disconnected, like the JSON frames do
+        data.setdefault("fire_prob", -1)
+        return data
+    try:
+        data = json.loads(bytes(view).decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Received data is not a binary frame or valid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("JSON frame is not an object")
+    return data
+
+def encode_frame(data):
+    """Binary v1 frame as esp32main.ino sends it, the inverse of decode_frame (used by bench.py and tests)"""
+    values = []
+    for name, scale, missing in FRAME_V1_FIELDS:
+        value = data.get(name)
+        # fire_prob -1 (camera disconnected) is sent as missing
+        if value is None or (name == "fire_prob" and value == -1):
+            values.append(missing)
         else:
-            print("❌ RX timeout.")
-        
-        time.sleep(5)
-
-except KeyboardInterrupt:
-    print("Exiting lora_center.")
-    lora.set_mode(MODE.SLEEP)
-    BOARD.teardown()
+            values.append(round(value * scale))
+    return FRAME_V1.pack(FRAME_MAGIC, 1, data["station"], data["seq"], 0, *values)
+
+class SequenceTracker:
+    """Counts lost and duplicate frames per station from 16-bit sequence numbers"""
+
+    def __init__(self):
+        self._last = {}
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.restarts = 0
+
+    def check(self, station, seq):
+        """Returns False if the frame is a duplicate (or older than the last one)"""
+        last = self._last.get(station)
+        self.received += 1
+        if last is None:
+            self._last[station] = seq
+            return True
+        gap = (seq - last) % 65536
+        if gap == 0 or gap > 32768:
+            if seq == 0:
+                # Node rebooted and started counting from 0 again
+                self.restarts += 1
+                self._last[station] = seq
+                return True
+            self.duplicates += 1
+            return False
+        self.lost += gap - 1
+        self._last[station] = seq
+        return True
+
+    def stats(self):
+        return {'received': self.received, 'lost': self.lost, 'duplicates': self.duplicates,
+                'restarts': self.restarts}
+
+sequences = SequenceTracker()
+
+# Created by main()
+forwarder = None
+deadband = None
+
+def open_deadband():
+    """Deadband filter from DEADBAND_PATH guarded by the rules in RULES_PATH, None if disabled"""
+    if not GATEWAY_DEADBAND or not DEADBAND_PATH:
+        return None
+    rules = None
+    if os.path.exists(RULES_PATH):
+        with open(RULES_PATH, encoding='utf-8') as f:
+            rules = json.load(f)
+    return Deadband.from_config(load_deadband_config(DEADBAND_PATH), rules)
+
+def send_sensor_data_to_server(data):
+    """Send a whole sensor frame to Flask server in a single request"""
+    print(f"Queueing frame for Flask server: {FLASK_FRAME_URL}")
+    
+    # Map frame fields to Firebase sensor IDs, fire_prob is sent even if -1 (camera disconnected).
+    # Other stations are sent by sensor name and station, the server stores them per station
+    station = data.get("station", DEFAULT_STATION)
+    mapping = SENSOR_IDS if station == DEFAULT_STATION else SENSOR_NAMES
+    sensors = {}
+    suppressed = 0
+    for key, sensor_id in mapping.items():
+        if key not in data:
+            continue
+        # Skip values that did not move since the last one sent
+        name = SENSOR_NAMES[key]
+        if deadband is not None and not deadband.check((station, name), name, data[key]):
+            suppressed += 1
+            continue
+        sensors[sensor_id] = data[key]
+    if not sensors:
+        if suppressed:
+            print(f"Frame unchanged within deadband ({suppressed} values), nothing to send")
+        else:
+            print("❗ Frame contains no known sensor fields, nothing to send")
+        return
+    
+    # Print camera status information
+    if "fire_prob" in data:
+        if data["fire_prob"] == -1:
+            print("⚠️ Camera disconnected, fire detection status: Unknown")
+        else:
+            status = "Safe"
+            if data["fire_prob"] >= 70:
+                status = "High Risk"
+            elif data["fire_prob"] >= 50:
+                status = "Medium Risk"
+            elif data["fire_prob"] >= 20:
+                status = "Low Risk"
+            print(f"🔍 Fire detection status: {status} ({data['fire_prob']}%)")
+    
+    # Hand the frame to the forwarder threads, the radio loop never waits on the network
+    frame = {"sensors": sensors, "timestamp": time.time()}
+    if station != DEFAULT_STATION:
+        frame["station"] = str(station)
+    if not forwarder.submit(frame):
+        print("❗ Forward queue full, frame dropped")
+
+def handle_payload(payload, rssi, snr):
+    """Decode one received packet and forward it (runs on the receiver's processing thread)"""
+    try:
+        data = decode_frame(payload)
+    except ValueError as e:
+        print(f"❗ {e}")
+        return
+    print("🎉 Received:", data, f"(RSSI {rssi} dBm, SNR {snr} dB)")
+    if "seq" in data and not sequences.check(data.get("station", DEFAULT_STATION), data["seq"]):
+        print(f"❗ Duplicate frame {data['seq']} from station {data.get('station')}, dropped")
+        return
+    # Send data to Flask server
+    send_sensor_data_to_server(data)
+
+def main():
+    global forwarder, deadband
+    deadband = open_deadband()
+    forwarder = FrameForwarder(FLASK_FRAME_URL, spool=FrameSpool(SPOOL_DIR) if SPOOL_DIR else None)
+    radio = FakeRadio() if LORA_FAKE_RADIO else open_sx127x_radio()
+    receiver = RadioReceiver(radio, handle_payload)
+    # Stays in continuous RX, packets arrive through the DIO0 interrupt
+    receiver.start()
+    print("Listening for esp32...")
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            print("Receiver stats:", receiver.stats())
+            print("Sequence stats:", sequences.stats())
+            print("Forwarder stats:", forwarder.stats())
+            if deadband is not None:
+                print("Deadband stats:", deadband.stats())
+    except KeyboardInterrupt:
+        print("Exiting lora_center.")
+    finally:
+        radio.stop()
+        receiver.stop()
+        forwarder.stop()
+        print("Receiver stats:", receiver.stats())
+        print("Forwarder stats:", forwarder.stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import heapq
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """Time-bounded sampling profiler for the live process
+
+    While running, a background thread takes the stack of every thread each
+    `interval` seconds (sys._current_frames) and counts identical stacks, so
+    the cost is per sample, not per function call. With a `route`, only
+    threads serving a request for that route are sampled. Request threads
+    are announced with begin_request()/end_request(); when no profile runs
+    those are a single attribute check.
+
+    The slowest `slowest` requests of a profile keep their own stack counts.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # thread ident -> (request number, route, method, path, start)
+        self._requests = {}
+        self._request_stacks = {}
+        self._next_request = 0
+        self._reset(None, 0.0, 0.0, 0)
+
+    def start(self, seconds, route=None, interval=0.005, slowest=10):
+        """Start a profile of `seconds`, returns False if one is already running"""
+        with self._lock:
+            if self.active:
+                return False
+            self._reset(route, seconds, interval, slowest)
+            self._stop.clear()
+            self.active = True
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def begin_request(self, route, method, path):
+        if not self.active:
+            return
+        with self._lock:
+            if not self.active:
+                return
+            self._next_request += 1
+            self._requests[threading.get_ident()] = (self._next_request, route, method, path, time.perf_counter())
+
+    def end_request(self):
+        if threading.get_ident() not in self._requests:
+            return
+        with self._lock:
+            current = self._requests.pop(threading.get_ident(), None)
+            if current is None:
+                return
+            number, route, method, path, start = current
+            stacks = self._request_stacks.pop(number, {})
+            if not self.slowest:
+                return
+            entry = (time.perf_counter() - start, number, route, method, path, stacks)
+            # Min-heap of the slowest requests, the fastest of them is dropped first
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def status(self):
+        with self._lock:
+            elapsed = (self.finished or time.time()) - self.started if self.started else 0.0
+            return {
+                'active': self.active,
+                'route': self.route,
+                'seconds': self.seconds,
+                'interval': self.interval,
+                'elapsed': round(elapsed, 3),
+                'samples': self.samples,
+                'stacks': len(self._stacks),
+                'overhead_seconds': round(self.overhead, 4),
+            }
+
+    def collapsed(self):
+        """Stacks in the collapsed format ("root;caller;callee count" per line) for flamegraph tools"""
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks)
+
+    def slowest_requests(self):
+        """Slowest requests of the profile, slowest first, each with its collapsed stacks"""
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [{
+            'ms': round(seconds * 1000, 3),
+            'route': route,
+            'method': method,
+            'path': path,
+            'samples': sum(stacks.values()),
+            'stacks': [f"{';'.join(stack)} {count}" for stack, count in sorted(stacks.items(), key=lambda item: -item[1])],
+        } for seconds, _, route, method, path, stacks in entries]
+
+    def _reset(self, route, seconds, interval, slowest):
+        self.route = route
+        self.seconds = seconds
+        self.interval = interval
+        self.slowest = slowest
+        self.started = None
+        self.finished = None
+        self.samples = 0
+        self.overhead = 0.0
+        self._stacks = {}
+        self._slowest = []
+        self._request_stacks = {}
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        with self._lock:
+            self.started = time.time()
+        deadline = time.monotonic() + self.seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            start = time.perf_counter()
+            frames = sys._current_frames()
+            with self._lock:
+                requests = dict(self._requests)
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                current = requests.get(ident)
+                if self.route is not None and (current is None or current[1] != self.route):
+                    continue
+                if current is not None:
+                    root = f"{current[2]} {current[1]}"
+                else:
+                    if ident not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    root = names.get(ident, str(ident))
+                stack = (root,) + _stack(frame)
+                with self._lock:
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                    if current is not None:
+                        counts = self._request_stacks.setdefault(current[0], {})
+                        counts[stack] = counts.get(stack, 0) + 1
+            del frames
+            with self._lock:
+                self.samples += 1
+                self.overhead += time.perf_counter() - start
+        with self._lock:
+            self.active = False
+            self.finished = time.time()
+            # Requests still running when the profile ends are not ranked
+            self._requests.clear()
+            self._request_stacks.clear()
+
+
+def _stack(frame):
+    """Function names of a frame's stack, outermost first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
@@ -0,0 +1,248 @@
+import math
+
+# Sensor pairs whose co-movement is tracked (e.g. temperature up while humidity down)
+DEFAULT_PAIRS = (
+    ("Temperature", "Humidity"),
+    ("Temperature", "MQ2_Smoke"),
+    ("Humidity", "MQ2_Smoke"),
+)
+
+# Weight of each component in the combined score
+DEFAULT_WEIGHTS = {
+    'temperature_rise': 0.3,
+    'humidity_drop': 0.2,
+    'smoke': 0.5,
+    'gas': 0.3,
+    'pattern': 0.6,
+    'coupling': 0.3,
+    'camera': 0.9,
+}
+
+# Smallest standard deviation used for z-scores, so sensor noise on a flat
+# signal does not look like an anomaly (in each sensor's own unit)
+DEFAULT_MIN_STD = {
+    "Temperature": 0.5,
+    "Humidity": 1.0,
+    "Wind_Speed": 0.5,
+    "MQ135_CO2": 20.0,
+    "MQ2_Smoke": 2.0,
+    "MQ7_CO": 0.5,
+    "MQ9_Flammable": 0.1,
+}
+
+# Rate of change that counts as a full-strength signal, per minute
+TEMPERATURE_RISE_PER_MIN = 1.0   # °C
+HUMIDITY_DROP_PER_MIN = 2.0      # %
+SMOKE_RISE_PER_MIN = 10.0        # ppm
+Z_SCORE_FULL = 3.0
+
+# Shortest time between the two samples a slope is taken from, in seconds.
+# Over a few milliseconds a 1 °C sensor step would read as a huge rate
+MIN_RATE_DT = 1.0
+
+RISK_LEVELS = ((0.2, "Low"), (0.5, "Moderate"), (0.75, "High"), (1.01, "Extreme"))
+
+
+class SensorStats:
+    """Time-aware exponentially weighted statistics for one sensor
+
+    Keeps an EWMA mean and variance (half-life in seconds), the z-score of the
+    latest sample against them and an EWMA-smoothed rate of change for each
+    window. Fixed memory and O(windows) work per sample.
+
+    Slopes are taken against the last sample at least `min_rate_dt` seconds
+    older, samples closer together only move the mean and variance.
+    """
+
+    __slots__ = ('half_life', 'windows', 'min_std', 'min_rate_dt', 'count', 'mean', 'var', 'z', 'last', 'last_time',
+                 'rate_value', 'rate_time', 'rates')
+
+    def __init__(self, half_life, windows, min_std=1e-6, min_rate_dt=MIN_RATE_DT):
+        self.half_life = half_life
+        self.min_std = min_std
+        self.min_rate_dt = min_rate_dt
+        self.windows = tuple(windows)
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.z = 0.0
+        self.last = None
+        self.last_time = None
+        # Sample the next slope is measured from
+        self.rate_value = None
+        self.rate_time = None
+        self.rates = [0.0] * len(self.windows)
+
+    def update(self, value, when):
+        if self.count == 0:
+            self.count = 1
+            self.mean = value
+            self.last = value
+            self.last_time = when
+            self.rate_value = value
+            self.rate_time = when
+            return
+
+        dt = when - self.last_time
+        diff = value - self.mean
+        self.z = diff / max(math.sqrt(self.var), self.min_std)
+        if dt > 1e-3:
+            alpha = 1.0 - math.exp(-dt * math.log(2) / self.half_life)
+            self.last_time = when
+        else:
+            # Same timestamp as the previous sample, weigh it like a tiny step
+            alpha = 1e-3
+        rate_dt = when - self.rate_time
+        if rate_dt >= self.min_rate_dt:
+            slope = (value - self.rate_value) / rate_dt
+            for i, window in enumerate(self.windows):
+                a = 1.0 - math.exp(-rate_dt / window)
+                self.rates[i] += a * (slope - self.rates[i])
+            self.rate_value = value
+            self.rate_time = when
+        self.mean += alpha * diff
+        self.var = (1.0 - alpha) * (self.var + alpha * diff * diff)
+        self.last = value
+        self.count += 1
+
+    def rate(self, window_index=0):
+        """Smoothed rate of change in units per second"""
+        return self.rates[window_index]
+
+    def to_dict(self):
+        return {
+            'ewma': self.mean,
+            'std': math.sqrt(self.var),
+            'z': self.z,
+            'rates_per_min': {str(w): r * 60 for w, r in zip(self.windows, self.rates)},
+            'samples': self.count,
+        }
+
+
+class PairStats:
+    """Exponentially weighted correlation between the short-window rates of two sensors"""
+
+    __slots__ = ('a', 'b', 'alpha', 'mean_a', 'mean_b', 'var_a', 'var_b', 'cov', 'count')
+
+    def __init__(self, a, b, alpha=0.05):
+        self.a = a
+        self.b = b
+        self.alpha = alpha
+        self.mean_a = self.mean_b = 0.0
+        self.var_a = self.var_b = self.cov = 0.0
+        self.count = 0
+
+    def update(self, rate_a, rate_b):
+        self.count += 1
+        alpha = max(self.alpha, 1.0 / self.count)
+        da = rate_a - self.mean_a
+        db = rate_b - self.mean_b
+        self.mean_a += alpha * da
+        self.mean_b += alpha * db
+        self.var_a = (1 - alpha) * (self.var_a + alpha * da * da)
+        self.var_b = (1 - alpha) * (self.var_b + alpha * db * db)
+        self.cov = (1 - alpha) * (self.cov + alpha * da * db)
+
+    @property
+    def correlation(self):
+        denom = math.sqrt(self.var_a * self.var_b)
+        return self.cov / denom if denom > 1e-12 else 0.0
+
+
+class RiskModel:
+    """Online fire-risk score built from rolling per-sensor statistics and the camera
+
+    update() is O(rate windows + pairs of that sensor) per sample and memory is
+    fixed per sensor, so cost stays flat however much history is stored.
+    Components are combined noisy-OR style: score = 1 - prod(1 - w_i * c_i).
+    """
+
+    def __init__(self, sensors, half_life=300.0, rate_windows=(60, 300, 900),
+                 pairs=DEFAULT_PAIRS, weights=None, min_rate_dt=MIN_RATE_DT):
+        self.stats = {name: SensorStats(half_life, rate_windows, DEFAULT_MIN_STD.get(name, 1e-6), min_rate_dt)
+                      for name in sensors}
+        self.pairs = [PairStats(a, b) for a, b in pairs if a in self.stats and b in self.stats]
+        self._pairs_by_sensor = {}
+        for pair in self.pairs:
+            self._pairs_by_sensor.setdefault(pair.a, []).append(pair)
+            self._pairs_by_sensor.setdefault(pair.b, []).append(pair)
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.camera = -1  # -1 means camera disconnected
+
+    def update(self, sensor, value, when):
+        stats = self.stats.get(sensor)
+        if stats is None:
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if value != value:
+            return
+        stats.update(value, when)
+        for pair in self._pairs_by_sensor.get(sensor, ()):
+            pair.update(self.stats[pair.a].rate(), self.stats[pair.b].rate())
+
+    def set_camera(self, probability):
+        try:
+            self.camera = float(probability)
+        except (TypeError, ValueError):
+            self.camera = -1
+
+    def components(self):
+        temperature_rise = _rate_signal(self.stats.get("Temperature"), TEMPERATURE_RISE_PER_MIN)
+        humidity_drop = _rate_signal(self.stats.get("Humidity"), -HUMIDITY_DROP_PER_MIN)
+        smoke_rise = _rate_signal(self.stats.get("MQ2_Smoke"), SMOKE_RISE_PER_MIN)
+        gas = max((_z_signal(self.stats.get(name)) for name in ("MQ7_CO", "MQ9_Flammable", "MQ135_CO2")), default=0.0)
+        return {
+            'temperature_rise': temperature_rise,
+            'humidity_drop': humidity_drop,
+            'smoke': max(_z_signal(self.stats.get("MQ2_Smoke")), smoke_rise),
+            'gas': gas,
+            # All three moving the wrong way at once
+            'pattern': min(temperature_rise, humidity_drop, smoke_rise),
+            # Temperature and humidity moving against each other while smoke follows temperature
+            'coupling': _clip(-self.correlation("Temperature", "Humidity")) *
+                        _clip(self.correlation("Temperature", "MQ2_Smoke")),
+            'camera': _clip(self.camera) if self.camera != -1 else 0.0,
+        }
+
+    def correlation(self, a, b):
+        for pair in self.pairs:
+            if (pair.a, pair.b) in ((a, b), (b, a)):
+                return pair.correlation
+        return 0.0
+
+    def score(self):
+        components = self.components()
+        safe = 1.0
+        for name, value in components.items():
+            safe *= 1.0 - _clip(self.weights.get(name, 0.0) * value)
+        score = 1.0 - safe
+        level = next(label for limit, label in RISK_LEVELS if score < limit)
+        return {'score': round(score, 4), 'level': level,
+                'components': {k: round(v, 4) for k, v in components.items()}}
+
+    def snapshot(self):
+        result = self.score()
+        result['sensors'] = {name: stats.to_dict() for name, stats in self.stats.items()}
+        result['correlations'] = {f"{p.a}/{p.b}": round(p.correlation, 4) for p in self.pairs}
+        result['camera'] = self.camera
+        return result
+
+
+def _clip(value, low=0.0, high=1.0):
+    return min(high, max(low, value))
+
+
+def _rate_signal(stats, full_per_min):
+    """Short-window rate scaled so `full_per_min` (signed) maps to 1"""
+    if stats is None or stats.count < 2:
+        return 0.0
+    return _clip(stats.rate() * 60 / full_per_min)
+
+
+def _z_signal(stats):
+    if stats is None or stats.count < 2:
+        return 0.0
+    return _clip(stats.z / Z_SCORE_FULL)
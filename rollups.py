@@ -0,0 +1,233 @@
+import numpy as np
+
+from timeseries import TimeSeriesBuffer
+
+# (name, bucket seconds, buckets kept)
+DEFAULT_TIERS = (
+    ('minute', 60, 7 * 24 * 60),    # 7 days
+    ('hour', 3600, 90 * 24),        # 90 days
+    ('day', 86400, 5 * 366),        # ~5 years
+)
+
+STATS = ('min', 'max', 'sum', 'count', 'last')
+
+
+class RollupTier:
+    """Downsampled min/max/sum/count/last per sensor for fixed-size time buckets
+
+    The open bucket is kept in small per-sensor vectors and updated in O(1)
+    per sample. When a sample lands in a later bucket, the open bucket is
+    appended to a TimeSeriesBuffer of closed buckets.
+    """
+
+    def __init__(self, name, seconds, capacity, columns):
+        self.name = name
+        self.seconds = seconds
+        self.columns = list(columns)
+        self._index = {c: i for i, c in enumerate(self.columns)}
+        self.closed = TimeSeriesBuffer([f"{c}.{s}" for c in self.columns for s in STATS], capacity)
+        self._bucket = None
+        self._reset_open()
+
+    def _reset_open(self):
+        n = len(self.columns)
+        self._min = np.full(n, np.nan)
+        self._max = np.full(n, np.nan)
+        self._sum = np.zeros(n)
+        self._count = np.zeros(n)
+        self._last = np.full(n, np.nan)
+
+    def add(self, when, vector):
+        """Fold one sample (a vector in column order, NaN = not present) into its bucket"""
+        bucket = int(when // self.seconds) * self.seconds
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket > self._bucket:
+            self._close()
+            self._bucket = bucket
+        # Late samples (bucket < open bucket) are folded into the open bucket
+
+        valid = ~np.isnan(vector)
+        self._min = np.fmin(self._min, vector)
+        self._max = np.fmax(self._max, vector)
+        self._sum += np.where(valid, vector, 0.0)
+        self._count += valid
+        self._last = np.where(valid, vector, self._last)
+
+    @property
+    def retention(self):
+        """Seconds of history the closed buckets can hold"""
+        return self.seconds * self.closed.capacity
+
+    def oldest(self):
+        """Start of the oldest bucket the tier can hold now, None before the first sample"""
+        if self._bucket is None:
+            return None
+        return self._bucket - self.retention
+
+    def covers(self, start):
+        """True if buckets from `start` on have not aged out of the tier"""
+        oldest = self.oldest()
+        return start is None or oldest is None or start >= oldest
+
+    def load(self, times, matrix):
+        """Fold many samples at once; times sorted, matrix is (n, columns)
+
+        Every bucket's stats are computed with reduceat over the bucket
+        boundaries and the closed buckets are appended in one block, so the
+        cost does not depend on the number of buckets.
+        """
+        if not len(times):
+            return
+        buckets = (times // self.seconds).astype(np.int64) * self.seconds
+        if self._bucket is not None:
+            # Late samples are folded into the open bucket, as in add()
+            buckets = np.maximum(buckets, self._bucket)
+        buckets = np.maximum.accumulate(buckets)
+        # Start of each run of samples sharing a bucket
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        valid = ~np.isnan(matrix)
+        mins = np.fmin.reduceat(matrix, starts, axis=0)
+        maxs = np.fmax.reduceat(matrix, starts, axis=0)
+        sums = np.add.reduceat(np.where(valid, matrix, 0.0), starts, axis=0)
+        counts = np.add.reduceat(valid.astype(np.float64), starts, axis=0)
+        # Row of the last valid value per column in each bucket, -1 if none
+        rows = np.maximum.reduceat(np.where(valid, np.arange(len(times))[:, None], -1), starts, axis=0)
+        lasts = np.where(rows >= 0, matrix[np.maximum(rows, 0), np.arange(matrix.shape[1])], np.nan)
+        starts = buckets[starts]
+
+        if self._bucket is not None:
+            if starts[0] == self._bucket:
+                mins[0] = np.fmin(self._min, mins[0])
+                maxs[0] = np.fmax(self._max, maxs[0])
+                sums[0] += self._sum
+                counts[0] += self._count
+                lasts[0] = np.where(np.isnan(lasts[0]), self._last, lasts[0])
+            else:
+                self._close()
+
+        # All but the last bucket are closed, only the newest `capacity` of them are kept
+        keep = slice(max(0, len(starts) - 1 - self.closed.capacity), len(starts) - 1)
+        if keep.stop > keep.start:
+            stats = {'min': mins, 'max': maxs, 'sum': sums, 'count': counts, 'last': lasts}
+            self.closed.extend(starts[keep], {
+                f"{c}.{s}": stats[s][keep, i] for c, i in self._index.items() for s in STATS
+            })
+        self._bucket = int(starts[-1])
+        self._min = mins[-1]
+        self._max = maxs[-1]
+        self._sum = sums[-1]
+        self._count = counts[-1]
+        self._last = lasts[-1]
+
+    def query(self, start=None, end=None, sensors=None):
+        """Buckets overlapping [start, end] as (bucket starts, {sensor: {stat: values}})"""
+        names = self.columns if sensors is None else list(sensors)
+        lo = None if start is None else int(start // self.seconds) * self.seconds
+        times, cols = self.closed.range(lo, end, [f"{c}.{s}" for c in names for s in STATS])
+
+        include_open = self._bucket is not None and (lo is None or self._bucket >= lo) \
+            and (end is None or self._bucket <= end)
+        if include_open:
+            times = np.append(times, self._bucket)
+        result = {}
+        for name in names:
+            i = self._index[name]
+            stats = {s: cols[f"{name}.{s}"] for s in STATS}
+            if include_open:
+                stats = {
+                    'min': np.append(stats['min'], self._min[i]),
+                    'max': np.append(stats['max'], self._max[i]),
+                    'sum': np.append(stats['sum'], self._sum[i]),
+                    'count': np.append(stats['count'], self._count[i]),
+                    'last': np.append(stats['last'], self._last[i]),
+                }
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(stats['count'] > 0, stats['sum'] / stats['count'], np.nan)
+            result[name] = {
+                'min': stats['min'],
+                'max': stats['max'],
+                'mean': mean,
+                'count': stats['count'],
+                'last': stats['last'],
+            }
+        return times, result
+
+    def _close(self):
+        row = {}
+        for c, i in self._index.items():
+            row[f"{c}.min"] = self._min[i]
+            row[f"{c}.max"] = self._max[i]
+            row[f"{c}.sum"] = self._sum[i]
+            row[f"{c}.count"] = self._count[i]
+            row[f"{c}.last"] = self._last[i]
+        self.closed.append(self._bucket, row)
+        self._reset_open()
+
+
+class RollupSet:
+    """All rollup tiers for a set of sensors plus a planner that picks a tier"""
+
+    def __init__(self, columns, tiers=DEFAULT_TIERS):
+        self.columns = list(columns)
+        self._index = {c: i for i, c in enumerate(self.columns)}
+        self.tiers = [RollupTier(name, seconds, capacity, self.columns) for name, seconds, capacity in tiers]
+        self.tiers.sort(key=lambda t: t.seconds)
+
+    def add(self, when, values):
+        """Fold the sensors present in `values` (name -> number) into every tier"""
+        vector = np.full(len(self.columns), np.nan)
+        for name, value in values.items():
+            i = self._index.get(name)
+            if i is None:
+                continue
+            try:
+                vector[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        for tier in self.tiers:
+            tier.add(when, vector)
+
+    @property
+    def retention(self):
+        """Seconds of history kept by the longest tier"""
+        return max(tier.retention for tier in self.tiers)
+
+    def load(self, times, columns, until=None):
+        """Bulk-fold historical samples, e.g. from the history store on startup
+
+        With `until` (the newest time that will be loaded), each tier skips
+        samples older than its own retention window before it.
+        """
+        matrix = np.column_stack([
+            np.asarray(columns[c], dtype=np.float64) if c in columns else np.full(len(times), np.nan)
+            for c in self.columns
+        ]) if len(times) else np.empty((0, len(self.columns)))
+        times = np.asarray(times, dtype=np.float64)
+        for tier in self.tiers:
+            lo = 0
+            if until is not None:
+                # Start of the oldest bucket the tier can still hold
+                oldest = (int(until // tier.seconds) - tier.closed.capacity) * tier.seconds
+                lo = int(np.searchsorted(times, oldest, side='left'))
+            if lo < len(times):
+                tier.load(times[lo:], matrix[lo:])
+
+    def plan(self, resolution, start=None):
+        """Tier to answer a query from `start` at `resolution` seconds, None for raw
+
+        The coarsest tier whose buckets are no wider than `resolution` and that
+        still holds `start`. If every such tier has already dropped the start
+        of the range, the finest coarser tier that holds it, else raw samples.
+        """
+        fine = [tier for tier in self.tiers if tier.seconds <= resolution]
+        coarse = [tier for tier in self.tiers if tier.seconds > resolution]
+        for tier in reversed(fine):
+            if tier.covers(start):
+                return tier
+        if not fine:
+            return None
+        for tier in coarse:
+            if tier.covers(start):
+                return tier
+        return None
@@ -0,0 +1,204 @@
+import json
+
+import numpy as np
+
+
+def load_config(path):
+    """Read a rules JSON file: {"defaults": {...}, "rules": [{"sensor": ..., "high"/"low": ...}]}"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Rule:
+    """Threshold rule for one sensor with optional hysteresis and debounce
+
+    A rule turns active when the value goes above `high` (or below `low`) for
+    `debounce` consecutive samples, and clears once it is back inside the
+    threshold by at least `hysteresis` for `debounce` consecutive samples.
+    Values listed in `ignore` (e.g. -1 for a disconnected camera) clear the
+    rule immediately.
+    """
+
+    def __init__(self, sensor, high=None, low=None, unit="", hysteresis=0.0, debounce=1, ignore=()):
+        if high is None and low is None:
+            raise ValueError(f"Rule for {sensor} needs a high or low threshold")
+        self.sensor = sensor
+        self.high = high
+        self.low = low
+        self.unit = unit
+        self.hysteresis = hysteresis
+        self.debounce = max(1, int(debounce))
+        self.ignore = tuple(ignore)
+
+        self.active = False
+        self.side = None  # 'high' or 'low' while active
+        self._streak = 0
+
+    def update(self, value):
+        """Evaluate one new sample, returns True if the active state changed"""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        if value in self.ignore or value != value:
+            self._streak = 0
+            return self._set(False, None)
+
+        side = self._breach_side(value)
+        wanted = side is not None
+        if wanted == self.active:
+            self._streak = 0
+            if wanted:
+                self.side = side
+            return False
+        self._streak += 1
+        if self._streak < self.debounce:
+            return False
+        self._streak = 0
+        return self._set(wanted, side)
+
+    def warning_text(self):
+        if not self.active:
+            return ""
+        if self.side == 'high':
+            return f"⚠️ High: > {self.high}{self.unit}"
+        return f"⚠️ Low: < {self.low}{self.unit}"
+
+    def evaluate_batch(self, values):
+        """Active state after each sample of an array (for backtesting)
+
+        Continues from the rule's current state and leaves the rule in the
+        state after the last sample, so a long history can be evaluated one
+        chunk at a time. Use a fresh rule to leave the live state alone.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        ignored = np.isnan(values)
+        for v in self.ignore:
+            ignored |= values == v
+
+        if self.debounce > 1:
+            # Debounce depends on run lengths, fall back to the sample-by-sample state machine
+            out = np.empty(len(values), dtype=bool)
+            for i, value in enumerate(values):
+                self.update(value)
+                out[i] = self.active
+            return out
+
+        # Samples that force the state on (past the threshold) or off (back
+        # inside by the hysteresis band); anything in between keeps the state
+        on = np.zeros(len(values), dtype=bool)
+        off = np.ones(len(values), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if self.high is not None:
+                on |= values > self.high
+                off &= values <= self.high - self.hysteresis
+            if self.low is not None:
+                on |= values < self.low
+                off &= values >= self.low + self.hysteresis
+        on &= ~ignored
+        off = (off & ~on) | ignored
+
+        decided = on | off
+        # Forward-fill the last decisive sample's state, before the first one the state carries over
+        idx = np.where(decided, np.arange(len(values)), -1)
+        np.maximum.accumulate(idx, out=idx)
+        out = np.where(idx >= 0, on[np.maximum(idx, 0)], self.active)
+        if len(values) and idx[-1] >= 0:
+            self._set(bool(out[-1]), self._breach_side(values[idx[-1]]))
+        return out
+
+    def _breach_side(self, value):
+        # While active, stay active until back inside the thresholds by the hysteresis band
+        margin = self.hysteresis if self.active else 0.0
+        if self.high is not None and value > self.high - margin:
+            return 'high'
+        if self.low is not None and value < self.low + margin:
+            return 'low'
+        return None
+
+    def _set(self, active, side):
+        if active == self.active:
+            return False
+        self.active = active
+        self.side = side if active else None
+        return True
+
+    def to_dict(self):
+        rule = {'sensor': self.sensor, 'unit': self.unit, 'hysteresis': self.hysteresis, 'debounce': self.debounce}
+        if self.high is not None:
+            rule['high'] = self.high
+        if self.low is not None:
+            rule['low'] = self.low
+        if self.ignore:
+            rule['ignore'] = list(self.ignore)
+        return rule
+
+
+class RuleEngine:
+    """Evaluates one rule per sensor as values arrive and keeps the warning set current
+
+    Each update touches only the rule of the sensor that changed, so the
+    warning set and count are maintained in O(1) per update.
+    """
+
+    def __init__(self, rules):
+        self.rules = {rule.sensor: rule for rule in rules}
+        self.active = set()
+        self.transitions = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an engine from a loaded rules config (see load_config)"""
+        defaults = config.get('defaults', {})
+        return cls([Rule(**{**defaults, **rule}) for rule in config['rules']])
+
+    @property
+    def warning_count(self):
+        return len(self.active)
+
+    def update(self, sensor, value):
+        """Evaluate the rule for one sensor, returns True if its warning state changed"""
+        rule = self.rules.get(sensor)
+        if rule is None or not rule.update(value):
+            return False
+        self.transitions += 1
+        if rule.active:
+            self.active.add(sensor)
+        else:
+            self.active.discard(sensor)
+        return True
+
+    def is_active(self, sensor):
+        return sensor in self.active
+
+    def warning_text(self, sensor):
+        rule = self.rules.get(sensor)
+        return rule.warning_text() if rule else ""
+
+    def unit(self, sensor):
+        rule = self.rules.get(sensor)
+        return rule.unit if rule else ""
+
+    def evaluate_batch(self, columns):
+        """Backtest all rules over {sensor: values}, returns {sensor: bool array}
+
+        Like Rule.evaluate_batch the rule states carry over, call it once per chunk.
+        """
+        states = {}
+        for sensor, values in columns.items():
+            rule = self.rules.get(sensor)
+            if rule is None:
+                continue
+            states[sensor] = rule.evaluate_batch(values)
+            if rule.active:
+                self.active.add(sensor)
+            else:
+                self.active.discard(sensor)
+        return states
+
+    def state(self):
+        return {
+            'warnings': self.warning_count,
+            'active': sorted(self.active),
+            'transitions': self.transitions,
+        }
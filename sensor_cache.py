@@ -0,0 +1,102 @@
+import threading
+import time
+
+
+class TTLCache:
+    """Small thread-safe read-through cache with per-entry TTL and explicit invalidation"""
+
+    _MISSING = object()
+
+    def __init__(self, ttl=10.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, value)
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Per-key locks so concurrent misses on the same key only load once
+        self._loading = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key)
+        return default if value is self._MISSING else value
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss or after expiry"""
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not self._MISSING:
+                self.hits += 1
+                return value
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have loaded it while we waited
+            with self._lock:
+                value = self._get_locked(key)
+                if value is not self._MISSING:
+                    self.hits += 1
+                    return value
+                self.misses += 1
+            try:
+                value = loader()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            return value
+
+    def put(self, key, value):
+        """Write-through: store a value we already know is current"""
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict_locked()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches predicate(key)"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._MISSING
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return self._MISSING
+        return entry[1]
+
+    def _evict_locked(self):
+        # Drop expired entries first, then the one closest to expiry
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e[0] < now]:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
@@ -0,0 +1,110 @@
+"""Production server: N worker processes behind one port with shared live state
+
+    python serve.py --workers 4 --port 50000
+
+The parent binds the socket and creates the shared-memory state journal,
+then forks the workers. Each worker imports the Flask app, attaches to the
+journal and serves the shared socket with a threaded WSGI server. Changes
+ingested by any worker are replayed by all of them in the same order, so
+every worker answers with the same state. Ingest rate limits and the
+export cap are shared by the workers too; the ingest concurrency cap
+(INGEST_MAX_ACTIVE) is per worker. If a worker dies the whole
+server stops, so a service manager restarts it with consistent state.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+import shared_state
+
+# Sensor names the journal records can carry, must include every history column of the server
+JOURNAL_COLUMNS = [
+    "MQ135_CO2", "MQ2_Smoke", "MQ7_CO", "MQ9_Flammable",
+    "Temperature", "Humidity", "Wind_Speed", "Fire_Probability"
+]
+
+
+def _worker(index, sock, journal, buckets, exports, ready, host, port):
+    # Ctrl-C reaches the whole process group, the parent stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Worker 0 is the only one that writes the history store
+    shared_state.attach(shared_state.SharedMemoryBackend(journal, worker_id=index, persist=index == 0,
+                                                         rate_buckets=buckets, export_count=exports))
+    import flask_gradio_server_simple as server
+    # Nobody serves before every worker has restored, or a late worker could replay a change twice
+    ready.wait()
+    httpd = make_server(host, port, server.app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print(f"Worker {index} (pid {os.getpid()}) serving")
+    try:
+        httpd.serve_forever()
+    finally:
+        # The worker exits with os._exit, atexit handlers would never run
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forest fire monitoring server with multiple workers")
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', 50000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--journal-capacity', type=int, default=int(os.environ.get('STATE_JOURNAL_CAPACITY', 65536)))
+    # Room for every station the server accepts (its MAX_STATIONS) plus configured and restored ones
+    parser.add_argument('--rate-slots', type=int, default=int(os.environ.get('RATE_LIMIT_SLOTS', 16384)),
+                        help="shared token buckets (sensors and stations being rate limited)")
+    parser.add_argument('--journal-stations', type=int, default=max(1024, int(os.environ.get('MAX_STATIONS', 64))))
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    os.environ.setdefault('SERVER_BOOT_ID', f"{int(time.time()):x}")
+    journal = shared_state.SharedJournal(JOURNAL_COLUMNS, capacity=args.journal_capacity,
+                                         max_stations=args.journal_stations)
+    buckets = shared_state.SharedBuckets(args.rate_slots)
+    context = multiprocessing.get_context('fork')
+    exports = context.Value('i', 0)
+    ready = context.Barrier(args.workers)
+    workers = [context.Process(target=_worker, args=(i, sock, journal, buckets, exports, ready, args.host, args.port), name=f"worker-{i}")
+               for i in range(args.workers)]
+    for process in workers:
+        process.start()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+
+    def shutdown(*args):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, shutdown)
+
+    code = 0
+    try:
+        while all(process.is_alive() for process in workers):
+            time.sleep(0.5)
+        print("A worker exited, stopping the server")
+        code = 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        for process in workers:
+            process.join(10)
+        sock.close()
+        journal.close()
+        journal.unlink()
+        buckets.close()
+        buckets.unlink()
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
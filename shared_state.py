@@ -0,0 +1,352 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Child of the server's queued logger (logs.setup_logging)
+logger = logging.getLogger('forest_fire.shared_state')
+
+# Journal operations
+OP_VALUE = 1    # one sensor value: (OP_VALUE, sensor name, value, when)
+OP_HISTORY = 2  # append the current values to history: (OP_HISTORY, None, None, when)
+
+RECORD_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('when', '<f8'),
+    ('value', '<f8'),
+    ('station', '<u4'),
+    ('origin', '<u2'),
+    ('op', 'u1'),
+    ('column', 'u1'),
+])
+STATION_ID_BYTES = 64
+HEADER_SLOTS = 8  # [0] = sequence number of the newest record, [1] = stations in the table
+
+
+class LocalStateBackend:
+    """Single-process backend: changes are applied right away in the calling thread
+
+    Used when the server runs as one process (app.run, tests, benchmarks).
+    """
+
+    name = 'local'
+    persist = True
+    # Nothing to share with, limiters keep their state in this process
+    rate_buckets = None
+    export_count = None
+
+    def __init__(self):
+        self._apply = None
+
+    def start(self, apply):
+        """apply(station_id, ops, local) is called for every batch of changes"""
+        self._apply = apply
+
+    def submit(self, station_id, ops):
+        self._apply(station_id, ops, True)
+
+    def sync(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class SharedJournal:
+    """Ring of fixed-width state-change records in a shared memory segment
+
+    Created by the parent process before forking the workers, which inherit
+    the segment and the lock. Appends take the lock and assign a global
+    sequence number; readers only compare their cursor with the head, so
+    polling an idle journal costs one memory read.
+    """
+
+    def __init__(self, columns, capacity=65536, max_stations=1024):
+        if len(columns) > 255:
+            raise ValueError("at most 255 columns fit in a journal record")
+        self.columns = list(columns)
+        self._column_index = {name: i for i, name in enumerate(self.columns)}
+        self.capacity = capacity
+        self.max_stations = max_stations
+        header_size = HEADER_SLOTS * 8
+        table_size = max_stations * STATION_ID_BYTES
+        size = header_size + table_size + capacity * RECORD_DTYPE.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._lock = multiprocessing.Lock()
+        buf = self._shm.buf
+        self._header = np.ndarray((HEADER_SLOTS,), dtype='<u8', buffer=buf)
+        self._table = np.ndarray((max_stations, STATION_ID_BYTES), dtype='u1', buffer=buf, offset=header_size)
+        self._ring = np.ndarray((capacity,), dtype=RECORD_DTYPE, buffer=buf, offset=header_size + table_size)
+        self._header[:] = 0
+        # Per-process caches of the station table
+        self._slots = {}
+        self._station_ids = {}
+
+    @property
+    def head(self):
+        return int(self._header[0])
+
+    def append(self, origin, station_id, ops):
+        """Append one batch of ops for a station, returns the sequence number of its last record"""
+        with self._lock:
+            slot = self._slot(station_id)
+            head = int(self._header[0])
+            for i, (op, name, value, when) in enumerate(ops):
+                record = self._ring[(head + i) % self.capacity]
+                record['seq'] = head + i + 1
+                record['when'] = when
+                record['value'] = _to_float(value)
+                record['station'] = slot
+                record['origin'] = origin
+                record['op'] = op
+                record['column'] = self._column_index.get(name, 0)
+            # Records are in place before the head moves, readers never see a half-written batch
+            self._header[0] = head + len(ops)
+            return head + len(ops)
+
+    def read(self, cursor):
+        """Records after `cursor` as (batches, new cursor, lost records)
+
+        A batch is (origin, station ID, ops) for a run of records of one
+        station from one worker. A reader that fell more than `capacity`
+        records behind loses the overwritten ones.
+        """
+        head = int(self._header[0])
+        if head == cursor:
+            return [], cursor, 0
+        lost = 0
+        if head - cursor > self.capacity:
+            lost = head - self.capacity - cursor
+            cursor = head - self.capacity
+        positions = np.arange(cursor, head) % self.capacity
+        records = self._ring[positions].copy()
+        # A writer may have lapped slow copies, keep only records with the expected sequence
+        valid = records['seq'] == np.arange(cursor + 1, head + 1, dtype=np.uint64)
+        lost += int((~valid).sum())
+        records = records[valid]
+
+        batches = []
+        for record in records.tolist():
+            seq, when, value, slot, origin, op, column = record
+            key = (origin, slot)
+            if not batches or batches[-1][0] != key:
+                batches.append((key, []))
+            name = self.columns[column] if op == OP_VALUE else None
+            batches[-1][1].append((op, name, value, when))
+        return [(origin, self._station_id(slot), ops) for (origin, slot), ops in batches], head, lost
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        """Free the segment, only the parent that created it calls this"""
+        self._shm.unlink()
+
+    def _slot(self, station_id):
+        """Slot of a station in the shared table, assigned on first use (caller holds lock)"""
+        slot = self._slots.get(station_id)
+        if slot is not None:
+            return slot
+        encoded = station_id.encode('utf-8')
+        count = int(self._header[1])
+        for i in range(count):
+            if self._table_entry(i) == encoded:
+                self._slots[station_id] = i
+                return i
+        if count >= self.max_stations:
+            raise ValueError(f"Shared journal is full ({self.max_stations} stations)")
+        self._table[count, :] = 0
+        self._table[count, :len(encoded)] = np.frombuffer(encoded, dtype='u1')
+        self._header[1] = count + 1
+        self._slots[station_id] = count
+        return count
+
+    def _station_id(self, slot):
+        station_id = self._station_ids.get(slot)
+        if station_id is None:
+            station_id = self._table_entry(slot).decode('utf-8')
+            self._station_ids[slot] = station_id
+        return station_id
+
+    def _table_entry(self, slot):
+        return self._table[slot].tobytes().rstrip(b'\0')
+
+
+class SharedBuckets:
+    """Token-bucket table in a shared memory segment, so rate limits span all workers
+
+    Created by the parent before forking, like the journal. An open-addressed
+    hash table of `slots` entries: a 64-bit key hash and [tokens, last refill]
+    per entry, used by admission.RateLimiter under `lock`, which prunes it
+    when more than half full. At three quarters full new keys get an
+    unstored empty bucket, so they are refused until old keys expire.
+    """
+
+    def __init__(self, slots=16384):
+        self.slots = slots
+        self.max_keys = slots // 2
+        self._shm = shared_memory.SharedMemory(create=True, size=8 + slots * 24)
+        self.lock = multiprocessing.Lock()
+        buf = self._shm.buf
+        self._count = np.ndarray((1,), dtype='<u8', buffer=buf)
+        self._keys = np.ndarray((slots,), dtype='<u8', buffer=buf, offset=8)  # 0 = empty
+        self._values = np.ndarray((slots, 2), dtype='<f8', buffer=buf, offset=8 + slots * 8)
+        self._count[0] = 0
+        self._keys[:] = 0
+
+    def get(self, key):
+        """[tokens, last refill] view of a bucket, or None (caller holds lock)"""
+        h = _key_hash(key)
+        i = self._find(h)
+        return self._values[i] if self._keys[i] == h else None
+
+    def add(self, key, tokens, now):
+        """New full bucket for a key (caller holds lock)"""
+        if int(self._count[0]) >= self.slots * 3 // 4:
+            return [0.0, now]
+        h = _key_hash(key)
+        i = self._find(h)
+        self._keys[i] = h
+        self._values[i] = (tokens, now)
+        self._count[0] += 1
+        return self._values[i]
+
+    def prune(self, idle_before):
+        """Drop buckets untouched since `idle_before` and rehash the rest (caller holds lock)"""
+        used = self._keys != 0
+        keep = used & (self._values[:, 1] > idle_before)
+        keys = self._keys[keep].copy()
+        values = self._values[keep].copy()
+        self._keys[:] = 0
+        for h, value in zip(keys.tolist(), values):
+            i = self._find(h)
+            self._keys[i] = h
+            self._values[i] = value
+        self._count[0] = len(keys)
+
+    def __len__(self):
+        return int(self._count[0])
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+    def _find(self, h):
+        # Linear probing, the table never fills up so an empty slot ends the search
+        i = h % self.slots
+        while self._keys[i] != 0 and self._keys[i] != h:
+            i = (i + 1) % self.slots
+        return i
+
+
+class SharedMemoryBackend:
+    """Multi-process backend: every change goes through the shared journal
+
+    Each worker replays the journal in sequence order, including its own
+    changes, so all workers apply the same changes in the same order and end
+    up with the same state. A background thread picks up other workers'
+    changes so stream clients are notified without waiting for a request.
+    Only the `persist` worker writes the history store.
+    """
+
+    name = 'shared_memory'
+
+    def __init__(self, journal, worker_id, persist=False, poll_interval=0.05, rate_buckets=None, export_count=None):
+        self.journal = journal
+        self.worker_id = worker_id
+        self.persist = persist
+        # Admission state shared by all workers: a SharedBuckets table and a
+        # multiprocessing.Value counting running exports
+        self.rate_buckets = rate_buckets
+        self.export_count = export_count
+        self.poll_interval = poll_interval
+        self._cursor = journal.head
+        self._apply = None
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.applied = 0
+        self.lost = 0
+
+    def start(self, apply):
+        self._apply = apply
+        self._thread = threading.Thread(target=self._poll, name='shared-state-sync', daemon=True)
+        self._thread.start()
+
+    def submit(self, station_id, ops):
+        self.journal.append(self.worker_id, station_id, ops)
+        self.sync()
+
+    def sync(self):
+        """Apply every journal record this worker has not seen yet"""
+        if self.journal.head == self._cursor:
+            return
+        with self._sync_lock:
+            batches, self._cursor, lost = self.journal.read(self._cursor)
+            if lost:
+                self.lost += lost
+                logger.warning("worker fell behind the state journal worker=%s lost=%d", self.worker_id, lost)
+            for origin, station_id, ops in batches:
+                self._apply(station_id, ops, origin == self.worker_id)
+                self.applied += len(ops)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        head = self.journal.head
+        return {
+            'backend': self.name,
+            'worker': self.worker_id,
+            'persist': self.persist,
+            'head': head,
+            'lag': head - self._cursor,
+            'applied': self.applied,
+            'lost': self.lost,
+        }
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error("state sync failed worker=%s error=%s", self.worker_id, e)
+
+
+# Backend used by the server module, serve.py attaches a shared one in each worker before importing it
+_backend = None
+
+
+def attach(backend):
+    global _backend
+    _backend = backend
+
+
+def current_backend():
+    global _backend
+    if _backend is None:
+        _backend = LocalStateBackend()
+    return _backend
+
+
+def _key_hash(key):
+    # Stable across processes (hash() of a str is not), never 0 which marks an empty slot
+    digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
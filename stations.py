@@ -0,0 +1,289 @@
+import datetime
+import re
+import threading
+
+# Station IDs are used in URLs and as directory names
+STATION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def valid_station_id(station_id):
+    return bool(STATION_ID_PATTERN.match(str(station_id)))
+
+
+def fire_status(fire_prob):
+    """Classify a camera fire probability into status, color and display text"""
+    if fire_prob is None or fire_prob == -1 or fire_prob != fire_prob:  # NaN: no usable reading
+        return {'status': "Camera Disconnected", 'color': "gray", 'display': "Camera Disconnected", 'disconnected': True}
+    if fire_prob < 0.2:
+        status, color = "Safe", "green"
+    elif fire_prob < 0.5:
+        status, color = "Low Risk", "orange"
+    elif fire_prob < 0.7:
+        status, color = "Medium Risk", "darkorange"
+    else:
+        status, color = "High Risk", "red"
+    return {'status': status, 'color': color, 'display': f"{status} ({fire_prob:.2f})", 'disconnected': False}
+
+
+# Numeric fire status for the compact /api/status format
+FIRE_STATUS_CODES = {"Camera Disconnected": -1, "Safe": 0, "Low Risk": 1, "Medium Risk": 2, "High Risk": 3}
+
+
+class StationState:
+    """Live state of one station: latest values, history, rollups, rules and risk
+
+    Every station has its own lock, so ingest for different stations never
+    contends. Methods marked "caller holds lock" expect `with station.lock:`.
+    """
+
+    def __init__(self, station_id, columns, history, rollups, rules, risk, store=None):
+        self.station_id = station_id
+        self.columns = list(columns)
+        self.history = history
+        self.rollups = rollups
+        self.rules = rules
+        self.risk = risk
+        self.store = store
+        self.lock = threading.Lock()
+
+        self.latest = {name: 0 for name in self.columns}
+        self.latest["Fire_Probability"] = -1  # -1 means unknown/camera disconnected
+        self.latest["timestamp"] = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+        self.fire_state = fire_status(-1)
+        self.latest_risk = None
+        # Sample time of each sensor's latest value
+        self.updated_at = {}
+        # Bumped on every state change so cached renders know when they are stale
+        self.version = 0
+        self.changed_at = datetime.datetime.now().timestamp()
+        # Warning count and fire status from the last published delta
+        self._published = {'warnings': None, 'fire_status': None}
+        # Bumped only when the warning count or fire status changes, long-polling clients wait on it
+        self.status_version = 0
+        self.status_changed = threading.Condition(self.lock)
+        self._status = None
+
+    def restore(self, warm_seconds=3600, from_store=True):
+        """Rebuild history, rollups and latest values from the store, then seed rules and risk"""
+        restored = 0
+        if self.store is not None and from_store:
+            # Each tier only reloads what fits in its retention window
+            last = self.store.last_time()
+            if last is not None:
+                for records in self.store.iter_range(last - self.rollups.retention):
+                    self.rollups.load(records[:, 0], {name: records[:, i + 1] for i, name in enumerate(self.columns)},
+                                      until=last)
+            times, columns = self.store.tail(self.history.capacity)
+            restored = len(times)
+            if restored:
+                self.history.load(times, columns)
+                for name, values in columns.items():
+                    value = float(values[-1])
+                    if value == value:  # skip NaN
+                        self.latest[name] = value
+                        self.updated_at[name] = float(times[-1])
+                self.latest['timestamp'] = datetime.datetime.fromtimestamp(float(times[-1])).strftime(TIMESTAMP_FORMAT)
+
+        for name in self.columns:
+            self.rules.update(name, self.latest[name])
+        self.fire_state = fire_status(self.latest.get("Fire_Probability"))
+
+        # Warm up the risk statistics with the most recent history
+        last = self.history.last_time()
+        if last is not None:
+            times, columns = self.history.range(last - warm_seconds)
+            for i, when in enumerate(times.tolist()):
+                for name, values in columns.items():
+                    self.risk.update(name, values[i], when)
+        self.risk.set_camera(self.latest.get("Fire_Probability"))
+        self.latest_risk = self.risk.score()
+        # Baseline for update_status, nobody can be waiting yet
+        self._status = (self.rules.warning_count, self.fire_state['status'])
+        return restored
+
+    def apply_value(self, sensor_name, value, when):
+        """Store one sensor value, returns (old value, changed) (caller holds lock)
+
+        Rules are evaluated separately with rules.update().
+        """
+        self.version += 1
+        self.changed_at = datetime.datetime.now().timestamp()
+        old_value = self.latest.get(sensor_name)
+        self.latest[sensor_name] = value
+        self.updated_at[sensor_name] = when
+        self.latest['timestamp'] = datetime.datetime.fromtimestamp(when).strftime(TIMESTAMP_FORMAT)
+        if sensor_name == "Fire_Probability":
+            self.risk.set_camera(value)
+            if old_value != value:
+                self.fire_state = fire_status(value)
+        else:
+            self.risk.update(sensor_name, value, when)
+        return old_value, old_value != value
+
+    def add_history_entry(self, when):
+        """Append the current sensor values to history and the rollups (caller holds lock)
+
+        Rollups are fed from the same rows as the store, so the tiers match
+        what restore() rebuilds from it.
+        """
+        self.history.append(when, self.latest)
+        self.rollups.add(when, self.latest)
+        if self.store is not None and not self.store.read_only:
+            self.store.append(when, self.latest)
+
+    def update_status(self):
+        """Bump status_version and wake status waiters if warnings or fire status changed (caller holds lock)"""
+        status = (self.rules.warning_count, self.fire_state['status'])
+        if status != self._status:
+            self._status = status
+            self.status_version += 1
+            self.status_changed.notify_all()
+
+    def wait_status(self, since, timeout):
+        """Wait until status_version differs from `since` or the timeout passes (caller holds lock)"""
+        self.status_changed.wait_for(lambda: self.status_version != since, timeout)
+
+    def status(self):
+        """Compact status as (version, warning count, fire status code) (caller holds lock)"""
+        return self.status_version, self.rules.warning_count, FIRE_STATUS_CODES[self.fire_state['status']]
+
+    def score_risk(self):
+        """Recompute the composite fire-risk score (caller holds lock)"""
+        self.latest_risk = self.risk.score()
+        return self.latest_risk
+
+    def delta(self, changed, history=None):
+        """Delta message for stream clients, or None if nothing they see changed (caller holds lock)
+
+        `history` is the time of a history entry added with these changes, the
+        row is sent along so dashboards can extend their table in place.
+        """
+        warnings = self.rules.warning_count
+        status = self.fire_state['status']
+        if not changed and history is None and warnings == self._published['warnings'] \
+                and status == self._published['fire_status']:
+            return None
+        self._published['warnings'] = warnings
+        self._published['fire_status'] = status
+        delta = {
+            'station': self.station_id,
+            'version': self.version,
+            'timestamp': self.latest['timestamp'],
+            'changed': changed,
+            'warnings': warnings,
+            'alerts': self._alerts(),
+            'fire_status': status,
+            'fire': self.fire_state
+        }
+        if history is not None:
+            delta['history'] = {name: self.latest[name] for name in self.columns}
+            delta['history']['timestamp'] = datetime.datetime.fromtimestamp(history).strftime("%Y-%m-%d %H:%M:%S")
+        return delta
+
+    def snapshot(self):
+        """Full state as sent to a stream client when it connects (caller holds lock)"""
+        return {
+            'station': self.station_id,
+            'version': self.version,
+            'timestamp': self.latest['timestamp'],
+            'changed': {name: self.latest[name] for name in self.columns},
+            'warnings': self.rules.warning_count,
+            'alerts': self._alerts(),
+            'fire_status': self.fire_state['status'],
+            'fire': self.fire_state
+        }
+
+    def _alerts(self):
+        """Warning text of each sensor in warning"""
+        return {name: self.rules.warning_text(name) for name in sorted(self.rules.active)}
+
+    def summary(self):
+        """Short status used by the station list (caller holds lock)"""
+        return {
+            'station': self.station_id,
+            'timestamp': self.latest['timestamp'],
+            'version': self.version,
+            'warnings': self.rules.warning_count,
+            'active_warnings': sorted(self.rules.active),
+            'fire_status': self.fire_state['status'],
+            'risk': self.latest_risk,
+            'history_count': len(self.history)
+        }
+
+
+class StationRegistry:
+    """Station states spread over lock-striped shards plus a sensor ID reverse index
+
+    Looking up an existing station is a plain dict read. Only creating a
+    station takes a lock, and only the lock of the shard it hashes to.
+    Creations requested with limit=True stop at `max_stations`.
+    """
+
+    def __init__(self, factory, shards=16, max_stations=None):
+        self._factory = factory
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.max_stations = max_stations
+        self._count = 0
+        self._count_lock = threading.Lock()
+        # Firebase sensor ID -> (station ID, sensor name)
+        self._sensor_index = {}
+        # station ID -> {sensor name: sensor ID}
+        self._sensor_ids = {}
+        self._index_lock = threading.Lock()
+
+    def _shard(self, station_id):
+        return self._shards[hash(station_id) % len(self._shards)]
+
+    def get(self, station_id):
+        return self._shard(station_id)[0].get(station_id)
+
+    def get_or_create(self, station_id, limit=False):
+        """Station state, created if needed; with limit=True None instead of going past max_stations"""
+        states, lock = self._shard(station_id)
+        state = states.get(station_id)
+        if state is not None:
+            return state
+        with lock:
+            state = states.get(station_id)
+            if state is None:
+                if not self._reserve(limit):
+                    return None
+                state = self._factory(station_id)
+                states[station_id] = state
+            return state
+
+    def _reserve(self, limit):
+        with self._count_lock:
+            if limit and self.max_stations is not None and self._count >= self.max_stations:
+                return False
+            self._count += 1
+            return True
+
+    def register_sensors(self, station_id, sensor_ids):
+        """Map each sensor name of a station to its Firebase sensor ID"""
+        with self._index_lock:
+            self._sensor_ids.setdefault(station_id, {}).update(sensor_ids)
+            for name, sensor_id in sensor_ids.items():
+                self._sensor_index[sensor_id] = (station_id, name)
+
+    def resolve(self, sensor_id):
+        """(station ID, sensor name) for a Firebase sensor ID, or None"""
+        return self._sensor_index.get(sensor_id)
+
+    def sensor_id(self, station_id, sensor_name):
+        """Firebase sensor ID of a station's sensor, or None if it was never registered"""
+        return self._sensor_ids.get(station_id, {}).get(sensor_name)
+
+    def sensor_ids(self, station_id):
+        return dict(self._sensor_ids.get(station_id, {}))
+
+    def all(self):
+        states = []
+        for shard, _ in self._shards:
+            states.extend(shard.values())
+        return sorted(states, key=lambda s: s.station_id)
+
+    def __len__(self):
+        return sum(len(shard) for shard, _ in self._shards)
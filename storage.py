@@ -0,0 +1,154 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FirebaseStorage:
+    """Firebase Realtime Database storage, initialized on first use
+
+    firebase_admin is only imported and the credentials only loaded when the
+    first call reaches the database, so importing the server stays cheap.
+    """
+
+    name = 'firebase'
+
+    def __init__(self, database_url, certificate_path):
+        self.database_url = database_url
+        self.certificate_path = certificate_path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _ref(self, path):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    import firebase_admin
+                    from firebase_admin import credentials, db
+                    cred = credentials.Certificate(self.certificate_path)
+                    firebase_admin.initialize_app(cred, {'databaseURL': self.database_url})
+                    self._db = db
+        return self._db.reference(path)
+
+    def list_sensors(self):
+        return self._ref('/sensors').get()
+
+    def create_sensor(self, info):
+        """Register a sensor, returns its new ID"""
+        return self._ref('/sensors').push(info).key
+
+    def delete_sensor(self, sensor_id, history=True):
+        """Remove a sensor with its data (and history)"""
+        self._ref('/sensors').child(sensor_id).delete()
+        self._ref('/data').child(sensor_id).delete()
+        if history:
+            self._ref('/history').child(sensor_id).delete()
+
+    def get_data(self, sensor_id):
+        return self._ref('/data').child(sensor_id).get()
+
+    def get_history(self, sensor_id, limit):
+        """Last `limit` history entries of a sensor as {key: data}"""
+        return self._ref('/history').child(sensor_id).order_by_key().limit_to_last(limit).get()
+
+    def update(self, updates):
+        """Multi-path update, keys are "data/<id>" or "history/<id>/<key>" relative to the root"""
+        self._ref('/').update(updates)
+
+    def listen_sensors(self, callback):
+        """Call callback(event) whenever the sensor registry changes"""
+        return self._ref('/sensors').listen(callback)
+
+
+class SQLiteStorage:
+    """Local storage in SQLite, ":memory:" keeps everything in memory
+
+    Same data layout as the Firebase database (sensor registry, latest data
+    per sensor, optional history), for running offline and in benchmarks.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._listeners = []
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sensors (id TEXT PRIMARY KEY, info TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS data (id TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS history "
+                               "(id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (id, key))")
+
+    def list_sensors(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, info FROM sensors ORDER BY id").fetchall()
+        # Firebase returns None for an empty node
+        return {id: json.loads(info) for id, info in rows} or None
+
+    def create_sensor(self, info):
+        # Firebase-style push ID: time ordered with a random suffix
+        sensor_id = f"-{time.time_ns():x}{secrets.token_hex(3)}"
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO sensors VALUES (?, ?)", (sensor_id, json.dumps(info)))
+        self._notify(sensor_id, info)
+        return sensor_id
+
+    def delete_sensor(self, sensor_id, history=True):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sensors WHERE id = ?", (sensor_id,))
+            self._conn.execute("DELETE FROM data WHERE id = ?", (sensor_id,))
+            if history:
+                self._conn.execute("DELETE FROM history WHERE id = ?", (sensor_id,))
+        self._notify(sensor_id, None)
+
+    def get_data(self, sensor_id):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM data WHERE id = ?", (sensor_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_history(self, sensor_id, limit):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM history WHERE id = ? ORDER BY key DESC LIMIT ?",
+                                      (sensor_id, limit)).fetchall()
+        return {key: json.loads(value) for key, value in reversed(rows)} or None
+
+    def update(self, updates):
+        data = []
+        history = []
+        for path, value in updates.items():
+            kind, _, rest = path.partition('/')
+            if kind == 'data':
+                data.append((rest, json.dumps(value)))
+            elif kind == 'history':
+                sensor_id, _, key = rest.rpartition('/')
+                history.append((sensor_id, key, json.dumps(value)))
+            else:
+                raise ValueError(f"Unsupported update path: {path}")
+        # One transaction, like Firebase applies a multi-path update atomically
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO data VALUES (?, ?)", data)
+            self._conn.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?)", history)
+
+    def listen_sensors(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, sensor_id, info):
+        # Same attributes as a firebase_admin.db.Event
+        event = SimpleNamespace(event_type='put', path=f"/{sensor_id}", data=info)
+        for callback in list(self._listeners):
+            callback(event)
+
+
+def open_storage(backend, database_url=None, certificate_path=None, sqlite_path=':memory:'):
+    """Storage for a STORAGE_BACKEND name: "firebase" or "sqlite" """
+    if backend == 'firebase':
+        return FirebaseStorage(database_url, certificate_path)
+    if backend == 'sqlite':
+        if sqlite_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+        return SQLiteStorage(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {backend}")
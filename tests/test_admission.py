@@ -0,0 +1,92 @@
+import importlib
+import os
+
+import pytest
+
+from admission import LIVE, REPLAY, Admission, ConcurrencyGate, RateLimiter
+
+
+def test_bucket_refills_at_rate_up_to_burst():
+    limiter = RateLimiter({'sensor': (2.0, 4)})
+    for _ in range(4):
+        assert limiter.take([('sensor', 'a', 1)], now=0.0) == (0.0, None)
+    assert limiter.take([('sensor', 'a', 1)], now=0.0) == (0.5, 'sensor')
+    # Half a second buys one token
+    assert limiter.take([('sensor', 'a', 1)], now=0.5) == (0.0, None)
+    assert limiter.take([('sensor', 'a', 1)], now=0.5)[1] == 'sensor'
+    # A long pause refills to the burst, not beyond
+    for _ in range(4):
+        assert limiter.take([('sensor', 'a', 1)], now=100.0) == (0.0, None)
+    assert limiter.take([('sensor', 'a', 1)], now=100.0)[1] == 'sensor'
+
+
+def test_throttled_request_debits_nothing():
+    limiter = RateLimiter({'sensor': (1.0, 5), 'station': (1.0, 1)})
+    assert limiter.take([('sensor', 'a', 1), ('station', 's', 1)], now=0.0) == (0.0, None)
+    # The station is empty, the sensor bucket must keep its tokens
+    assert limiter.take([('sensor', 'a', 1), ('station', 's', 1)], now=0.0) == (1.0, 'station')
+    for _ in range(4):
+        assert limiter.take([('sensor', 'a', 1)], now=0.0) == (0.0, None)
+
+
+def test_cost_above_burst_waits_for_a_full_bucket():
+    limiter = RateLimiter({'replay': (10.0, 5)})
+    assert limiter.take([('replay', 's', 5)], now=0.0) == (0.0, None)
+    wait, kind = limiter.take([('replay', 's', 50)], now=0.0)
+    assert kind == 'replay'
+    assert wait == pytest.approx(0.5)
+
+
+def test_keys_are_independent_and_idle_keys_pruned():
+    limiter = RateLimiter({'sensor': (1.0, 1)}, max_keys=2)
+    for key in range(4):
+        assert limiter.take([('sensor', key, 1)], now=0.0) == (0.0, None)
+    assert len(limiter) == 4
+    # Once the buckets would be full again they are dropped
+    limiter.take([('sensor', 'new', 1)], now=10.0)
+    assert len(limiter) == 1
+
+
+def test_full_table_refuses_new_keys():
+    limiter = RateLimiter({'sensor': (1.0, 1)}, max_keys=2)
+    for key in range(4):
+        limiter.take([('sensor', key, 1)], now=0.0)
+    assert limiter.take([('sensor', 'one too many', 1)], now=0.0)[1] == 'sensor'
+    assert len(limiter) == 4
+
+
+def test_admission_retry_after_is_whole_seconds():
+    admission = Admission(ConcurrencyGate(), RateLimiter({'sensor': (4.0, 1)}))
+    assert admission.charge([('sensor', 'a', 1)]) is None
+    assert admission.charge([('sensor', 'a', 1)]) == ('sensor', 1)
+    assert admission.stats()['throttled'] == {'sensor': 1}
+
+
+def test_gate_keeps_replay_out_while_live_is_busy():
+    gate = ConcurrencyGate(max_active=2, max_waiting=0, replay_slots=1)
+    assert gate.enter(REPLAY) is None
+    assert gate.enter(REPLAY) == 'busy'
+    assert gate.enter(LIVE) is None
+    assert gate.enter(LIVE) == 'queue_full'
+    gate.leave()
+    assert gate.enter(LIVE) is None
+
+
+@pytest.fixture(scope='module')
+def server():
+    os.environ.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=':memory:', HISTORY_STORE_DIR='', DEADBAND_PATH='',
+                      INGEST_ADMISSION='1', SENSOR_RATE='1', SENSOR_BURST='3', LOG_LEVEL='WARNING')
+    return importlib.import_module('flask_gradio_server_simple')
+
+
+def test_server_answers_429_with_retry_after(server):
+    client = server.app.test_client()
+    sensor_id = server.SENSOR_IDS['Temperature']
+    statuses = [client.put(f'/api/sensors/{sensor_id}', json={'value': 20 + i}).status_code for i in range(3)]
+    assert statuses == [200, 200, 200]
+    response = client.put(f'/api/sensors/{sensor_id}', json={'value': 30, 'replay': True})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # Other sensors have their own buckets
+    other = server.SENSOR_IDS['Humidity']
+    assert client.put(f'/api/sensors/{other}', json={'value': 50}).status_code == 200
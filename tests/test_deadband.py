@@ -0,0 +1,74 @@
+from deadband import Deadband
+
+
+def deadband(**kwargs):
+    return Deadband({'Temperature': (0.5, 0.0), 'MQ2_Smoke': (0.0, 0.1)}, max_silence=60.0, **kwargs)
+
+
+def test_first_value_passes_then_changes_within_tolerance_are_suppressed():
+    d = deadband()
+    assert d.check('1', 'Temperature', 20.0, now=0)
+    assert not d.check('1', 'Temperature', 20.5, now=1)  # not more than abs 0.5
+    assert d.check('1', 'Temperature', 20.6, now=2)
+    # Compared with the last passed value, not the last seen one
+    assert not d.check('1', 'Temperature', 21.0, now=3)
+    assert d.check('1', 'Temperature', 20.0, now=4)
+
+
+def test_relative_tolerance_scales_with_the_value():
+    d = deadband()
+    assert d.check('1', 'MQ2_Smoke', 100.0, now=0)
+    assert not d.check('1', 'MQ2_Smoke', 110.0, now=1)
+    assert d.check('1', 'MQ2_Smoke', 110.1, now=2)
+
+
+def test_max_silence_forces_a_heartbeat():
+    d = deadband()
+    assert d.check('1', 'Temperature', 20.0, now=0)
+    assert not d.check('1', 'Temperature', 20.0, now=59.9)
+    assert d.check('1', 'Temperature', 20.0, now=60)
+
+
+def test_guard_thresholds_always_pass():
+    d = deadband(guards={'Temperature': (28, None)})
+    assert d.check('1', 'Temperature', 28.5, now=0)
+    assert d.check('1', 'Temperature', 28.6, now=1)
+    assert d.check('1', 'Temperature', 28.6, now=2)
+
+
+def test_unconfigured_sensors_keys_and_bad_values_pass():
+    d = deadband()
+    assert d.check('1', 'Humidity', 40.0, now=0)
+    assert d.check('1', 'Humidity', 40.0, now=1)
+    assert d.check('1', 'Temperature', 20.0, now=0)
+    assert d.check('2', 'Temperature', 20.0, now=0)  # per key
+    assert d.check('1', 'Temperature', 'n/a', now=1)
+    assert d.check('1', 'Temperature', float('nan'), now=2)
+
+
+def test_unrecorded_value_is_not_the_reference():
+    d = deadband()
+    assert d.check('1', 'Temperature', 20.0, now=0)
+    # Passed but never sent, the next close value must still pass
+    assert d.check('1', 'Temperature', 25.0, now=1, record=False)
+    assert d.check('1', 'Temperature', 25.1, now=2, record=False)
+    d.record('1', 'Temperature', 25.1, now=2)
+    assert not d.check('1', 'Temperature', 25.2, now=3)
+
+
+def test_forget_lets_the_next_value_through():
+    d = deadband()
+    d.check('1', 'Temperature', 20.0, now=0)
+    d.forget('1')
+    assert d.check('1', 'Temperature', 20.0, now=1)
+
+
+def test_from_config_uses_rule_thresholds_as_guards():
+    config = {'max_silence': 30, 'sensors': {'Humidity': {'abs': 2}}}
+    rules = {'rules': [{'sensor': 'Humidity', 'low': 20}]}
+    d = Deadband.from_config(config, rules)
+    assert d.check('1', 'Humidity', 50.0, now=0)
+    assert not d.check('1', 'Humidity', 51.0, now=1)
+    assert d.check('1', 'Humidity', 19.0, now=2)
+    assert d.check('1', 'Humidity', 50.0, now=40)
+    assert d.stats()['sensors']['Humidity'] == {'seen': 4, 'passed': 3, 'suppressed_ratio': 0.25}
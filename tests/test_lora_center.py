@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+import lora_center
+from lora_center import FrameSpool, SequenceTracker, decode_frame, encode_frame
+
+
+def frame(seq=7, **values):
+    data = {"station": 3, "seq": seq, "temperature": -4.25, "humidity": 55.5, "wind_speed": 1.2,
+            "mq135": 812.34, "mq2": 40.01, "mq7": 3.5, "mq9": 0.75, "fire_prob": 0.42}
+    data.update(values)
+    return data
+
+
+def test_frame_v1_round_trip():
+    data = frame()
+    payload = encode_frame(data)
+    assert len(payload) == lora_center.FRAME_V1.size
+    assert decode_frame(payload) == pytest.approx(data)
+
+
+def test_frame_v1_missing_fields():
+    data = frame(humidity=None, fire_prob=-1)
+    del data["mq9"]
+    decoded = decode_frame(encode_frame(data))
+    assert "humidity" not in decoded
+    assert "mq9" not in decoded
+    # No camera reading comes back as disconnected
+    assert decoded["fire_prob"] == -1
+    assert decoded["temperature"] == pytest.approx(-4.25)
+
+
+def test_frame_v1_rejects_bad_payloads():
+    payload = encode_frame(frame())
+    with pytest.raises(ValueError):
+        decode_frame(payload[:-1])
+    with pytest.raises(ValueError):
+        decode_frame(payload[:1] + b'\x02' + payload[2:])
+    with pytest.raises(ValueError):
+        decode_frame(b'not a frame')
+
+
+def test_json_frames_still_decode():
+    assert decode_frame(json.dumps({"temperature": 21.5}).encode()) == {"temperature": 21.5}
+
+
+def test_sequence_tracker_counts_loss_duplicates_and_restarts():
+    tracker = SequenceTracker()
+    assert tracker.check(1, 65534)
+    assert tracker.check(1, 1)  # wraps, 65535 and 0 lost
+    assert not tracker.check(1, 1)
+    assert tracker.check(1, 0)  # node rebooted
+    assert tracker.stats() == {'received': 4, 'lost': 2, 'duplicates': 1, 'restarts': 1}
+
+
+def spool(path, **kwargs):
+    kwargs.setdefault('fsync', False)
+    return FrameSpool(str(path), **kwargs)
+
+
+def test_spool_ack_advances_and_survives_reopen(tmp_path):
+    s = spool(tmp_path)
+    seqs = [s.append({"n": i}) for i in range(5)]
+    assert seqs == [1, 2, 3, 4, 5]
+    batch = s.pending(3)
+    assert [seq for seq, _ in batch] == [1, 2, 3]
+    assert batch[0][1] == {"n": 0}
+    # Out of order acks only move the watermark over a contiguous run
+    s.ack([2, 3])
+    assert s.backlog() == 3
+    s.ack([1])
+    assert s.backlog() == 2
+    s.close()
+
+    reopened = spool(tmp_path)
+    assert reopened.backlog() == 2
+    assert [seq for seq, _ in reopened.pending(10)] == [4, 5]
+    assert reopened.append({"n": 5}) == 6
+
+
+def test_spool_release_hands_frames_out_again(tmp_path):
+    s = spool(tmp_path)
+    for i in range(3):
+        s.append({"n": i})
+    assert [seq for seq, _ in s.pending(10)] == [1, 2, 3]
+    assert s.pending(10) == []
+    s.release([2])
+    assert [seq for seq, _ in s.pending(10)] == [2]
+
+
+def test_spool_repairs_torn_tail(tmp_path):
+    s = spool(tmp_path)
+    s.append({"n": 0})
+    s.append({"n": 1})
+    s.close()
+    path = next(tmp_path.glob('spool-*.log'))
+    with open(path, 'r+b') as f:
+        f.truncate(path.stat().st_size - 3)
+    reopened = spool(tmp_path)
+    assert [frame for _, frame in reopened.pending(10)] == [{"n": 0}]
+
+
+def test_spool_evicts_oldest_segments_beyond_max_bytes(tmp_path):
+    s = spool(tmp_path, segment_bytes=200, max_bytes=600)
+    for i in range(40):
+        s.append({"n": i, "pad": "x" * 40})
+    stats = s.stats()
+    assert stats['bytes'] <= 600 + 200
+    assert stats['evicted'] > 0
+    assert stats['backlog'] == 40 - stats['evicted']
+    # What is left is the newest frames, in order
+    frames = [frame["n"] for _, frame in s.pending(100)]
+    assert frames == list(range(40 - len(frames), 40))
+
+
+def test_spool_expires_old_frames(tmp_path):
+    s = spool(tmp_path, max_age=-1)
+    s.append({"n": 0})
+    assert s.pending(10) == []
+    assert s.stats()['expired'] == 1
+    assert s.backlog() == 0
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from rollups import RollupSet, RollupTier
+
+COLUMNS = ['Temperature', 'Humidity']
+TIERS = (('minute', 60, 10), ('hour', 3600, 5), ('day', 86400, 3))
+
+
+def tier(capacity=10):
+    return RollupTier('minute', 60, capacity, COLUMNS)
+
+
+def test_samples_on_a_boundary_start_the_next_bucket():
+    t = tier()
+    t.add(0.0, np.array([1.0, np.nan]))
+    t.add(59.999, np.array([3.0, 10.0]))
+    t.add(60.0, np.array([5.0, np.nan]))
+    times, columns = t.query()
+    assert times.tolist() == [0, 60]
+    temperature = columns['Temperature']
+    assert temperature['min'].tolist() == [1.0, 5.0]
+    assert temperature['max'].tolist() == [3.0, 5.0]
+    assert temperature['mean'].tolist() == [2.0, 5.0]
+    assert temperature['count'].tolist() == [2, 1]
+    assert temperature['last'].tolist() == [3.0, 5.0]
+    # Missing values do not count
+    assert columns['Humidity']['count'].tolist() == [1, 0]
+    assert np.isnan(columns['Humidity']['mean'][1])
+
+
+def test_late_samples_fold_into_the_open_bucket():
+    t = tier()
+    t.add(120.0, np.array([1.0, 1.0]))
+    t.add(30.0, np.array([9.0, 9.0]))
+    times, columns = t.query()
+    assert times.tolist() == [120]
+    assert columns['Temperature']['max'].tolist() == [9.0]
+
+
+def test_query_range_includes_the_bucket_holding_start():
+    t = tier()
+    for when in range(0, 300, 30):
+        t.add(float(when), np.array([float(when), 0.0]))
+    times, _ = t.query(start=130, end=200)
+    assert times.tolist() == [120, 180]
+
+
+def test_closed_buckets_are_bounded_by_capacity():
+    t = tier(capacity=3)
+    for when in range(0, 600, 60):
+        t.add(float(when), np.array([1.0, 1.0]))
+    times, _ = t.query()
+    # Three closed buckets plus the open one
+    assert times.tolist() == [360, 420, 480, 540]
+    assert t.oldest() == 540 - t.retention
+    assert t.covers(360) and not t.covers(300)
+
+
+def test_bulk_load_matches_sample_by_sample():
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.uniform(0, 3 * 86400, 2000))
+    values = rng.normal(20, 5, (2000, 2))
+    values[rng.random((2000, 2)) < 0.1] = np.nan
+
+    one_by_one = RollupSet(COLUMNS, TIERS)
+    for when, row in zip(times, values):
+        one_by_one.add(when, dict(zip(COLUMNS, row)))
+    bulk = RollupSet(COLUMNS, TIERS)
+    bulk.load(times, {name: values[:, i] for i, name in enumerate(COLUMNS)})
+
+    for a, b in zip(one_by_one.tiers, bulk.tiers):
+        times_a, columns_a = a.query()
+        times_b, columns_b = b.query()
+        assert times_a.tolist() == times_b.tolist()
+        for name in COLUMNS:
+            for stat in ('min', 'max', 'mean', 'count', 'last'):
+                np.testing.assert_allclose(columns_a[name][stat], columns_b[name][stat], equal_nan=True)
+
+
+@pytest.mark.parametrize('resolution, age, expected', [
+    (10, None, None),
+    (60, None, 'minute'),
+    (300, 300, 'minute'),
+    (300, 3600, 'hour'),
+    (3600, 10 * 3600, 'day'),
+    (60, 5 * 86400, None),
+])
+def test_plan_picks_a_tier_that_still_holds_the_start(resolution, age, expected):
+    rollups = RollupSet(COLUMNS, TIERS)
+    times = np.arange(0, 2 * 86400, 30.0)
+    rollups.load(times, {'Temperature': times})
+    start = None if age is None else times[-1] - age
+    tier = rollups.plan(resolution, start)
+    assert (tier and tier.name) == expected
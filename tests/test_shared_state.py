@@ -0,0 +1,72 @@
+import pytest
+
+from admission import RateLimiter
+from shared_state import OP_HISTORY, OP_VALUE, SharedBuckets, SharedJournal
+
+
+@pytest.fixture
+def journal():
+    journal = SharedJournal(['Temperature', 'Humidity'], capacity=8, max_stations=4)
+    yield journal
+    journal.close()
+    journal.unlink()
+
+
+def test_journal_reads_batches_in_append_order(journal):
+    journal.append(0, 'a', [(OP_VALUE, 'Temperature', 20.0, 1.0), (OP_VALUE, 'Humidity', 40.0, 1.0)])
+    journal.append(1, 'b', [(OP_VALUE, 'Temperature', 30.0, 2.0)])
+    last = journal.append(0, 'a', [(OP_HISTORY, None, None, 3.0)])
+    assert last == 4
+
+    batches, cursor, lost = journal.read(0)
+    assert cursor == 4 and lost == 0
+    assert batches[:2] == [
+        (0, 'a', [(OP_VALUE, 'Temperature', 20.0, 1.0), (OP_VALUE, 'Humidity', 40.0, 1.0)]),
+        (1, 'b', [(OP_VALUE, 'Temperature', 30.0, 2.0)]),
+    ]
+    origin, station, [(op, name, _, when)] = batches[2]
+    assert (origin, station, op, name, when) == (0, 'a', OP_HISTORY, None, 3.0)
+    # Nothing new after the cursor
+    assert journal.read(cursor) == ([], cursor, 0)
+
+
+def test_journal_reader_resumes_from_cursor(journal):
+    journal.append(0, 'a', [(OP_VALUE, 'Temperature', 1.0, 1.0)])
+    _, cursor, _ = journal.read(0)
+    journal.append(0, 'a', [(OP_VALUE, 'Temperature', 2.0, 2.0)])
+    batches, cursor, lost = journal.read(cursor)
+    assert batches == [(0, 'a', [(OP_VALUE, 'Temperature', 2.0, 2.0)])]
+    assert cursor == 2 and lost == 0
+
+
+def test_journal_slow_reader_loses_overwritten_records(journal):
+    for i in range(11):
+        journal.append(0, 'a', [(OP_VALUE, 'Temperature', float(i), float(i))])
+    batches, cursor, lost = journal.read(0)
+    assert cursor == 11 and lost == 3
+    # The surviving records are the newest `capacity`, still in order
+    assert [value for _, _, ops in batches for _, _, value, _ in ops] == [float(i) for i in range(3, 11)]
+
+
+def test_journal_is_limited_to_max_stations(journal):
+    for station in 'abcd':
+        journal.append(0, station, [(OP_HISTORY, None, None, 1.0)])
+    with pytest.raises(ValueError):
+        journal.append(0, 'e', [(OP_HISTORY, None, None, 1.0)])
+
+
+def test_shared_buckets_back_a_rate_limiter():
+    buckets = SharedBuckets(slots=64)
+    try:
+        limiter = RateLimiter({'sensor': (1.0, 2)}, table=buckets)
+        assert limiter.take([('sensor', 'x', 1)], now=0.0) == (0.0, None)
+        assert limiter.take([('sensor', 'x', 1)], now=0.0) == (0.0, None)
+        assert limiter.take([('sensor', 'x', 1)], now=0.0) == (1.0, 'sensor')
+        assert len(limiter) == 1
+        # Three quarters full, new keys get an empty bucket and are refused
+        for i in range(47):
+            limiter.take([('sensor', i, 1)], now=0.0)
+        assert limiter.take([('sensor', 'new', 1)], now=0.0)[1] == 'sensor'
+    finally:
+        buckets.close()
+        buckets.unlink()
@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class TimeSeriesBuffer:
+    """Fixed-capacity columnar ring buffer for sensor history
+
+    One preallocated float64 column per sensor plus an epoch-seconds time
+    column, allocated when the first sample arrives so buffers that never get
+    data cost nothing. Appends are O(1) and overwrite the oldest sample once full. Range
+    and last-N queries return numpy arrays (views when the selection does not
+    wrap around the end of the ring) instead of per-row dicts.
+    """
+
+    def __init__(self, columns, capacity):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.columns = list(columns)
+        self.capacity = capacity
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._times = None
+        self._values = None
+        # Position of the oldest sample and number of samples held
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def first_time(self):
+        """Epoch time of the oldest sample, or None if empty"""
+        if not self._count:
+            return None
+        return float(self._times[self._start])
+
+    def last_time(self):
+        """Epoch time of the newest sample, or None if empty"""
+        if not self._count:
+            return None
+        return float(self._times[(self._start + self._count - 1) % self.capacity])
+
+    def _allocate(self):
+        if self._times is None:
+            self._times = np.zeros(self.capacity, dtype=np.float64)
+            self._values = np.full((len(self.columns), self.capacity), np.nan, dtype=np.float64)
+
+    def append(self, when, values):
+        """Append one sample; values is a mapping of column name to number"""
+        self._allocate()
+        # Keep the time column sorted so range queries can binary search it
+        last = self.last_time()
+        if last is not None and when < last:
+            when = last
+
+        if self._count < self.capacity:
+            pos = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._times[pos] = when
+        for name, i in self._index.items():
+            self._values[i, pos] = _to_float(values.get(name))
+
+    def extend(self, times, values):
+        """Append many samples at once; times sorted, values maps column name to an array"""
+        times = np.asarray(times, dtype=np.float64)[-self.capacity:]
+        n = len(times)
+        if not n:
+            return
+        self._allocate()
+        last = self.last_time()
+        if last is not None:
+            times = np.maximum(times, last)
+        pos = (self._start + self._count + np.arange(n)) % self.capacity
+        self._times[pos] = times
+        for name, i in self._index.items():
+            self._values[i, pos] = np.asarray(values[name], dtype=np.float64)[-n:] if name in values else np.nan
+        overflow = max(0, self._count + n - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._count += n - overflow
+
+    def load(self, times, values):
+        """Replace the contents with arrays of samples (e.g. when restoring from disk)"""
+        times = np.asarray(times, dtype=np.float64)[-self.capacity:]
+        n = len(times)
+        self._allocate()
+        self._start = 0
+        self._count = n
+        self._times[:n] = times
+        self._values[:, :n] = np.nan
+        for name, i in self._index.items():
+            if name in values and n:
+                self._values[i, :n] = np.asarray(values[name], dtype=np.float64)[-n:]
+
+    def last(self, n, sensors=None):
+        """Newest n samples as (times, {sensor: values}), oldest first"""
+        n = max(0, min(n, self._count))
+        return self._select(self._count - n, self._count, sensors)
+
+    def range(self, start=None, end=None, sensors=None):
+        """Samples with start <= time <= end as (times, {sensor: values})"""
+        lo = 0 if start is None else self._search(start, 'left')
+        hi = self._count if end is None else self._search(end, 'right')
+        return self._select(lo, max(lo, hi), sensors)
+
+    def _search(self, when, side):
+        if not self._count:
+            return 0
+        # Binary search each contiguous segment of the ring in logical order
+        first, second = self._segments(0, self._count)
+        times_first = self._times[first]
+        idx = int(np.searchsorted(times_first, when, side=side))
+        if idx < len(times_first) or second is None:
+            return idx
+        return len(times_first) + int(np.searchsorted(self._times[second], when, side=side))
+
+    def _segments(self, lo, hi):
+        """Physical slices covering logical positions [lo, hi)"""
+        a = self._start + lo
+        b = self._start + hi
+        if b <= self.capacity:
+            return slice(a, b), None
+        if a >= self.capacity:
+            return slice(a - self.capacity, b - self.capacity), None
+        return slice(a, self.capacity), slice(0, b - self.capacity)
+
+    def _select(self, lo, hi, sensors):
+        names = self.columns if sensors is None else list(sensors)
+        rows = [self._index[name] for name in names]
+        if self._times is None:
+            return np.empty(0), {name: np.empty(0) for name in names}
+        first, second = self._segments(lo, hi)
+        if second is None:
+            times = self._times[first]
+            values = {name: self._values[row, first] for name, row in zip(names, rows)}
+        else:
+            times = np.concatenate((self._times[first], self._times[second]))
+            values = {
+                name: np.concatenate((self._values[row, first], self._values[row, second]))
+                for name, row in zip(names, rows)
+            }
+        return times, values
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan